@@ -42,6 +42,8 @@ conditions = {
 }
 ecocyc_file_name = 'Ecocyc_NC_000913.txt'
 filter_sub_span = (45, 25)
+# also save the result as a numpy table, which gene location analysis reads without parsing
+result_table = False
 
 if __name__ == '__main__':
     ecocyc_file_path = os.path.join(ExperimentConfig.data_directory, ecocyc_file_name)
@@ -55,8 +57,10 @@ if __name__ == '__main__':
                                                candidate_distance=candidate_distance,
                                                patience=patience,
                                                weighted=weighted,
-                                               conditions=conditions)
-        gene_location_analysis = GeneLocationAnalysis(similarity_match.result_path, ecocyc_file_path,
+                                               conditions=conditions,
+                                               result_table=result_table)
+        match_result_path = similarity_match.table_path if result_table else similarity_match.result_path
+        gene_location_analysis = GeneLocationAnalysis(match_result_path, ecocyc_file_path,
                                                       ExperimentConfig.output_directory,
                                                       process_sub_data=weighted.get(SimilarityType.Consistency, 0) > 0,
                                                       filter_sub_span=filter_sub_span,
@@ -0,0 +1,112 @@
+from typing import List, Sequence
+
+import numpy as np
+
+from analysis.models.match_candidate import MatchCandidate
+from analysis.models.similarity_type import SimilarityType
+
+
+class CandidateStore:
+    """
+    Candidates of one query on one strand kept in columns. Scores arrive block by block, offsets which are beaten by
+    another offset closer than candidate_distance are suppressed in bulk, and only the top_k survivors are kept.
+    """
+
+    def __init__(self, similarity_types: Sequence[SimilarityType], top_k: int, candidate_distance: int, start: int,
+                 end: int):
+        """
+        :param start: only survivors with offset in [start, end) are kept, others only suppress their neighbors
+        """
+        self.similarity_types = list(similarity_types)
+        self.top_k = top_k
+        self.radius = max(candidate_distance - 1, 0)
+        self.start = start
+        self.end = end
+        # scores of offsets from carry_start on, which are still needed for the offsets not decided yet
+        self.carry_start = None
+        self.carry_weighted = np.zeros(0, dtype=np.float64)
+        self.carry_types = np.zeros((len(self.similarity_types), 0), dtype=np.float64)
+        self.decided = None
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.weighted = np.zeros(0, dtype=np.float64)
+        self.types = np.zeros((len(self.similarity_types), 0), dtype=np.float64)
+        self.survivor_num = 0
+        self.threshold = 0.0
+
+    def add_block(self, block_start: int, weighted: np.ndarray, type_scores: dict, is_last: bool = False):
+        """
+        :param weighted: weighted similarity of offsets in [block_start, block_start + len(weighted)), blocks must be
+        added one after another
+        :param is_last: no more blocks, so the offsets at the end have no more neighbors
+        """
+        if self.carry_start is None:
+            self.carry_start = self.decided = block_start
+        weighted = np.concatenate([self.carry_weighted, weighted])
+        types = np.concatenate([self.carry_types,
+                                np.array([type_scores[k] for k in self.similarity_types], dtype=np.float64).reshape(
+                                    len(self.similarity_types), -1)], axis=1)
+        block_end = self.carry_start + len(weighted)
+        decide_end = block_end if is_last else block_end - self.radius
+        if decide_end > self.decided:
+            left, right = self.decided - self.carry_start, decide_end - self.carry_start
+            scores = weighted[left:right]
+            offsets = np.arange(self.decided, decide_end)
+            survived = (scores > 0.0) & (scores >= sliding_max(weighted, self.radius)[left:right])
+            survived &= (offsets >= self.start) & (offsets < self.end)
+            survivors = np.flatnonzero(survived)
+            self.add_survivors(offsets[survivors], scores[survivors], types[:, left:right][:, survivors])
+            self.decided = decide_end
+        carry_start = max(self.decided - self.radius, self.carry_start)
+        self.carry_weighted = weighted[carry_start - self.carry_start:]
+        self.carry_types = types[:, carry_start - self.carry_start:]
+        self.carry_start = carry_start
+
+    def add_survivors(self, offsets: np.ndarray, weighted: np.ndarray, types: np.ndarray):
+        self.offsets = np.concatenate([self.offsets, offsets])
+        self.weighted = np.concatenate([self.weighted, weighted])
+        self.types = np.concatenate([self.types, types], axis=1)
+        self.survivor_num += len(offsets)
+        if len(self.weighted) > self.top_k:
+            kept = select_top_k(self.weighted, self.top_k)
+            self.offsets, self.weighted, self.types = self.offsets[kept], self.weighted[kept], self.types[:, kept]
+        if self.survivor_num > self.top_k and len(self.weighted) > 0:
+            # the k-th best survivor, offsets lower than it will never be output
+            self.threshold = max(self.threshold, float(self.weighted.min()))
+
+    def get_candidates(self, gene_length: int, is_reverse: bool, database_length: int) -> List[MatchCandidate]:
+        """
+        :return: the top_k survivors in the order of offset
+        """
+        types = self.types.tolist()
+        return [MatchCandidate(left=offset,
+                               right=offset + gene_length - 1,
+                               is_reverse=is_reverse,
+                               database_length=database_length,
+                               weighted_similarity=weighted,
+                               similarity_dict={k: v[idx] for k, v in zip(self.similarity_types, types)})
+                for idx, (offset, weighted) in enumerate(zip(self.offsets.tolist(), self.weighted.tolist()))]
+
+
+def sliding_max(scores: np.ndarray, radius: int) -> np.ndarray:
+    """
+    :return: max of scores[i - radius: i + radius + 1] for every i
+    """
+    result = scores.copy()
+    for shift in range(1, min(radius, len(scores) - 1) + 1):
+        np.maximum(result[:-shift], scores[shift:], out=result[:-shift])
+        np.maximum(result[shift:], scores[:-shift], out=result[shift:])
+    return result
+
+
+def select_top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    :return: sorted indexes of the k largest scores, the lower index wins on ties
+    """
+    if len(scores) <= k:
+        return np.arange(len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    greater = np.flatnonzero(scores > kth)
+    equal = np.flatnonzero(scores == kth)[:k - len(greater)]
+    return np.sort(np.concatenate([greater, equal]))
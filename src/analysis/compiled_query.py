@@ -0,0 +1,105 @@
+from typing import Mapping, Tuple, Dict
+
+import numpy as np
+
+from analysis.models.match_pattern import MatchPattern
+from analysis.models.similarity_type import SimilarityType
+from analysis.similarities.base_similarity import BaseSimilarity
+from analysis.similarities.similarity_factory import SimilarityFactory
+from utils.gene_util import encode_dna
+
+
+class CompiledQuery:
+    """
+    Everything of one query which does not depend on the offset: encoded gene, compiled match pattern, scorer
+    instances and weights. It is built once per query and scores any offset of the database.
+    """
+
+    def __init__(self,
+                 gene: str,
+                 weighted: Mapping[SimilarityType, int],
+                 max_patience: int = 2,
+                 conditions: dict = None,
+                 continuous_mismatch_limit: int = None,
+                 match_pattern: MatchPattern = None):
+        self.gene = gene
+        self.gene_array = encode_dna(gene)
+        if match_pattern is None and conditions:
+            match_pattern = MatchPattern(gene, conditions)
+        self.match_pattern = match_pattern
+        self.weighted = {k: v for k, v in weighted.items() if v > 0}
+        self.weight_sum = sum(self.weighted.values(), 0.0)
+        self.similarities = {similarity_type: SimilarityFactory.get_similarity(
+            similarity_type=similarity_type,
+            continuous_mismatch_limit=continuous_mismatch_limit,
+            max_patience=max_patience,
+            match_pattern=self.match_pattern,
+            mid_limit=10,
+            end_limit=2
+        ) for similarity_type in self.weighted}
+        self.max_similarity = [self.similarities[similarity_type].get_max_similarity(gene) * weight
+                               for similarity_type, weight in self.weighted.items()]
+        self.support_array = all(support_array(similarity) for similarity in self.similarities.values())
+
+    def score(self, database: str, offset: int, threshold: float = None) -> Tuple[float, Dict[SimilarityType, float]]:
+        """
+        :param threshold: once the weighted similarity can not reach threshold, stop early and return 0 for all
+        :return: weighted similarity and similarity of each type of offset
+        """
+        weighted_similarity = 0.0
+        similarity = {}
+        for idx, (similarity_type, weight) in enumerate(self.weighted.items()):
+            similarity_compute = self.similarities[similarity_type]
+            if threshold is None:
+                score, info = similarity_compute.get_similarity(self.gene, database, offset)
+            else:
+                type_threshold = (threshold * self.weight_sum - weighted_similarity -
+                                  sum(self.max_similarity[idx + 1:])) / weight
+                score, info = similarity_compute.get_similarity(self.gene, database, offset, type_threshold)
+                # add up in the same order as weighted similarity, so the upper bound is never lower than it
+                upper_bound = weighted_similarity + score * weight
+                for remain in self.max_similarity[idx + 1:]:
+                    upper_bound += remain
+                if upper_bound / self.weight_sum < threshold:
+                    return 0.0, {k: 0.0 for k in self.weighted}
+                if score < type_threshold:
+                    score, info = similarity_compute.get_similarity(self.gene, database, offset)
+            similarity[similarity_type] = score
+            weighted_similarity += score * weight
+        return weighted_similarity / self.weight_sum, similarity
+
+    def score_range(self, database: np.ndarray, start: int, end: int,
+                    scores: Mapping[SimilarityType, np.ndarray] = None) \
+            -> Tuple[np.ndarray, Dict[SimilarityType, np.ndarray]]:
+        """
+        Vectorized score for every offset in [start, end) of the encoded database, raise NotImplementedError if any
+        similarity type does not support array computing.
+        :param scores: similarity arrays of some types computed already, they are used as is
+        """
+        weighted_similarity = np.zeros(end - start, dtype=np.float64)
+        similarity = {}
+        for similarity_type, weight in self.weighted.items():
+            if scores and similarity_type in scores:
+                score = scores[similarity_type]
+            else:
+                score = self.similarities[similarity_type].get_similarity_array(self.gene_array, database, start, end)
+            similarity[similarity_type] = score
+            weighted_similarity += score * weight
+        return weighted_similarity / self.weight_sum, similarity
+
+    def render(self, database: str, offset: int) -> list:
+        """
+        :return: gene format, target format and match format of each similarity type, in the order of type value
+        """
+        result = []
+        for similarity_type in sorted(self.weighted, key=lambda arg: arg.value):
+            result.extend(self.similarities[similarity_type].rendering_sequence(self.gene, database, offset))
+        return result
+
+
+def support_array(similarity: BaseSimilarity):
+    return type(similarity).get_similarity_array is not BaseSimilarity.get_similarity_array
+
+
+def support_similarity_array(weighted: Mapping[SimilarityType, int]):
+    return all(support_array(SimilarityFactory.get_similarity(similarity_type)) for similarity_type in weighted)
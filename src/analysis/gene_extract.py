@@ -2,8 +2,8 @@ from dataclasses import dataclass
 import os
 import traceback
 
+from utils.genome_sequence import GenomeSequence
 from utils.ncbi_database import NCBIDatabase
-from utils.gene_util import get_opposite_dna
 from utils.str_util import StrConverter
 
 
@@ -30,34 +30,39 @@ class GeneExtract:
             self.inv_headers.append(col_name)
 
     def run(self):
-        dna_code = self.gene_reader.dna_code
+        genome = self.gene_reader.genome
         with open(self.result_path, 'w', encoding='utf8') as fw:
             if self.gene_extract_based == 'gene':
-                self.extract_sequence_based_on_gene(dna_code, fw)
+                self.extract_sequence_based_on_gene(genome, fw)
             elif self.gene_extract_based == 'range':
-                self.extract_sequence_based_on_range(dna_code, fw)
+                self.extract_sequence_based_on_range(fw)
 
-    def extract_sequence_based_on_gene(self, dna_code, fw):
+    def extract_sequence_based_on_gene(self, genome: GenomeSequence, fw):
         fw.write('No\tgene\tfrom\t\tend\tproduct\tsequence\n')
-        for gene_idx, gene in enumerate(open(self.rna_path)):
-            gene = gene.strip()
+        genes = [gene.strip() for gene in open(self.rna_path)]
+        # by gene name, locus tag, synonym, GeneID or db_xref, see utils.feature_lookup
+        matches = self.gene_reader.get_feature_lookup().resolve(genes)
+        for gene_idx, (gene, match) in enumerate(zip(genes, matches)):
             succ = False
-            for idx in self.gene_reader.gene_name_segment_map.get(gene, []):
+            for idx in match.indices:
                 gene_segment = self.gene_reader.gene_segments[idx]
                 succ = True
                 start = gene_segment.cds[0]
                 end = gene_segment.cds[1]
                 product = gene_segment.product
-                sequence = dna_code[start - 1:end]
+                sequence = genome[start - 1:end]
                 fw.write('d%d\t%s\t%s\t%s\t%s\t%s\n' % (
                     gene_idx + 1, gene, start, end, product, sequence))
             if not succ:
                 print('%s not found in %s' % (gene, self.data_path))
 
-    def extract_sequence_based_on_range(self, dna_code, fw):
+    def extract_sequence_based_on_range(self, fw):
         lines = [line.strip() for line in open(self.rna_path, 'r', encoding='utf8')]
         self.generate_header(lines[0])
         fw.write(lines[0] + '\n')
+        results = []
+        ranges = []
+        range_rows = []
         for line in lines[1:]:
             result = {}
             infos = line.strip().split('\t')
@@ -66,24 +71,27 @@ class GeneExtract:
             if result.get('sequence', '') == '':
                 try:
                     a, b = map(int, [infos[self.left_idx], infos[self.right_idx]])
-                    left = min(a, b)
-                    right = max(a, b)
-                    direction = a < b
-                    # id start from 0
-                    left -= 1
-                    right -= 1
-                    if not direction:
-                        left += 1
-                        right += 1
-                    dna = dna_code[left:right]
-                    if not direction:
-                        result['sequence'] = get_opposite_dna(dna[::-1])
-                    else:
-                        result['sequence'] = dna
+                    # the base at b is not included
+                    ranges.append((a, b - 1, False) if a < b else (b + 1, a, True))
+                    range_rows.append(len(results))
                 except:
                     print(infos)
                     traceback.print_exc()
-            fw.write(self.extract_output(result) + '\n')
+            results.append(result)
+        written = 0
+
+        def write_until(row_end):
+            nonlocal written
+            for result in results[written:row_end]:
+                fw.write(self.extract_output(result) + '\n')
+            written = max(written, row_end)
+
+        def write_sequence(index, sequence):
+            results[range_rows[index]]['sequence'] = sequence
+            write_until(range_rows[index] + 1)
+
+        self.gene_reader.get_sequences(ranges, write_sequence)
+        write_until(len(results))
 
     def extract_output(self, result):
         output = []
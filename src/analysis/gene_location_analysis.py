@@ -1,10 +1,11 @@
 import os
 import re
-from copy import deepcopy
 from dataclasses import dataclass
 from enum import Enum
 from typing import Tuple, Set
 
+from src.analysis.match_result_table import load_match_rows, get_similarity_names, FormatFields
+from src.analysis.models.similarity_type import SimilarityType
 from src.utils.ecocyc_data_loader import EcocycDataLoader, EcocycInterRecord
 from src.utils.str_util import StrConverter
 
@@ -24,9 +25,10 @@ class GeneLocationAnalysis:
         self.ecocyc_data_loader = EcocycDataLoader(self.ecocyc_file_path, self.output_promoter)
 
         self.data_name = os.path.basename(self.input_file_path)
-        self.result_path = StrConverter.generate_result_file_name(self.input_file_path, self.output_directory,
-                                                                  'location')
-        self.sub_result_path = StrConverter.generate_result_file_name(self.input_file_path, self.output_directory,
+        # the columnar result of gene similarity match is named the same as the text report
+        report_path = re.sub(r'\.npy$', '.txt', self.input_file_path)
+        self.result_path = StrConverter.generate_result_file_name(report_path, self.output_directory, 'location')
+        self.sub_result_path = StrConverter.generate_result_file_name(report_path, self.output_directory,
                                                                       'sub_location')
         self.ecocyc_data_loader.build_database()
         if self.filter_gene_path:
@@ -37,21 +39,10 @@ class GeneLocationAnalysis:
             self.remain_gene = None
 
     def run(self):
-        todo_list = []
-        buff = []
-        for line in open(self.input_file_path, 'r', encoding='utf8'):
-            line = line.strip()
-            if line == '':
-                continue
-            elif line[0] == '(' and line[-1] == ')':
-                continue
-            elif line.startswith('>NC'):
-                if len(buff) > 0:
-                    todo_list.append(self.parse_similarity_data(buff))
-                    buff.clear()
-            buff.append(line)
-        if len(buff) > 0:
-            todo_list.append(self.parse_similarity_data(buff))
+        if self.input_file_path.endswith('.npy'):
+            todo_list = self.load_similarity_table(self.input_file_path)
+        else:
+            todo_list = self.load_similarity_report(self.input_file_path)
         with open(self.result_path, 'w', encoding='utf8') as fw:
             for idx, data in enumerate(todo_list):
                 self.process_one_data(data)
@@ -81,6 +72,45 @@ class GeneLocationAnalysis:
                                 fw.write(location_info + '\n')
                             fw.write('\n')
 
+    def load_similarity_report(self, file_path):
+        todo_list = []
+        buff = []
+        for line in open(file_path, 'r', encoding='utf8'):
+            line = line.strip()
+            if line == '':
+                continue
+            elif line[0] == '(' and line[-1] == ')':
+                continue
+            elif line.startswith('>NC'):
+                if len(buff) > 0:
+                    todo_list.append(self.parse_similarity_data(buff))
+                    buff.clear()
+            buff.append(line)
+        if len(buff) > 0:
+            todo_list.append(self.parse_similarity_data(buff))
+        return todo_list
+
+    @staticmethod
+    def load_similarity_table(file_path):
+        """
+        the same data as parse_similarity_data of the text report, read from the columnar result without parsing,
+        with the fields of its row in 'row', which extract_sub_data reads in place of match_info
+        """
+        todo_list = []
+        for row in load_match_rows(file_path):
+            start, end = row['start'], row['end']
+            todo_list.append({
+                'additional': [],
+                'start': start,
+                'end': end,
+                'header': '>%s/%s-%s' % (row['data_name'], start, end),
+                'match_info': render_match_info(row),
+                'direction': ('>' if start < end else '<') * 10,
+                'location_result': [],
+                'row': row
+            })
+        return todo_list
+
     def pass_filter_sub_location(self, sub_data):
         def extract_gene_start_end(gene_sequence):
             items = re.split(r'\t|\n', gene_sequence)
@@ -102,16 +132,20 @@ class GeneLocationAnalysis:
         return True
 
     def extract_sub_data(self, data):
-        match_info = data['match_info'].split('\n')
-        best_cnt = None
-        for kv in match_info:
-            if kv.find(':') >= 0:
-                k, v = kv.split(':')
-                if k.find('consistency_match_format') >= 0:
-                    match_format = v.strip()
-            elif kv.find('consistency_similarity') >= 0:
-                k, v = kv.split('\t')
-                best_cnt = int(float(v.strip()))
+        row = data.get('row')
+        if row is not None:
+            match_format, best_cnt = row['consistency_match_format'], int(round(row['consistency_similarity'], 2))
+        else:
+            match_info = data['match_info'].split('\n')
+            best_cnt = None
+            for kv in match_info:
+                if kv.find(':') >= 0:
+                    k, v = kv.split(':')
+                    if k.find('consistency_match_format') >= 0:
+                        match_format = v.strip()
+                elif kv.find('consistency_similarity') >= 0:
+                    k, v = kv.split('\t')
+                    best_cnt = int(float(v.strip()))
         cur_cnt = 0
         start = None
         step = 1 if data['start'] < data['end'] else -1
@@ -125,12 +159,18 @@ class GeneLocationAnalysis:
             if cur_cnt == best_cnt:
                 sub_start = data['start'] + step * start
                 sub_end = data['start'] + step * end
-                sub_data = deepcopy(data)
+                sub_data = dict(data)
+                sub_data['additional'] = list(data['additional'])
+                sub_data['location_result'] = []
                 sub_data['left'] = str(start + 1)
                 sub_data['right'] = str(end + 1)
                 sub_data['start'] = sub_start
                 sub_data['end'] = sub_end
                 sub_data['header'] = '%s/%s-%s' % (data['header'].split('/')[0], sub_start, sub_end)
+                if row is not None:
+                    sub_data['match_info'] = render_match_info(row, (start, end))
+                    yield sub_data
+                    continue
                 output = []
                 for match_info_data in match_info:
                     if match_info_data.find(':') >= 0:
@@ -143,7 +183,6 @@ class GeneLocationAnalysis:
                         k, v = match_info_data.split('\t')
                         output.append(k + '\t' + v)
                 sub_data['match_info'] = '\n'.join(output)
-                sub_data['location_result'].clear()
                 yield sub_data
 
     def process_one_data(self, data):
@@ -259,11 +298,33 @@ class GeneLocationAnalysis:
             else:
                 output.append(k + '\t' + v)
         data['match_info'] = '\n'.join(output)
-        data['direction'] = ('>' if start < end else '<') * 10
+        data['direction'] = ('>' if data['start'] < data['end'] else '<') * 10
         data['location_result'] = []
         return data
 
 
+def render_match_info(row, span=None):
+    """
+    :param row: fields of one row of the columnar result
+    :param span: (first, last) position of a sub match, the consistency alignment is cut to it
+    :return: match_info of the row, as parse_similarity_data reads it from the text report, or as extract_sub_data
+    renders it of a sub match
+    """
+    separator = ':' if span is None else ': '
+    similarity_names = get_similarity_names(list(row))
+    output = ['name\t' + row['name'], 'weighted_similarity\t%.2f' % row['weighted_similarity']]
+    for similarity_name in similarity_names:
+        output.append('%s_similarity\t%.2f' % (similarity_name, row[similarity_name + '_similarity']))
+    output.append('original      ' + separator + row['gene'])
+    for similarity_name in sorted(similarity_names, key=lambda arg: SimilarityType.from_object(arg).value):
+        for header, field in zip(['gene_format   ', 'target_format ', 'match_format  '], FormatFields):
+            value = row['%s_%s' % (similarity_name, field)]
+            if span is not None and similarity_name == 'consistency':
+                value = value[span[0]:span[1] + 1]
+            output.append('%s_%s%s%s' % (similarity_name, header, separator, value))
+    return '\n'.join(output)
+
+
 def count_coverage(seg_a, seg_b):
     if seg_a[0] > seg_b[0]:
         seg_a, seg_b = seg_b, seg_a
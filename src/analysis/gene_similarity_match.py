@@ -1,9 +1,11 @@
-import heapq
-import multiprocessing
+import hashlib
+import json
 import os
 import re
-from random import random
+import zlib
+from collections import Counter
 
+import numpy as np
 import pandas as pd
 from typing import List, Mapping
 from concurrent.futures import ThreadPoolExecutor
@@ -12,15 +14,24 @@ from analysis.models.match_candidate import MatchCandidate
 from analysis.models.similarity_type import SimilarityType
 from analysis.models.order_type import OrderType
 from analysis.gene_location_analysis import GeneLocationAnalysis
-from analysis.similarities.pattern_similarity import MatchPattern
-from analysis.similarities.similarity_factory import SimilarityFactory
-from utils.factories.logger_factory import LoggerFactory
-from utils.ncbi_database import NCBIDatabase
-from utils.gene_util import get_opposite_dna
+from analysis.candidate_store import CandidateStore
+from analysis.compiled_query import CompiledQuery, support_similarity_array
+from analysis.match_checkpoint import MatchCheckpoint
+from analysis.match_result_table import FormatFields, save_match_table
+from analysis.qgram_filter import QGramFilter
+from analysis.score_cache import ScoreCache
+from analysis.scan_executor import ScanExecutor, unpack_candidates
+from analysis.similarities.direct_match_similarity import DirectMatchSimilarity
+from analysis.similarities.pattern_similarity import PatternSimilarity
+from utils.factories.logger_factory import LoggerFactory, ProgressMeter
+from utils.ncbi_database import LoadProfile, NCBIDatabase
+from utils.qgram_index import QGramIndex
 from utils.str_util import StrConverter
-from collections import deque
 
-CandidateClearSize = 10000
+ScanBlockSize = 4096
+ArraySegmentMinGap = 256
+# chunks per strand of one query, fixed so that the output does not depend on the number of workers
+ChunkNum = 32
 
 
 class GeneSimilarityMatch:
@@ -35,7 +46,16 @@ class GeneSimilarityMatch:
                  conditions: dict = None,
                  continuous_mismatch_limit: int = None,
                  order_type: OrderType = OrderType.Decrement,
-                 gene_name_filter=None):
+                 gene_name_filter=None,
+                 vectorized_scan: bool = True,
+                 qgram_size: int = None,
+                 qgram_index_directory: str = None,
+                 process_num: int = None,
+                 query_batch_size: int = 16,
+                 checkpoint_directory: str = None,
+                 score_cache_directory: str = None,
+                 pattern_gate: bool = False,
+                 result_table: bool = False):
         self.gene_path = gene_path
         self.data_path = data_path
         self.output_directory = output_directory
@@ -47,69 +67,366 @@ class GeneSimilarityMatch:
         self.continuous_mismatch_limit = continuous_mismatch_limit
         self.order_type = order_type
         self.gene_name_filter = gene_name_filter
+        self.vectorized_scan = vectorized_scan
+        self.qgram_size = qgram_size
+        self.qgram_index_directory = qgram_index_directory
+        self.process_num = process_num
+        self.query_batch_size = query_batch_size
+        self.checkpoint_directory = checkpoint_directory
+        self.score_cache_directory = score_cache_directory
+        self.pattern_gate = pattern_gate
+        self.result_table = result_table
         self.data_name = os.path.basename(self.data_path)
+        self.genome = None
+        self.rev_genome = None
+        self.genome_length = 0
         self.dna_code = None
         self.rev_dna_code = None
+        self.dna_array = None
+        self.rev_dna_array = None
+        self.qgram_index = None
+        self.rev_qgram_index = None
+        self.genome_checksum = None
+        self.score_cache = None
 
         file_name = os.path.basename(self.gene_path)
         file_prefix = StrConverter.extract_file_name(file_name)
         self.result_path = os.path.join(self.output_directory,
                                         '%s_match_result.txt' % file_prefix)
-        self.gene_reader = NCBIDatabase(self.data_path)
+        # columnar result, see analysis.match_result_table
+        self.table_path = os.path.join(self.output_directory, '%s_match_result.npy' % file_prefix)
+        self.gene_reader = NCBIDatabase(self.data_path, load_profile=LoadProfile.Sequence)
         self.logger = LoggerFactory()
         self.weighted_sum = sum([v for k, v in self.weighted.items()])
         assert self.weighted_sum > 0
         self.initialize()
 
     def initialize(self):
-        self.dna_code = self.gene_reader.dna_code
-        self.rev_dna_code = get_opposite_dna(self.gene_reader.dna_code[::-1])
+        self.genome = self.gene_reader.genome
+        self.rev_genome = self.genome.reverse_complement()
+        self.genome_length = len(self.genome)
+        if self.vectorized_scan or self.qgram_size:
+            self.dna_array = self.genome.to_array()
+            self.rev_dna_array = self.rev_genome.to_array()
+        self.genome_checksum = zlib.crc32(self.get_dna_array(False))
+        if self.score_cache_directory:
+            self.score_cache = ScoreCache(self.score_cache_directory, self.genome_checksum, self.get_type_parameters())
+        if self.qgram_size:
+            self.qgram_index, self.rev_qgram_index = [
+                QGramIndex.load_or_build(dna_array, self.qgram_size, os.path.join(
+                    self.qgram_index_directory, '%s.q%d.%s.npz' % (self.data_name, self.qgram_size, strand)
+                ) if self.qgram_index_directory else None)
+                for dna_array, strand in [(self.dna_array, 'forward'), (self.rev_dna_array, 'reverse')]]
+
+    def get_dna_array(self, is_reverse):
+        if self.dna_array is None:
+            self.dna_array = self.genome.to_array()
+            self.rev_dna_array = self.rev_genome.to_array()
+        return self.rev_dna_array if is_reverse else self.dna_array
+
+    def get_dna_code(self, is_reverse):
+        """
+        strand as str, which is only needed to score offset by offset and to render candidates, so it is decoded at
+        the first use
+        """
+        if self.dna_code is None:
+            self.dna_code, self.rev_dna_code = [self.get_dna_array(strand).tobytes().decode('ascii')
+                                                for strand in [False, True]]
+        return self.rev_dna_code if is_reverse else self.dna_code
+
+    def use_similarity_array(self):
+        return self.vectorized_scan and support_similarity_array(self.weighted)
 
     def run(self, gene_name_filter: GeneLocationAnalysis = None):
         self.gene_name_filter = gene_name_filter
+        gene_datas = pd.read_csv(self.gene_path, sep='\t')
+        records = [(name, gene.lower()) for name, gene in zip(gene_datas['name'], gene_datas['gene'])]
+        if self.checkpoint_directory:
+            self.run_with_checkpoint(records)
+            return
+        table_rows = [None] * len(records) if self.result_table else None
         with open(self.result_path, 'w', encoding='utf8') as fw:
-            gene_datas = pd.read_csv(self.gene_path, sep='\t')
-            records = [record for _, record in gene_datas.iterrows()]
-            solved = 0
-            total = len(gene_datas)
-            self.logger.info_with_expire_time(
-                'Doing Similarity Matching: %d/%d(%.2f%%)' % (
-                    solved, total, solved * 100.0 / total), solved, total)
-            with multiprocessing.Pool(min(multiprocessing.cpu_count(), 2)) as p:
-                for ret in p.imap(self.find_candidate_for_gene, records):
-                    fw.write(ret)
+            # contents of the finished queries waiting for the queries before them, so that the output is always in
+            # the order of records
+            contents = {}
+            written = 0
+            for query_id, rows in self.match_records(records):
+                contents[query_id] = self.render_rows(rows)
+                if table_rows is not None:
+                    table_rows[query_id] = rows
+                while written in contents:
+                    fw.write(contents.pop(written))
                     fw.flush()
+                    written += 1
+        if table_rows is not None:
+            save_match_table(self.table_path, [row for rows in table_rows for row in rows], list(self.weighted))
+
+    def run_with_checkpoint(self, records):
+        """
+        every finished query is saved as a fragment at once, a rerun with the same parameters skips them, and the
+        result file is only written when all queries are finished
+        """
+        checkpoint = MatchCheckpoint(self.checkpoint_directory, self.get_parameter_hash(), with_rows=self.result_table)
+        keys = [MatchCheckpoint.get_query_key(name, gene) for name, gene in records]
+        query_ids = [query_id for query_id, key in enumerate(keys) if not checkpoint.is_finished(key)]
+        if len(query_ids) < len(records):
+            self.logger.info('Skip %d finished queries in %s' % (len(records) - len(query_ids),
+                                                                 self.checkpoint_directory))
+        for query_id, rows in self.match_records(records, query_ids):
+            checkpoint.save(keys[query_id], self.render_rows(rows), rows if self.result_table else None)
+        checkpoint.merge(keys, self.result_path)
+        if self.result_table:
+            save_match_table(self.table_path, checkpoint.load_rows(keys), list(self.weighted))
+
+    def get_parameter_hash(self):
+        """
+        :return: hash of everything the result depends on, settings only about speed are not included
+        """
+        parameters = {
+            'weighted': {similarity_type.name: weight for similarity_type, weight in self.weighted.items()},
+            'patience': self.patience,
+            'conditions': self.get_conditions_key(),
+            'continuous_mismatch_limit': self.continuous_mismatch_limit,
+            'top_k': self.top_k,
+            'candidate_distance': self.candidate_distance,
+            'order_type': self.order_type.name,
+            'pattern_gate': self.pattern_gate,
+            'data_name': self.data_name,
+            'genome': self.genome_checksum
+        }
+        return hashlib.sha1(json.dumps(parameters, sort_keys=True).encode('utf8')).hexdigest()
+
+    def get_conditions_key(self):
+        if not self.conditions:
+            return None
+        # MatchPattern sorts the conditions in place, so their order does not matter
+        return {key: sorted(json.dumps(condition, sort_keys=True) for condition in value)
+                for key, value in self.conditions.items()}
+
+    def get_type_parameters(self):
+        """
+        :return: parameters the similarity of each weighted type depends on
+        """
+        parameters = {
+            SimilarityType.Direct: None,
+            SimilarityType.Consistency: self.patience,
+            SimilarityType.TextEdit: self.continuous_mismatch_limit,
+            SimilarityType.Pattern: self.get_conditions_key(),
+            SimilarityType.Blat: [10, 2]
+        }
+        return {similarity_type: parameters[similarity_type] for similarity_type in self.weighted}
+
+    def match_records(self, records, query_ids=None):
+        """
+        :param records: list of (name, gene)
+        :param query_ids: index of records to be matched, all records by default
+        :return: iterator of (query_id, result rows), in the order of completion, see get_result_rows
+        """
+        query_ids = list(range(len(records)) if query_ids is None else query_ids)
+        # genes with scores not cached yet, the cache is finished when all their queries are finished
+        cache_genes = Counter()
+        if self.score_cache is not None:
+            scanned = []
+            for query_id in query_ids:
+                name, gene = records[query_id]
+                rows = self.rank_from_cache(name, gene)
+                if rows is not None:
+                    yield query_id, rows
+                    continue
+                if gene not in cache_genes:
+                    self.create_score_cache(gene)
+                cache_genes[gene] += 1
+                scanned.append(query_id)
+            query_ids = scanned
+        if len(query_ids) == 0:
+            return
+        solved = 0
+        total = len(query_ids)
+        chunks = list(self.iterate_chunks())
+        similarity_types = list(self.weighted)
+        batches = self.get_query_batches([(query_id, records[query_id][1]) for query_id in query_ids])
+        # windows of all chunks finished by the workers, one line with the ETA of the whole run
+        progress = ProgressMeter(
+            sum(self.count_windows(len(records[batch[0]][1]), is_reverse, start, end) * len(batch)
+                for batch in batches for is_reverse, start, end in chunks),
+            lambda windows_solved, windows_total: 'Doing Similarity Matching: %d/%d queries, '
+                                                  '%d/%d windows(%.2f%%)' % (
+                solved, total, windows_solved, windows_total, windows_solved * 100.0 / max(windows_total, 1)))
+        units = ((batch_id * len(chunks) + chunk_id,
+                  ([records[query_id] for query_id in batch], is_reverse, start, end))
+                 for batch_id, batch in enumerate(batches)
+                 for chunk_id, (is_reverse, start, end) in enumerate(chunks))
+        # packed candidates of each chunk for the batches not finished yet
+        chunk_results = {}
+        with ScanExecutor(self, self.process_num) as executor:
+            for unit_id, packed in executor.imap_unordered(units):
+                batch_id, chunk_id = divmod(unit_id, len(chunks))
+                batch = batches[batch_id]
+                is_reverse, start, end = chunks[chunk_id]
+                progress.add(self.count_windows(len(records[batch[0]][1]), is_reverse, start, end) * len(batch))
+                chunk_result = chunk_results.setdefault(batch_id, [None] * len(chunks))
+                chunk_result[chunk_id] = packed
+                if any(result is None for result in chunk_result):
+                    continue
+                del chunk_results[batch_id]
+                for idx, query_id in enumerate(batch):
+                    name, gene = records[query_id]
+                    candidates = []
+                    for (is_reverse, _, _), packed in zip(chunks, chunk_result):
+                        candidates.extend(unpack_candidates(packed[idx], similarity_types, len(gene), is_reverse,
+                                                            self.get_database_length(is_reverse)))
+                    if gene in cache_genes:
+                        cache_genes[gene] -= 1
+                        if cache_genes[gene] == 0:
+                            self.finish_score_cache(gene)
                     solved += 1
-                    self.logger.info_with_expire_time(
-                        'Doing Similarity Matching: %d/%d(%.2f%%)' % (
-                            solved, total, solved * 100.0 / total), solved, total)
+                    yield query_id, self.get_result_rows(name, gene, candidates)
 
-    def find_candidate_for_gene(self, record: pd.Series):
-        def next_interval(size, thread_cnt):
-            batch_size = size // thread_cnt
-            last_pos = 0
-            while last_pos < size:
-                next_pos = min(last_pos + batch_size, size)
-                yield last_pos, next_pos
-                last_pos = next_pos
+    def get_query_batches(self, queries):
+        """
+        :param queries: list of (query_id, gene)
+        :return: batches of query ids, the genes in a batch have the same length and are scanned together
+        """
+        batches = []
+        open_batches = {}
+        for query_id, gene in queries:
+            batch = open_batches.get(len(gene))
+            if batch is None or len(batch) >= max(self.query_batch_size, 1):
+                batch = open_batches[len(gene)] = []
+                batches.append(batch)
+            batch.append(query_id)
+        return batches
+
+    def get_database_length(self, is_reverse):
+        # the reverse complement keeps every base, so both strands have the same length
+        return self.genome_length
 
+    def count_windows(self, gene_length, is_reverse, start, end):
+        """
+        :return: number of offsets in [start, end) where the gene fits in the database
+        """
+        return max(min(end, self.get_database_length(is_reverse) - gene_length + 1) - start, 0)
+
+    def iterate_chunks(self):
+        """
+        :return: (is_reverse, start, end) of every chunk of both strands
+        """
+        size = self.genome_length
+        batch_size = max(size // ChunkNum, 1)
+        for start in range(0, size, batch_size):
+            end = min(start + batch_size, size)
+            yield False, start, end
+            yield True, start, end
+
+    def find_candidate_for_gene(self, record: pd.Series):
         name, gene = record['name'], record['gene'].lower()
+        if self.score_cache is not None:
+            rows = self.rank_from_cache(name, gene)
+            if rows is not None:
+                return self.render_rows(rows)
+            self.create_score_cache(gene)
+        chunks = list(self.iterate_chunks())
+        progress = ProgressMeter(
+            sum(self.count_windows(len(gene), is_reverse, start, end) for is_reverse, start, end in chunks),
+            lambda solved, total: 'Analysis for %s: %d/%d(%.2f%%)' % (name, solved, total,
+                                                                      solved * 100.0 / max(total, 1)),
+            stride=ScanBlockSize * ChunkNum)
         candidates = []
         with ThreadPoolExecutor() as executor:
-            tasks = []
-            for start, end in next_interval(len(self.dna_code), 32):
-                tasks.append(executor.submit(self.match_gene, name, gene, False, start, end))
-                tasks.append(executor.submit(self.match_gene, name, gene, True, start, end))
+            tasks = [executor.submit(self.match_gene, name, gene, is_reverse, start, end, progress)
+                     for is_reverse, start, end in chunks]
             for task in tasks:
                 candidates.extend(task.result())
+        if self.score_cache is not None:
+            self.finish_score_cache(gene)
+        return self.render_candidates(name, gene, candidates)
+
+    def create_score_cache(self, gene):
+        for is_reverse in [False, True]:
+            self.score_cache.create_parts(gene, is_reverse, self.get_database_length(is_reverse) - len(gene) + 1)
+
+    def finish_score_cache(self, gene):
+        for is_reverse in [False, True]:
+            self.score_cache.finish_parts(gene, is_reverse)
+
+    def rank_from_cache(self, name, gene):
+        """
+        weighted similarity, candidate suppression and top_k from the cached scores, no similarity is computed
+        :return: result rows, None if the scores of gene are not cached
+        """
+        strand_scores = [self.score_cache.load(gene, is_reverse) for is_reverse in [False, True]]
+        if any(scores is None for scores in strand_scores):
+            return None
+        query = self.compile_query(gene)
+        candidates = []
+        for is_reverse, start, end in self.iterate_chunks():
+            database_length = self.get_database_length(is_reverse)
+            end, scan_start, scan_end = self.get_scan_range(len(gene), database_length, start, end)
+            store = CandidateStore(list(self.weighted), self.top_k, self.candidate_distance, start, end)
+            if scan_start < scan_end:
+                weighted_scores, type_scores = query.score_range(
+                    None, scan_start, scan_end,
+                    scores={k: v[scan_start:scan_end].astype(np.float64) for k, v in strand_scores[is_reverse].items()})
+                gate = self.get_pattern_gate(query, is_reverse, scan_start, scan_end)
+                if gate is not None:
+                    weighted_scores = np.where(gate, weighted_scores, 0.0)
+                if self.order_type == OrderType.Increment:
+                    weighted_scores = -weighted_scores
+                store.add_block(scan_start, weighted_scores, type_scores, True)
+            candidates.extend(store.get_candidates(len(gene), is_reverse, database_length))
+        return self.get_result_rows(name, gene, candidates)
+
+    def get_scan_range(self, gene_length, database_length, start, end):
+        """
+        offsets next to the chunk decide whether candidates at its edges are kept, so scan them too, but leave
+        their own candidates to the adjacent chunks
+        :return: end clamped to the database, [scan_start, scan_end) to be scanned
+        """
+        end = min(database_length - gene_length + 1, end)
+        margin = max(self.candidate_distance - 1, 0)
+        return end, max(start - margin, 0), min(database_length - gene_length + 1, end + margin)
+
+    def render_candidates(self, name, gene, candidates: List[MatchCandidate]):
+        return self.render_rows(self.get_result_rows(name, gene, candidates))
+
+    def get_result_rows(self, name, gene, candidates: List[MatchCandidate]):
+        """
+        :return: fields of the top_k candidates by weighted similarity, see analysis.match_result_table
+        """
         candidates = list(candidates)
         candidates.sort(key=lambda arg: -arg.weighted_similarity)
         candidates = candidates[:self.top_k]
         if self.order_type == OrderType.Increment:
             for candidate in candidates:
                 candidate.weighted_similarity = -candidate.weighted_similarity
-        results = self.render_similarity_for_candidates(gene, candidates[:self.top_k])
+        results = self.render_similarity_for_candidates(self.compile_query(gene), candidates[:self.top_k])
+        rows = []
+        for idx, candidate_result in enumerate(results):
+            candidate = candidate_result[0]
+            row = {
+                'data_name': self.data_name.replace(".txt", ''),
+                'name': name,
+                'gene': gene,
+                'rank': idx + 1,
+                'strand': '-' if candidate.is_reverse else '+',
+                'start': candidate.start,
+                'end': candidate.end,
+                'weighted_similarity': candidate.weighted_similarity
+            }
+            for similarity_name in self.weighted:
+                row[similarity_name.name.lower() + '_similarity'] = candidate.similarity_dict[similarity_name]
+            offset = 1
+            for similarity_name in sorted(self.weighted, key=lambda arg: arg.value):
+                for field, value in zip(FormatFields, candidate_result[offset:offset + 3]):
+                    row['%s_%s' % (similarity_name.name.lower(), field)] = ''.join(value)
+                offset += 3
+            rows.append(row)
+        return rows
 
+    def render_rows(self, rows):
+        """
+        :return: text report of result rows of one query
+        """
         headers = [
             'name',
             'direction',
@@ -124,157 +441,189 @@ class GeneSimilarityMatch:
             'match_format  :']
 
         content = ''
-        idx = 1
-        for candidate_result in results:
-            candidate = candidate_result[0]
-            content += '(%d)\n' % idx
+        for row in rows:
+            content += '(%d)\n' % row['rank']
             attribute = {
-                'name': name,
-                'direction': '-' if candidate.is_reverse else '+',
-                'weighted_similarity': '%.2f' % candidate.weighted_similarity,
-                'original      :': gene
+                'name': row['name'],
+                'direction': row['strand'],
+                'weighted_similarity': '%.2f' % row['weighted_similarity'],
+                'original      :': row['gene']
             }
             sequence_content = []
-            offset = 1
-            for similarity_name, weight in sorted(self.weighted.items(), key=lambda arg: arg[0]):
-                attribute[similarity_name.name.lower() + '_similarity'] = '%.2f' % candidate.similarity_dict[
-                    similarity_name]
-                for sequence_header, value in zip(sequence_headers, candidate_result[offset:offset + 3]):
-                    value = ''.join(value)
-                    sequence_content.append(similarity_name.name.lower() + "_" + sequence_header + '=' + value)
-                offset += 3
+            for similarity_name, weight in sorted(self.weighted.items(), key=lambda arg: arg[0].value):
+                key = similarity_name.name.lower()
+                attribute[key + '_similarity'] = '%.2f' % row[key + '_similarity']
+                for sequence_header, field in zip(sequence_headers, FormatFields):
+                    sequence_content.append(key + "_" + sequence_header + '=' + row['%s_%s' % (key, field)])
 
             content += '>%s/%s-%s\t%s,%s\n\n' % (
-                self.data_name.replace(".txt", ''),
-                candidate.start,
-                candidate.end,
+                row['data_name'],
+                row['start'],
+                row['end'],
                 ','.join(['%s=%s' % (key, attribute[key]) for key in headers if key in attribute]),
                 ','.join(sequence_content)
             )
-            idx += 1
         return content
 
-    def match_gene(self, name, gene, is_reverse, start, end):
-        database = self.rev_dna_code if is_reverse else self.dna_code
-        candidates: List[MatchCandidate] = []
-        gene_length = len(gene)
-        min_weighted_similarity_in_candidates = 0.0
-        database_length = len(database)
-        tot = end - start
-        similarity_heap = []
-        buff = deque()
-        match_pattern = MatchPattern(gene, self.conditions) if self.conditions else None
-        current_logger = LoggerFactory(int(10 + random() * 120))
-        solved = 0
-        msg = 'Analysis [%s][%s] %d/%d(%.2f%%)' % (
-            name,
-            '-' if is_reverse else '+',
-            solved,
-            tot,
-            solved * 100.0 / tot)
-        current_logger.info_with_expire_time(msg,
-                                             solved,
-                                             tot)
-        end = min(database_length - gene_length + 1, end)
-        for offset in range(start, end):
-            weighted_similarity, similarity_dict = count_similarity(
-                weighted=self.weighted,
-                gene=gene,
-                database=database,
-                offset=offset,
-                max_patience=self.patience,
-                match_pattern=match_pattern,
-                continuous_mismatch_limit=self.continuous_mismatch_limit)
-            if self.order_type == OrderType.Increment:
-                weighted_similarity = -weighted_similarity
-            new_candidate = MatchCandidate(
-                left=offset,
-                right=offset + gene_length - 1,
-                is_reverse=is_reverse,
-                database_length=database_length,
-                weighted_similarity=weighted_similarity,
-                similarity_dict=similarity_dict)
-
-            added_flag = update_candidate_list(new_candidate,
-                                               buff,
-                                               candidates,
-                                               self.candidate_distance)
-            if added_flag:
-                heapq.heappush(similarity_heap, candidates[-1])
-                if len(similarity_heap) > self.top_k:
-                    heapq.heappop(similarity_heap)
-                    top = similarity_heap[0]
-                    min_weighted_similarity_in_candidates = max(min_weighted_similarity_in_candidates,
-                                                                top.weighted_similarity)
-
-            solved += 1
-            msg = 'Analysis for %s[%s](%d~%d): %d/%d(%.2f%%) ' \
-                  '--top_k=%d --top_similarity_info=[%s] ' \
-                  '--gene_length=%d --candidates_num=%d' % (
-                      name,
-                      '-' if is_reverse else '+',
-                      start,
-                      end,
-                      solved,
-                      tot,
-                      solved * 100.0 / tot,
-                      self.top_k,
-                      similarity_heap[0].get_similarity_str() if len(similarity_heap) > 0 else 'None',
-                      gene_length,
-                      len(candidates)
-                  )
-            current_logger.info_with_expire_time(msg,
-                                                 solved,
-                                                 tot)
-
-            if len(candidates) > CandidateClearSize:
-                candidates.sort(key=lambda arg: -arg.weighted_similarity)
-                candidates = candidates[:self.top_k]
-        while len(buff) > 0:
-            update_candidate_list(None, buff, candidates, 1)
-        return candidates
-
-    def render_similarity_for_candidates(self, gene, candidates):
+    def match_gene(self, name, gene, is_reverse, start, end, progress: ProgressMeter = None):
+        return self.match_genes([(name, gene)], is_reverse, start, end, progress)[0]
+
+    def match_genes(self, queries, is_reverse, start, end, progress: ProgressMeter = None):
+        """
+        Scan [start, end) of one strand once for all queries, which must have the same length, every query keeps
+        its own candidate store and top_k threshold.
+        :param queries: list of (name, gene)
+        :param progress: shared by all chunks, the windows in [start, end) are added to it block by block
+        :return: top_k candidates of each query in the order of offset
+        """
+        genes = [gene for _, gene in queries]
+        gene_length = len(genes[0])
+        assert all(len(gene) == gene_length for gene in genes)
+        database_length = self.get_database_length(is_reverse)
+        compiled_queries = [self.compile_query(gene) for gene in genes]
+        end, scan_start, scan_end = self.get_scan_range(gene_length, database_length, start, end)
+        stores = [CandidateStore(list(self.weighted), self.top_k, self.candidate_distance, start, end)
+                  for _ in genes]
+        # scores to be cached must not be pruned
+        parts = [self.score_cache.open_parts(gene, is_reverse) for gene in genes] \
+            if self.score_cache is not None else None
+        upper_bounds = [None] * len(genes)
+        if self.qgram_size and self.order_type == OrderType.Decrement and scan_start < scan_end and parts is None:
+            upper_bounds = [QGramFilter(self.rev_qgram_index if is_reverse else self.qgram_index,
+                                        self.weighted,
+                                        max_patience=self.patience,
+                                        match_pattern=query.match_pattern).get_upper_bound_array(query.gene_array,
+                                                                                                 scan_start,
+                                                                                                 scan_end)
+                            for query in compiled_queries]
+        gates = [self.get_pattern_gate(query, is_reverse, scan_start, scan_end) for query in compiled_queries]
+        for block_start in range(scan_start, scan_end, ScanBlockSize):
+            block_end = min(block_start + ScanBlockSize, scan_end)
+            keeps = []
+            thresholds = []
+            for upper_bound, gate, store in zip(upper_bounds, gates, stores):
+                # offsets which can not beat the top_k threshold will never be output, score them as 0
+                threshold = None
+                if self.order_type == OrderType.Decrement and store.threshold > 0 and parts is None:
+                    threshold = store.threshold
+                keep = None
+                if upper_bound is not None:
+                    keep = upper_bound[block_start - scan_start:block_end - scan_start] >= store.threshold
+                if gate is not None and parts is None:
+                    gate_block = gate[block_start - scan_start:block_end - scan_start]
+                    keep = gate_block if keep is None else keep & gate_block
+                keeps.append(keep)
+                thresholds.append(threshold)
+            block_scores = self.count_similarity_for_blocks(compiled_queries, is_reverse, block_start, block_end,
+                                                            keeps, thresholds)
+            for store, gate, (weighted_scores, type_scores) in zip(stores, gates, block_scores):
+                if gate is not None:
+                    weighted_scores = np.where(gate[block_start - scan_start:block_end - scan_start],
+                                               weighted_scores, 0.0)
+                if self.order_type == OrderType.Increment:
+                    weighted_scores = -weighted_scores
+                store.add_block(block_start, weighted_scores, type_scores, block_end == scan_end)
+            if parts is not None and min(block_end, end) > max(block_start, start):
+                left, right = max(block_start, start), min(block_end, end)
+                for part, (_, type_scores) in zip(parts, block_scores):
+                    for k, v in part.items():
+                        ScoreCache.write_part(v, left, type_scores[k][left - block_start:right - block_start])
+            if progress is not None:
+                progress.add(max(min(block_end, end) - max(block_start, start), 0) * len(genes))
+        for part in parts or []:
+            for v in part.values():
+                v.flush()
+        return [store.get_candidates(gene_length, is_reverse, database_length) for store in stores]
+
+    def get_pattern_gate(self, query: CompiledQuery, is_reverse, start, end):
+        """
+        :return: mask of offsets in [start, end) matching the must conditions of query, None if pattern_gate is off
+        """
+        if not self.pattern_gate or query.match_pattern is None or start >= end:
+            return None
+        _, must = PatternSimilarity(query.match_pattern).get_similarity_and_mask_array(
+            query.gene_array, self.get_dna_array(is_reverse), start, end)
+        return must
+
+    def compile_query(self, gene) -> CompiledQuery:
+        return CompiledQuery(gene,
+                             self.weighted,
+                             max_patience=self.patience,
+                             conditions=self.conditions,
+                             continuous_mismatch_limit=self.continuous_mismatch_limit)
+
+    def count_similarity_for_blocks(self, queries: List[CompiledQuery], is_reverse, start, end, keeps, thresholds):
+        """
+        count_similarity_for_block for several queries of the same length, the direct similarity of all queries is
+        computed in one pass over the block.
+        """
+        scores = [None] * len(queries)
+        if len(queries) > 1 and SimilarityType.Direct in self.weighted and self.use_similarity_array():
+            direct = DirectMatchSimilarity().get_similarity_matrix(np.stack([query.gene_array for query in queries]),
+                                                                   self.get_dna_array(is_reverse),
+                                                                   start,
+                                                                   end)
+            scores = [{SimilarityType.Direct: row} for row in direct]
+        return [self.count_similarity_for_block(query, is_reverse, start, end, keep, threshold, score)
+                for query, keep, threshold, score in zip(queries, keeps, thresholds, scores)]
+
+    def count_similarity_for_block(self, query: CompiledQuery, is_reverse, start, end, keep=None, threshold=None,
+                                   scores=None):
+        """
+        :param keep: mask of offsets in [start, end) to be computed, others are treated as similarity 0
+        :param threshold: offsets with weighted similarity lower than threshold may be treated as similarity 0
+        :param scores: similarity arrays of some types computed already for every offset in [start, end)
+        :return: weighted similarity array and similarity array of each type for every offset in [start, end)
+        """
+        weighted_scores = np.zeros(end - start, dtype=np.float64)
+        type_scores = {k: np.zeros(end - start, dtype=np.float64) for k in self.weighted}
+        use_array = self.vectorized_scan and query.support_array
+        if keep is None:
+            segments = [(0, end - start)]
+        else:
+            # computing a few more offsets is cheaper than one more call of numpy in array mode
+            segments = iterate_segments(keep, ArraySegmentMinGap if use_array else 0)
+        database = self.get_dna_array(is_reverse) if use_array else self.get_dna_code(is_reverse)
+        for left, right in segments:
+            if use_array:
+                weighted_array, type_arrays = query.score_range(
+                    database, start + left, start + right,
+                    scores={k: v[left:right] for k, v in scores.items()} if scores else None)
+                weighted_scores[left:right] = weighted_array
+                for k, v in type_arrays.items():
+                    type_scores[k][left:right] = v
+            else:
+                for idx in range(left, right):
+                    weighted_scores[idx], similarity_dict = query.score(database, start + idx, threshold)
+                    for k, v in similarity_dict.items():
+                        type_scores[k][idx] = v
+        return weighted_scores, type_scores
+
+    def render_similarity_for_candidates(self, query: CompiledQuery, candidates):
         result = []
         for candidate in candidates:
-            database = self.rev_dna_code if candidate.is_reverse else self.dna_code
+            database = self.get_dna_code(candidate.is_reverse)
             candidate_result = [candidate]
-            for similarity_type, weight in sorted(self.weighted.items(), key=lambda arg: arg[0]):
-                candidate_result.extend(
-                    self.render_target_dna_sequence(similarity_type, gene, database, candidate.original_match_left))
+            candidate_result.extend(query.render(database, candidate.original_match_left))
             result.append(candidate_result)
         return result
 
     def render_target_dna_sequence(self, similarity_type: SimilarityType, gene, database, offset):
-        similarity_render = SimilarityFactory.get_similarity(
-            similarity_type=similarity_type,
-            continuous_mismatch_limit=self.continuous_mismatch_limit,
-            max_patience=self.patience,
-            match_pattern=MatchPattern(gene, self.conditions) if self.conditions else None
-        )
-        sequence_gene, sequence_target, sequence = similarity_render.rendering_sequence(gene, database, offset)
-        return sequence_gene, sequence_target, sequence
-
-
-def update_candidate_list(new_candidate: MatchCandidate, buff: deque, candidate_result: list,
-                          keep_size: int):
-    added = False
-    while (len(buff) >= keep_size) or (
-            len(buff) > 0 and new_candidate is not None and abs(buff[0].start - new_candidate.start) >= keep_size):
-        old_candidate = buff.popleft()
-        if not old_candidate.should_ignore:
-            candidate_result.append(old_candidate)
-            added = True
-    if new_candidate is not None:
-        if new_candidate.weighted_similarity <= 0.0:
-            new_candidate.should_ignore = True
-        for candidate in buff:
-            if candidate.weighted_similarity > new_candidate.weighted_similarity:
-                new_candidate.should_ignore = True
-            elif candidate.weighted_similarity < new_candidate.weighted_similarity:
-                candidate.should_ignore = True
-        buff.append(new_candidate)
-    return added
+        return self.compile_query(gene).similarities[similarity_type].rendering_sequence(gene, database, offset)
+
+
+def iterate_segments(mask: np.ndarray, min_gap: int = 0):
+    """
+    :param min_gap: segments with a gap shorter than min_gap are merged
+    :return: [left, right) of each continuous segment of True in mask
+    """
+    changes = np.flatnonzero(np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8)))
+    lefts, rights = changes[0::2], changes[1::2]
+    if len(lefts) > 0 and min_gap > 0:
+        merged = np.flatnonzero(lefts[1:] - rights[:-1] >= min_gap)
+        lefts = np.concatenate([lefts[:1], lefts[merged + 1]])
+        rights = np.concatenate([rights[merged], rights[-1:]])
+    return zip(lefts.tolist(), rights.tolist())
 
 
 def fast_skip(gene_dict, gene_length, database, offset, cut_same, pat):
@@ -307,25 +656,16 @@ def count_similarity(weighted: Mapping[SimilarityType, int],
                      offset: int,
                      max_patience=2,
                      match_pattern=None,
-                     continuous_mismatch_limit=None):
-    weighted_similarity = 0.0
-    total_weight = 0.0
-    similarity = {}
-    for similarity_type, weight in weighted.items():
-        similarity_compute = SimilarityFactory.get_similarity(
-            similarity_type=similarity_type,
-            continuous_mismatch_limit=continuous_mismatch_limit,
-            max_patience=max_patience,
-            match_pattern=match_pattern,
-            mid_limit=10,
-            end_limit=2
-        )
-        score, info = similarity_compute.get_similarity(gene, database, offset)
-        similarity[similarity_type] = score
-        weighted_similarity += score * weight
-        total_weight += weight
-    weighted_similarity = weighted_similarity / total_weight
-    return weighted_similarity, similarity
+                     continuous_mismatch_limit=None,
+                     threshold=None):
+    """
+    :param threshold: once the weighted similarity can not reach threshold, stop early and return 0 for all
+    """
+    return CompiledQuery(gene,
+                         weighted,
+                         max_patience=max_patience,
+                         continuous_mismatch_limit=continuous_mismatch_limit,
+                         match_pattern=match_pattern).score(database, offset, threshold)
 
 
 def update_or_add_min_val(dp, i, j, update_val):
@@ -3,7 +3,6 @@ from dataclasses import dataclass
 
 from utils.factories.logger_factory import LoggerFactory
 from utils.ncbi_database import NCBIDatabase
-from utils.gene_util import get_opposite_dna
 from utils.str_util import StrConverter
 
 
@@ -30,30 +29,51 @@ class GeneStreamAnalysis:
     def get_utr_between(self, first, second):
         left = self.gene_reader.gene_segments[first].cds[1]
         right = self.gene_reader.gene_segments[second].cds[0] - 1
-        return self.gene_reader.dna_code[left:right]
+        return self.gene_reader.genome[left:right]
+
+    def work_for_gene_indexes(self, items):
+        """
+        :param items: (index, start, end) of each gene segment
+        :return: (stream, upstream, downstream) of each gene segment, all extracted at once
+        """
+        ranges = []
+        for index, start, end in items:
+            gene_segment = self.gene_reader.gene_segments[index]
+            assert gene_segment.cds[0] == min(start, end)
+            assert gene_segment.cds[1] == max(start, end)
+            ranges.append((gene_segment.cds[0], gene_segment.cds[1], start > end, self.limit, self.limit))
+        return self.gene_reader.get_sequences(ranges)
 
     def work_for_gene_index(self, index, start, end):
-        gene_segment = self.gene_reader.gene_segments[index]
-        assert gene_segment.cds[0] == min(start, end)
-        assert gene_segment.cds[1] == max(start, end)
-        seq = self.gene_reader.dna_code[gene_segment.cds[0] - 1:gene_segment.cds[1]]
-        upstream = self.gene_reader.dna_code[max(gene_segment.cds[0] - self.limit - 1, 0):gene_segment.cds[0] - 1]
-        downstream = self.gene_reader.dna_code[gene_segment.cds[1]:gene_segment.cds[1] + self.limit]
-        if start > end:
-            seq = get_opposite_dna(seq[::-1])
-            upstream, downstream = get_opposite_dna(downstream[::-1]), get_opposite_dna(upstream[::-1])
-        return seq, upstream, downstream
+        return self.work_for_gene_indexes([(index, start, end)])[0]
 
-    def work_for_gene(self, gene_idx, gene_name, start, end, fw):
+    @staticmethod
+    def get_gene_name(gene_name):
         if gene_name.find('->') >= 0:
             gene_name = gene_name[:gene_name.index('->')]
-        if gene_name not in self.gene_reader.gene_name_segment_map:
+        return gene_name
+
+    def resolve_genes(self, gene_names):
+        """
+        :return: FeatureMatch of each gene name, by its name, locus tag, synonym, GeneID or db_xref
+        """
+        return self.gene_reader.get_feature_lookup().resolve([self.get_gene_name(name) for name in gene_names])
+
+    def work_for_gene(self, gene_idx, gene_name, start, end, fw, streams=None, match=None):
+        """
+        :param streams: iterator of work_for_gene_index of the segments of gene_name, extracted at once before
+        :param match: resolve_genes of gene_name, resolved at once before
+        """
+        if match is None:
+            match, = self.resolve_genes([gene_name])
+        gene_name = self.get_gene_name(gene_name)
+        if not match.indices:
             self.logger.info("%s not found in data" % gene_name)
             return
         cnt = 1
         fw.write('%d. %s\n' % (gene_idx, gene_name))
-        for idx in self.gene_reader.gene_name_segment_map[gene_name]:
-            seq, up, down = self.work_for_gene_index(idx, start, end)
+        for idx in match.indices:
+            seq, up, down = next(streams) if streams is not None else self.work_for_gene_index(idx, start, end)
             fw.write('%d)\n' % cnt)
             fw.write('position\t%d %s %d\n' % (
                 self.gene_reader.gene_segments[idx].cds[0], '->' if start < end else '<-',
@@ -67,18 +87,18 @@ class GeneStreamAnalysis:
             cnt += 1
 
     def check_inter(self, fw):
+        lines = []
         for line in open(self.inter_path, 'r', encoding='utf8'):
             line = line.strip()
             if line == '': continue
-            left, right = map(int, line.split(','))
-            up, down = None, None
-            for gene_segment in self.gene_reader.gene_segments:
-                if max(gene_segment.cds) < left:
-                    if not up or max(up.cds) < max(gene_segment.cds):
-                        up = gene_segment
-                if min(gene_segment.cds) > right:
-                    if not down or min(down.cds) > min(gene_segment.cds):
-                        down = gene_segment
+            lines.append(line)
+        inters = [tuple(map(int, line.split(','))) for line in lines]
+        interval_index = self.gene_reader.get_interval_index()
+        ups = interval_index.upstream_batch([left for left, _ in inters])[:, 0].tolist()
+        downs = interval_index.downstream_batch([right for _, right in inters])[:, 0].tolist()
+        for line, up_idx, down_idx in zip(lines, ups, downs):
+            up = self.gene_reader.gene_segments[up_idx] if up_idx >= 0 else None
+            down = self.gene_reader.gene_segments[down_idx] if down_idx >= 0 else None
             fw.write('%s:\n' % line)
             if up:
                 fw.write('up-gene\t%s\nup-position\t%s\nup-product\t%s\n' % (
@@ -98,11 +118,18 @@ class GeneStreamAnalysis:
             if self.mode == 'rna':
                 lines = open(self.rna_path, 'r', encoding='utf8').readlines()
                 self.generate_header(lines[0])
-                for gene_idx, line in enumerate(lines[1:]):
+                genes = []
+                for line in lines[1:]:
                     items = line.split('\t')
                     gene_name, start, end = items[self.headers['gene']], int(
                         items[self.headers['map_start_pos']]), int(items[self.headers['map_end_pos']])
-                    self.work_for_gene(gene_idx, gene_name.strip(), start, end, fw)
+                    genes.append((gene_name.strip(), start, end))
+                matches = self.resolve_genes([gene_name for gene_name, _, _ in genes])
+                streams = iter(self.work_for_gene_indexes([
+                    (idx, start, end) for (gene_name, start, end), match in zip(genes, matches)
+                    for idx in match.indices]))
+                for gene_idx, ((gene_name, start, end), match) in enumerate(zip(genes, matches)):
+                    self.work_for_gene(gene_idx, gene_name, start, end, fw, streams, match)
             elif self.mode == 'inter':
                 self.check_inter(fw)
             else:
@@ -6,7 +6,6 @@ from experiment_config import ExperimentConfig
 from utils.atcc_database import ATCCDatabase
 from utils.gene_position_helper import GenePositionHelper
 from utils.ncbi_database import NCBIDatabase
-from utils.gene_util import get_opposite_dna
 from utils.str_util import StrConverter
 
 
@@ -26,14 +25,16 @@ class GentamycinAnalysis:
         assert self.atcc_database is not None or self.ncbi_database is not None
         self.output_directory = output_directory if output_directory else ExperimentConfig.output_directory
         self.expand_headers = self.__atcc_expand_headers__ if self.atcc_database else self.__ncbi_expand_headers__
-        self.expand_one_record_func = self.expand_one_record_from_atcc if self.atcc_database else self.expand_one_record_from_ncbi
 
     def run(self, gene_list_path: str):
         output_path = StrConverter.generate_result_file_name(gene_list_path, self.output_directory, 'gentamycin')
         gene_df = pd.read_csv(gene_list_path, sep='\t')
-        gene_df[self.expand_headers] = gene_df.apply(lambda record: self.expand_one_record_func(record),
-                                                     axis=1,
-                                                     result_type='expand')
+        if self.atcc_database:
+            gene_df[self.expand_headers] = gene_df.apply(lambda record: self.expand_one_record_from_atcc(record),
+                                                         axis=1,
+                                                         result_type='expand')
+        else:
+            gene_df[self.__header_sequence__] = self.expand_records_from_ncbi(gene_df)
         gene_df.to_csv(output_path, sep='\t', index=None, header=True)
         prepare_consistency_file = StrConverter.generate_result_file_name(gene_list_path, self.output_directory,
                                                                           'gentamycin_consistency')
@@ -73,16 +74,16 @@ class GentamycinAnalysis:
             result = tuple([result.get(header) for header in self.expand_headers])
             return result
 
-    def expand_one_record_from_ncbi(self, record: pd.Series):
+    def expand_records_from_ncbi(self, gene_df: pd.DataFrame):
         """
-        :param record:
-        :return: sequence
+        :param gene_df:
+        :return: sequence of every record, extracted at once
         """
-        left, right, direction = self.get_position(record['Locus'].strip())
-        sequence = self.ncbi_database.dna_code[left - 1:right]
-        if direction == '-':
-            sequence = get_opposite_dna(sequence[::-1])
-        return sequence,
+        ranges = []
+        for locus in gene_df['Locus']:
+            left, right, direction = self.get_position(locus.strip())
+            ranges.append((left, right, direction == '-'))
+        return self.ncbi_database.get_sequences(ranges)
 
     @staticmethod
     def get_position(locus):
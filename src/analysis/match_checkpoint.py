@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import List
+
+from utils.factories.logger_factory import LoggerFactory
+
+
+class MatchCheckpoint:
+    """
+    Result fragment of every finished query and a manifest of them, so that a run killed halfway goes on with the
+    queries not finished yet. Fragments are only reused by a run with the same parameter hash. With with_rows, the
+    result rows of every query are kept beside its fragment as json, for the columnar result.
+    """
+    ManifestName = 'manifest.json'
+    Version = 1
+
+    def __init__(self, directory: str, parameter_hash: str, with_rows: bool = False):
+        self.directory = directory
+        self.parameter_hash = parameter_hash
+        self.with_rows = with_rows
+        self.finished = set()
+        os.makedirs(self.directory, exist_ok=True)
+        manifest_path = os.path.join(self.directory, self.ManifestName)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf8') as fr:
+                manifest = json.load(fr)
+            if manifest.get('version') == self.Version and manifest.get('parameter_hash') == self.parameter_hash:
+                self.finished = set(key for key in manifest['finished']
+                                    if os.path.exists(self.get_fragment_path(key)) and
+                                    (not self.with_rows or os.path.exists(self.get_rows_path(key))))
+            else:
+                LoggerFactory.info('Parameters changed, drop checkpoint in %s' % self.directory)
+                self.clear()
+                os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def get_query_key(name, gene):
+        return hashlib.sha1(('%s\t%s' % (name, gene)).encode('utf8')).hexdigest()
+
+    def get_fragment_path(self, key):
+        return os.path.join(self.directory, '%s.txt' % key)
+
+    def get_rows_path(self, key):
+        return os.path.join(self.directory, '%s.rows.json' % key)
+
+    def is_finished(self, key):
+        return key in self.finished
+
+    def save(self, key, content, rows: List[dict] = None):
+        """
+        write the fragment before the manifest, so a finished query in manifest always has its fragment
+        """
+        if rows is not None:
+            atomic_write(self.get_rows_path(key), json.dumps(rows, default=lambda value: value.item()))
+        atomic_write(self.get_fragment_path(key), content)
+        self.finished.add(key)
+        atomic_write(os.path.join(self.directory, self.ManifestName), json.dumps({
+            'version': self.Version,
+            'parameter_hash': self.parameter_hash,
+            'finished': sorted(self.finished)
+        }))
+
+    def merge(self, keys: List[str], result_path: str):
+        """
+        concatenate fragments in the order of keys into result_path, which is replaced at once
+        """
+        with open(result_path + '.tmp', 'w', encoding='utf8') as fw:
+            for key in keys:
+                with open(self.get_fragment_path(key), 'r', encoding='utf8') as fr:
+                    fw.write(fr.read())
+            fw.flush()
+            os.fsync(fw.fileno())
+        os.replace(result_path + '.tmp', result_path)
+
+    def load_rows(self, keys: List[str]) -> List[dict]:
+        """
+        :return: result rows of keys, in the order of keys
+        """
+        rows = []
+        for key in keys:
+            with open(self.get_rows_path(key), 'r', encoding='utf8') as fr:
+                rows.extend(json.load(fr))
+        return rows
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.finished = set()
+
+
+def atomic_write(file_path, content):
+    with open(file_path + '.tmp', 'w', encoding='utf8') as fw:
+        fw.write(content)
+        fw.flush()
+        os.fsync(fw.fileno())
+    os.replace(file_path + '.tmp', file_path)
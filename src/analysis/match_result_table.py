@@ -0,0 +1,74 @@
+"""
+Columnar match result, one row per hit, saved by numpy.save as a structured array (.npy), so that it is read back
+by numpy.load without parsing. Fields, in this order:
+
+    data_name               str     name of the genome file without .txt
+    name                    str     query name
+    gene                    str     query sequence
+    rank                    int32   1-based rank of the hit in its query by weighted similarity
+    strand                  str     '+' or '-'
+    start, end              int64   1-based position of the first and the last base of the hit, start > end on '-'
+    weighted_similarity     float64
+    <type>_similarity       float64 one for each weighted similarity type, in the order of weighted
+    <type>_gene_format      str     three alignment strings rendered by each weighted similarity type, in the order
+    <type>_target_format    str     of type value
+    <type>_match_format     str
+
+<type> is the lower case name of SimilarityType, str fields are fixed width unicode as wide as their longest value.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+from analysis.models.similarity_type import SimilarityType
+
+HeadFields = [('data_name', 'U'), ('name', 'U'), ('gene', 'U'), ('rank', np.int32), ('strand', 'U'),
+              ('start', np.int64), ('end', np.int64), ('weighted_similarity', np.float64)]
+FormatFields = ['gene_format', 'target_format', 'match_format']
+
+
+def get_table_fields(similarity_types: Sequence[SimilarityType]) -> List[tuple]:
+    """
+    :param similarity_types: weighted similarity types, in the order of weighted
+    :return: (name, kind) of every field
+    """
+    fields = list(HeadFields)
+    fields.extend(('%s_similarity' % similarity_type.name.lower(), np.float64) for similarity_type in similarity_types)
+    for similarity_type in sorted(similarity_types, key=lambda arg: arg.value):
+        fields.extend(('%s_%s' % (similarity_type.name.lower(), field), 'U') for field in FormatFields)
+    return fields
+
+
+def build_match_table(rows: List[dict], similarity_types: Sequence[SimilarityType]) -> np.ndarray:
+    """
+    :param rows: value of every field of each hit
+    """
+    dtype = [(name, 'U%d' % max([len(row[name]) for row in rows] + [1])) if kind == 'U' else (name, kind)
+             for name, kind in get_table_fields(similarity_types)]
+    return np.array([tuple(row[name] for name, _ in dtype) for row in rows], dtype=dtype)
+
+
+def save_match_table(file_path: str, rows: List[dict], similarity_types: Sequence[SimilarityType]):
+    with open(file_path, 'wb') as fw:
+        np.save(fw, build_match_table(rows, similarity_types))
+
+
+def load_match_table(file_path: str) -> np.ndarray:
+    return np.load(file_path, allow_pickle=False)
+
+
+def load_match_rows(file_path: str) -> List[dict]:
+    """
+    :return: fields of every row as python values, in the order of the table fields
+    """
+    table = load_match_table(file_path)
+    return [{name: row[name].item() for name in table.dtype.names} for row in table]
+
+
+def get_similarity_names(names: Sequence[str]) -> List[str]:
+    """
+    :param names: fields of the table, or of one of its rows
+    :return: lower case name of every similarity type in them, in the order of weighted
+    """
+    return [name[:-len('_similarity')] for name in names
+            if name.endswith('_similarity') and name != 'weighted_similarity']
@@ -4,7 +4,7 @@ from typing import Mapping
 from analysis.models.similarity_type import SimilarityType
 
 
-@dataclass
+@dataclass(slots=True)
 class MatchCandidate:
     left: int
     right: int
@@ -12,6 +12,11 @@ class MatchCandidate:
     database_length: int
     weighted_similarity: float
     similarity_dict: Mapping[SimilarityType, float] = field(default_factory=dict)
+    start: int = field(init=False)
+    end: int = field(init=False)
+    should_ignore: bool = field(init=False)
+    original_match_left: int = field(init=False)
+    original_match_right: int = field(init=False)
 
     def __post_init__(self):
         if self.is_reverse:
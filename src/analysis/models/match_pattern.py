@@ -1,18 +1,34 @@
+import re
+from typing import List, Optional, Tuple
+
+
 class MatchPattern:
     must_pattern: str = None
     option_patterns: list = None
     must_score: int = 0
+    must_regex: re.Pattern = None
+    option_regexes: list = None
+    rna_length: int = 0
+    # (position, bases) of each condition, None if the pattern can not be matched by positions only
+    must_anchors: list = None
+    option_anchors: list = None
 
     def __init__(self, rna, conditions):
         must = conditions['must']
+        self.rna_length = len(rna)
         self.must_pattern, self.must_score = self.generate_pattern(rna, must)
+        self.must_anchors = self.generate_anchors(rna, must)
         self.option_patterns = []
+        self.option_anchors = []
         for optional in conditions['optional']:
             optional = [optional]
             optional.extend(must)
             optional_pattern, optioanl_score = self.generate_pattern(rna, optional)
             optioanl_score -= self.must_score
             self.option_patterns.append((optional_pattern, optioanl_score))
+            self.option_anchors.append(self.generate_anchors(rna, optional))
+        self.must_regex = re.compile(self.must_pattern)
+        self.option_regexes = [(re.compile(pattern), score) for pattern, score in self.option_patterns]
 
     def generate_pattern(self, rna, conditions):
         rna_len = len(rna)
@@ -37,6 +53,31 @@ class MatchPattern:
             gen_pattern += '.+'
         return gen_pattern, score
 
+    def generate_anchors(self, rna, conditions) -> Optional[List[Tuple[int, str]]]:
+        """
+        The pattern is matched against a window as long as rna, so the conditions chained to its start or its end
+        without any '.+' are at fixed positions, which is the case when there is at most one '.+' in the pattern.
+        :return: (position, bases) of each condition, None if any condition can float
+        """
+        rna_len = len(rna)
+        anchors = []
+        gap_count = 0
+        index = 0
+        for condition in sorted(conditions, key=lambda arg: arg['offset'] if arg['offset'] >= 0
+                                else rna_len + arg['offset']):
+            offset, length = condition['offset'], condition['length']
+            if offset < 0:
+                offset = rna_len + offset
+            if offset < index or length <= 0 or offset + length > rna_len:
+                return None
+            if offset > index:
+                gap_count += 1
+            anchors.append((offset, rna[offset:offset + length].lower()))
+            index = offset + length
+        if index != rna_len:
+            gap_count += 1
+        return anchors if gap_count <= 1 else None
+
     def update_regex(self, pattern: str):
         up_pattern = ''
         pattern = pattern.lower()
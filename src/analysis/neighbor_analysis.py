@@ -9,8 +9,7 @@ from dataclasses import dataclass
 from experiment_config import ExperimentConfig
 from utils.data_download_util import DataDownloadTool
 from utils.factories.logger_factory import LoggerFactory
-from utils.ncbi_database import NCBIDatabase
-from utils.gene_util import get_opposite_dna
+from utils.ncbi_database import LoadProfile, NCBIDatabase
 from utils.str_util import StrConverter
 
 
@@ -172,30 +171,17 @@ class NeighborAnalysis:
     def analysis_download_file(download_file_path, inter):
         left = min(inter)
         right = max(inter)
-        gene_info = NCBIDatabase(download_file_path)
+        gene_info = NCBIDatabase(download_file_path, load_profile=LoadProfile.GeneProduct)
         if not gene_info.initialized:
             return False, None
-        near_small = None
-        near_big = None
+        interval_index = gene_info.get_interval_index()
         res_set = set()
-        for idx, gene_segment in enumerate(gene_info.gene_segments):
-            if gene_segment.cds[1] <= left:
-                if not near_small or near_small.cds[1] < gene_segment.cds[1]:
-                    near_small = gene_segment
-            if gene_segment.cds[0] >= right:
-                if not near_big or near_big.cds[0] > gene_segment.cds[0]:
-                    near_big = gene_segment
-            if gene_segment.cds[0] <= left <= gene_segment.cds[1]:
-                res_set.add(str(gene_segment))
-            if gene_segment.cds[0] <= right <= gene_segment.cds[1]:
-                res_set.add(str(gene_segment))
-        if near_small:
-            res_set.add(near_small)
-        if near_big:
-            res_set.add(near_big)
-        sequence = gene_info.dna_code[left - 1:right]
-        if inter[0] > inter[1]:
-            sequence = get_opposite_dna(sequence[::-1])
+        for indices in interval_index.overlap_batch([left, right], [left, right]):
+            res_set.update(str(gene_info.gene_segments[idx]) for idx in indices.tolist())
+        for near in [interval_index.upstream(left, inclusive=True), interval_index.downstream(right, inclusive=True)]:
+            if len(near) > 0:
+                res_set.add(gene_info.gene_segments[near[0]])
+        sequence, = gene_info.get_sequences([(left, right, inter[0] > inter[1])])
         return True, {'source': gene_info.source, 'data': list(res_set), 'sequence': sequence}
 
     @staticmethod
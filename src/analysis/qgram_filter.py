@@ -0,0 +1,64 @@
+import math
+from typing import Mapping
+
+import numpy as np
+
+from analysis.models.match_pattern import MatchPattern
+from analysis.models.similarity_type import SimilarityType
+from analysis.similarities.similarity_factory import SimilarityFactory
+from utils.qgram_index import QGramIndex
+
+
+class QGramFilter:
+    """
+    Upper bound of weighted similarity for every offset based on the q-gram lemma: each different base breaks at
+    most q of the len(gene)-q+1 q-grams of gene, so few shared q-grams means many different bases. q-grams are
+    compared in the classes of QGramIndex, which only merges bases, so every bound is never lower than the score.
+    """
+
+    def __init__(self,
+                 index: QGramIndex,
+                 weighted: Mapping[SimilarityType, int],
+                 max_patience: int = 2,
+                 match_pattern: MatchPattern = None):
+        self.index = index
+        self.weighted = weighted
+        self.max_patience = max_patience
+        self.match_pattern = match_pattern
+
+    def get_upper_bound_array(self, gene: np.ndarray, start: int, end: int) -> np.ndarray:
+        tot = len(gene)
+        q = self.index.q
+        qgram_num = tot - q + 1
+        diagonal = self.index.count_diagonal(gene, start, end) if qgram_num > 0 else None
+        weighted_bound = np.zeros(end - start, dtype=np.float64)
+        total_weight = 0.0
+        for similarity_type, weight in self.weighted.items():
+            max_similarity = SimilarityFactory.get_similarity(
+                similarity_type=similarity_type,
+                max_patience=self.max_patience,
+                match_pattern=self.match_pattern
+            ).get_max_similarity(gene)
+            if qgram_num <= 0:
+                bound = np.full(end - start, max_similarity, dtype=np.float64)
+            elif similarity_type == SimilarityType.Direct:
+                bound = self.get_direct_bound(diagonal, tot, q)
+            elif similarity_type == SimilarityType.Consistency:
+                bound = np.minimum(self.get_direct_bound(diagonal, tot, q),
+                                   diagonal + (q - 1) * (self.max_patience + 1))
+            elif similarity_type == SimilarityType.TextEdit:
+                # an alignment with distance e shifts bases at most e, band is the largest e that lemma still works
+                band = math.ceil(qgram_num / q) - 1
+                band_count = self.index.count_diagonal(gene, start, end, band)
+                distance = np.clip(-((band_count - qgram_num) // q), 0, band + 1)
+                bound = tot - distance
+            else:
+                bound = np.full(end - start, max_similarity, dtype=np.float64)
+            weighted_bound += bound * weight
+            total_weight += weight
+        return weighted_bound / total_weight
+
+    @staticmethod
+    def get_direct_bound(diagonal: np.ndarray, tot: int, q: int) -> np.ndarray:
+        qgram_num = tot - q + 1
+        return tot - np.maximum(-((diagonal - qgram_num) // q), 0)
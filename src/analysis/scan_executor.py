@@ -0,0 +1,108 @@
+import copy
+import multiprocessing
+import os
+from typing import List, Sequence
+
+from analysis.models.match_candidate import MatchCandidate
+from analysis.models.similarity_type import SimilarityType
+
+from utils.qgram_index import QGramIndex
+from utils.shared_memory_util import SharedArrays, attach_arrays
+
+# state of the worker process, set once by initialize_worker
+worker_matcher = None
+worker_blocks = None
+
+
+class ScanExecutor:
+    """
+    Run GeneSimilarityMatch.match_genes of (queries, strand, chunk) units in worker processes. The encoded forward and
+    reverse genomes (and q-gram indexes) are put into shared memory once, and every worker attaches them in its
+    initializer, so a unit only carries the queries and the chunk range, and a result only carries the compact tuples
+    of its candidates.
+    """
+
+    def __init__(self, matcher, process_num: int = None):
+        self.matcher = matcher
+        self.process_num = process_num if process_num else os.cpu_count() or 1
+        self.shared_arrays = None
+        self.pool = None
+
+    def __enter__(self):
+        matcher = self.matcher
+        arrays = {'dna': matcher.get_dna_array(False), 'rev_dna': matcher.get_dna_array(True)}
+        if matcher.qgram_index is not None:
+            for key, index in [('qgram', matcher.qgram_index), ('rev_qgram', matcher.rev_qgram_index)]:
+                arrays[key + '_order'] = index.order
+                arrays[key + '_bucket_start'] = index.bucket_start
+        self.shared_arrays = SharedArrays(arrays)
+        self.pool = multiprocessing.Pool(self.process_num,
+                                         initializer=initialize_worker,
+                                         initargs=(detach_genome(matcher), self.shared_arrays.descriptor))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.pool.terminate()
+        self.pool.join()
+        self.shared_arrays.close()
+
+    def imap_unordered(self, units):
+        """
+        :param units: iterable of (unit_id, (queries, is_reverse, start, end)), queries is a list of (name, gene)
+        :return: (unit_id, packed candidates of each query) in the order of completion, see pack_candidates
+        """
+        return self.pool.imap_unordered(match_genes_in_worker, units)
+
+
+def detach_genome(matcher):
+    """
+    :return: shallow copy of matcher without the parsed database and genome, which is cheap to pickle
+    """
+    matcher = copy.copy(matcher)
+    matcher.gene_reader = None
+    matcher.gene_name_filter = None
+    matcher.genome = matcher.rev_genome = None
+    matcher.dna_code = matcher.rev_dna_code = None
+    matcher.dna_array = matcher.rev_dna_array = None
+    # indexes keep q and checksum only, their arrays are attached from shared memory
+    matcher.qgram_index, matcher.rev_qgram_index = [
+        QGramIndex(index.q, None, None, index.checksum) if index is not None else None
+        for index in [matcher.qgram_index, matcher.rev_qgram_index]]
+    return matcher
+
+
+def initialize_worker(matcher, descriptor):
+    global worker_matcher, worker_blocks
+    worker_blocks, arrays = attach_arrays(descriptor)
+    matcher.dna_array, matcher.rev_dna_array = arrays['dna'], arrays['rev_dna']
+    for key, index in [('qgram', matcher.qgram_index), ('rev_qgram', matcher.rev_qgram_index)]:
+        if index is not None:
+            index.order, index.bucket_start = arrays[key + '_order'], arrays[key + '_bucket_start']
+    worker_matcher = matcher
+
+
+def match_genes_in_worker(unit):
+    unit_id, (queries, is_reverse, start, end) = unit
+    similarity_types = list(worker_matcher.weighted)
+    return unit_id, [pack_candidates(candidates, similarity_types)
+                     for candidates in worker_matcher.match_genes(queries, is_reverse, start, end)]
+
+
+def pack_candidates(candidates: List[MatchCandidate], similarity_types: Sequence[SimilarityType]):
+    """
+    :return: (left, weighted_similarity, similarity of each type in similarity_types) of each candidate
+    """
+    return [(candidate.left, candidate.weighted_similarity) +
+            tuple(candidate.similarity_dict[similarity_type] for similarity_type in similarity_types)
+            for candidate in candidates]
+
+
+def unpack_candidates(packed: list, similarity_types: Sequence[SimilarityType], gene_length: int, is_reverse: bool,
+                      database_length: int) -> List[MatchCandidate]:
+    return [MatchCandidate(left=values[0],
+                           right=values[0] + gene_length - 1,
+                           is_reverse=is_reverse,
+                           database_length=database_length,
+                           weighted_similarity=values[1],
+                           similarity_dict=dict(zip(similarity_types, values[2:])))
+            for values in packed]
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+from typing import Dict, Mapping, Optional
+
+import numpy as np
+
+from analysis.models.similarity_type import SimilarityType
+
+
+class ScoreCache:
+    """
+    Similarity of every offset of a query on one strand, one memory mapped .npy per similarity type, keyed by the
+    gene, the genome and the parameters of the type. Scores of every type are small integers, so they are kept as
+    int16 without loss, and ranking with other weights needs no scoring at all.
+    A file is written as .part by the scan, each chunk into its own slice, and renamed when the query is finished.
+    """
+    Version = 1
+    DataType = np.int16
+
+    def __init__(self, directory: str, genome_checksum: int, type_parameters: Mapping[SimilarityType, object]):
+        """
+        :param type_parameters: parameters each similarity type depends on, like patience of Consistency
+        """
+        self.directory = directory
+        self.genome_checksum = genome_checksum
+        self.type_parameters = dict(type_parameters)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_path(self, gene: str, is_reverse: bool, similarity_type: SimilarityType):
+        key = json.dumps([self.Version, self.genome_checksum, gene, is_reverse, similarity_type.name,
+                          self.type_parameters.get(similarity_type)], sort_keys=True)
+        return os.path.join(self.directory, '%s.%s.npy' % (similarity_type.name.lower(),
+                                                           hashlib.sha1(key.encode('utf8')).hexdigest()))
+
+    def load(self, gene: str, is_reverse: bool) -> Optional[Dict[SimilarityType, np.ndarray]]:
+        """
+        :return: read only memory map of each similarity type, None if any of them is not cached
+        """
+        scores = {}
+        for similarity_type in self.type_parameters:
+            path = self.get_path(gene, is_reverse, similarity_type)
+            if not os.path.exists(path):
+                return None
+            scores[similarity_type] = np.load(path, mmap_mode='r')
+        return scores
+
+    def create_parts(self, gene: str, is_reverse: bool, size: int):
+        for similarity_type in self.type_parameters:
+            part = np.lib.format.open_memmap(self.get_path(gene, is_reverse, similarity_type) + '.part',
+                                             mode='w+', dtype=self.DataType, shape=(max(size, 0),))
+            del part
+
+    def open_parts(self, gene: str, is_reverse: bool) -> Dict[SimilarityType, np.ndarray]:
+        return {similarity_type: np.load(self.get_path(gene, is_reverse, similarity_type) + '.part', mmap_mode='r+')
+                for similarity_type in self.type_parameters}
+
+    @staticmethod
+    def write_part(part: np.ndarray, start: int, scores: np.ndarray):
+        values = scores.astype(ScoreCache.DataType)
+        if not np.array_equal(values, scores):
+            raise ValueError('Similarity can not be cached as %s' % np.dtype(ScoreCache.DataType).name)
+        part[start:start + len(values)] = values
+
+    def finish_parts(self, gene: str, is_reverse: bool):
+        for similarity_type in self.type_parameters:
+            path = self.get_path(gene, is_reverse, similarity_type)
+            os.replace(path + '.part', path)
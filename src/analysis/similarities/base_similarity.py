@@ -1,14 +1,34 @@
 from typing import Tuple, Any
 
+import numpy as np
+
+CODE_C = ord('c')
+CODE_T = ord('t')
+
 
 class BaseSimilarity(object):
 
-    def get_similarity(self, gene: str, database: str, offset: int) -> Tuple[float, Any]:
+    def get_similarity(self, gene: str, database: str, offset: int, threshold: float = None) -> Tuple[float, Any]:
+        """
+        :param threshold: once the score can not reach threshold, it may stop early and return an upper bound of
+        the score which is lower than threshold
+        """
+        raise NotImplementedError()
+
+    def get_similarity_array(self, gene: np.ndarray, database: np.ndarray, start: int, end: int) -> np.ndarray:
+        """
+        :param gene: encoded gene, see utils.gene_util.encode_dna
+        :param database: encoded database
+        :return: similarity of every offset in [start, end)
+        """
         raise NotImplementedError()
 
     def rendering_sequence(self, gene: str, database: str, offset: int) -> Tuple[list, list, list]:
         raise NotImplementedError()
 
+    def get_max_similarity(self, gene: str) -> float:
+        return len(gene)
+
     @staticmethod
     def should_change(a, b):
         if a == b:
@@ -16,3 +36,9 @@ class BaseSimilarity(object):
         elif a == 'c' and b == 't':
             return 0
         return 1
+
+    @staticmethod
+    def same_array(a: int, b: np.ndarray) -> np.ndarray:
+        if a == CODE_C:
+            return (b == CODE_C) | (b == CODE_T)
+        return b == a
@@ -1,9 +1,19 @@
-from typing import Tuple, Any
+from typing import Tuple, Any, List, Optional
+
+import numpy as np
 
 from analysis.similarities.base_similarity import BaseSimilarity
 
 
 class BlatSimilarity(BaseSimilarity):
+    """
+    Gapped seed model: the first SeedLength bases of gene make the left seed and the next SeedLength bases make the
+    right seed. A seed starts with its first base, every other base of it is matched at the next same base with at
+    most end_limit bases inserted in total, and two adjacent bases are matched at least. The right seed starts with
+    3 to mid_limit bases inserted after the left seed, the nearest one which matches wins.
+    """
+    SeedLength = 4
+    MidMinGap = 3
 
     def __init__(self, mid_limit: int = 10, end_limit: int = 2):
         self.end_limit = end_limit
@@ -14,9 +24,12 @@ class BlatSimilarity(BaseSimilarity):
         sequence_target = []
         sequence = []
         flag, pos_data_end = self.get_similarity(gene, database, offset)
+        if pos_data_end is None:
+            # no seed matches, which a candidate kept for the score of another similarity type may have
+            return list(gene), list(database[offset:offset + len(gene)]), ['.'] * len(gene)
         pos_data = offset
         pos_gene = 0
-        while pos_gene < 4:
+        while pos_gene < self.SeedLength:
             if self.should_change(gene[pos_gene], database[pos_data]) > 0:
                 sequence_gene.append('-')
                 sequence_target.append(database[pos_data])
@@ -28,12 +41,12 @@ class BlatSimilarity(BaseSimilarity):
                 sequence.append('*')
                 pos_gene += 1
                 pos_data += 1
-        rev_pos_gene = 7
+        rev_pos_gene = 2 * self.SeedLength - 1
         rev_pos_data = pos_data_end - 1
         rev_sequence_gene = []
         rev_sequence_target = []
         rev_sequence = []
-        while rev_pos_gene > 3:
+        while rev_pos_gene >= self.SeedLength:
             if self.should_change(gene[rev_pos_gene], database[rev_pos_data]) > 0:
                 rev_sequence_gene.append('-')
                 rev_sequence_target.append(database[rev_pos_data])
@@ -55,62 +68,90 @@ class BlatSimilarity(BaseSimilarity):
         sequence.extend(rev_sequence[::-1])
         return sequence_gene, sequence_target, sequence
 
-    def get_similarity(self, gene: str, database: str, offset: int) -> Tuple[float, Any]:
-        end_limit = 2
-        mid_limit = 10
-
-        def search_dfs(pos_gene, pos_data, insert_data):
-            if pos_gene < 4:
-                sequence_matched_length = 1
-                cond = False
-                while pos_gene < 4 and pos_data < len(database):
-                    while self.should_change(gene[pos_gene], database[pos_data]) > 0:
-                        sequence_matched_length = 0
-                        insert_data += 1
-                        pos_data += 1
-                        if insert_data > end_limit or pos_data >= len(database):
-                            return False, None
-                    if sequence_matched_length > 0:
-                        cond = True
-                    sequence_matched_length += 1
-                    pos_gene += 1
-                    pos_data += 1
-                if not cond:
-                    return False, None
-                flag, pos_data_end = search_dfs(4, pos_data + 3, 3)
-                return flag, pos_data_end
-            elif pos_gene == 4:
-                if insert_data > mid_limit or pos_data >= len(database):
-                    return False, None
-                while self.should_change(gene[pos_gene], database[pos_data]) > 0:
-                    pos_data += 1
-                    insert_data += 1
-                    if pos_data >= len(database) or insert_data > mid_limit:
-                        return False, None
-                flag, pos_data_end = search_dfs(5, pos_data + 1, 0)
-                if flag:
-                    return flag, pos_data_end
-                else:
-                    flag, pos_data_end = search_dfs(4, pos_data + 1, insert_data + 1)
-                    return flag, pos_data_end
-            else:
-                sequence_matched_length = 1
-                cond = False
-                while pos_gene < 8 and pos_data < len(database):
-                    while self.should_change(gene[pos_gene], database[pos_data]) > 0:
-                        sequence_matched_length = 0
-                        insert_data += 1
-                        pos_data += 1
-                        if insert_data > end_limit or pos_data >= len(database):
-                            return False, None
-                    if sequence_matched_length > 0:
-                        cond = True
-                    sequence_matched_length += 1
-                    pos_gene += 1
-                    pos_data += 1
-                return cond, pos_data
+    def get_max_similarity(self, gene: str) -> float:
+        return 1
 
-        if self.should_change(gene[0], database[offset]) > 0:
+    def get_similarity(self, gene: str, database: str, offset: int, threshold: float = None) -> Tuple[float, Any]:
+        """
+        :return: 1 and the end (exclusive) of the match if gene matches at offset, else 0 and None
+        """
+        left_end = self.get_seed_end(gene, database, 0, offset)
+        if left_end is None:
             return 0, None
-        flag, pos_data_end = search_dfs(1, offset + 1, 0)
-        return flag, pos_data_end
+        for mid in range(left_end + self.MidMinGap, min(left_end + self.mid_limit + 1, len(database))):
+            right_end = self.get_seed_end(gene, database, self.SeedLength, mid)
+            if right_end is not None:
+                return 1, right_end
+        return 0, None
+
+    def get_seed_end(self, gene: str, database: str, gene_start: int, offset: int) -> Optional[int]:
+        """
+        :return: end (exclusive) of the seed gene[gene_start: gene_start + SeedLength] matched from offset, None if
+        it does not match
+        """
+        if self.should_change(gene[gene_start], database[offset]) > 0:
+            return None
+        pos = offset
+        adjacent = False
+        for idx in range(1, self.SeedLength):
+            # inserted bases before pos are pos - offset - idx + 1, at most end_limit of them
+            next_pos = pos + 1
+            while next_pos < len(database) and next_pos - offset - idx <= self.end_limit and \
+                    self.should_change(gene[gene_start + idx], database[next_pos]) > 0:
+                next_pos += 1
+            if next_pos >= len(database) or next_pos - offset - idx > self.end_limit:
+                return None
+            adjacent = adjacent or next_pos == pos + 1
+            pos = next_pos
+        return pos + 1 if adjacent else None
+
+    def get_similarity_array(self, gene: np.ndarray, database: np.ndarray, start: int, end: int) -> np.ndarray:
+        return (self.get_match_end_array(gene, database, start, end) >= 0).astype(np.float64)
+
+    def get_match_end_array(self, gene: np.ndarray, database: np.ndarray, start: int, end: int) -> np.ndarray:
+        """
+        The model is compiled into the next position of every seed base from every position of the database, which
+        are built in one pass over it, then every offset is matched in constant steps without any backtracking: the
+        right seed is taken at the nearest position after the left seed where it matches.
+        :return: end (exclusive) of the match of every offset in [start, end), -1 if there is no match
+        """
+        size = max(end - start, 0)
+        # no match reaches beyond the span from its offset
+        span = 2 * self.SeedLength + 2 * self.end_limit + max(self.mid_limit, 0)
+        window = database[start:min(len(database), end + span)]
+        window_size = len(window)
+        next_same = [get_next_true(self.same_array(code, window)) for code in gene[:2 * self.SeedLength].tolist()]
+        right_ends = self.get_seed_end_array(next_same[self.SeedLength:], np.arange(window_size))
+        left_ends = self.get_seed_end_array(next_same[:self.SeedLength], np.arange(min(size, window_size)))
+        # nearest position where the right seed matches
+        next_right = get_next_true(right_ends >= 0)
+        mid = next_right[np.minimum(np.maximum(left_ends, 0) + self.MidMinGap, window_size)]
+        matched = (left_ends >= 0) & (mid < window_size) & (mid <= left_ends + self.mid_limit)
+        result = np.full(size, -1, dtype=np.int64)
+        result[:len(left_ends)] = np.where(matched, right_ends[np.minimum(mid, window_size - 1)] + start, -1)
+        return result
+
+    def get_seed_end_array(self, next_same: List[np.ndarray], offsets: np.ndarray) -> np.ndarray:
+        """
+        :param next_same: next position of every seed base, see get_next_true
+        :return: get_seed_end of every offset, -1 if it does not match
+        """
+        window_size = len(next_same[0]) - 1
+        matched = next_same[0][offsets] == offsets
+        adjacent = np.zeros(len(offsets), dtype=bool)
+        pos = offsets
+        for positions in next_same[1:]:
+            next_pos = positions[np.minimum(pos + 1, window_size)]
+            adjacent |= next_pos == pos + 1
+            pos = next_pos
+        # inserted bases only grow from base to base, so checking them at the last base is enough
+        matched &= adjacent & (pos < window_size) & (pos - offsets - (self.SeedLength - 1) <= self.end_limit)
+        return np.where(matched, pos + 1, -1)
+
+
+def get_next_true(mask: np.ndarray) -> np.ndarray:
+    """
+    :return: for every position i in [0, len(mask)], the first position j >= i with mask[j], len(mask) if none
+    """
+    positions = np.where(mask, np.arange(len(mask)), len(mask))
+    return np.append(np.minimum.accumulate(positions[::-1])[::-1], len(mask))
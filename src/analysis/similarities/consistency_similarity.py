@@ -1,5 +1,7 @@
 from typing import Tuple
 
+import numpy as np
+
 from analysis.similarities.base_similarity import BaseSimilarity
 
 
@@ -32,22 +34,33 @@ class ConsistencySimilarity(BaseSimilarity):
     def __init__(self, max_patience: int):
         self.max_patience = max_patience
 
-    def get_similarity(self, gene: str, database: str, offset: int):
+    def get_similarity(self, gene: str, database: str, offset: int, threshold: float = None):
         tot = len(gene)
         score = 0.0
         same = 0
         cur_score = 0
         score_queue = []
+        # best score of segments ending at current position, with at most max_patience different bases
+        patience_score = 0
         for i in range(tot):
             if not self.should_change(gene[i], database[i + offset]):
                 cur_score += 1
                 same += 1
-                if i == tot - 1:
-                    score_queue.append([cur_score, tot])
             else:
                 score_queue.append([cur_score, i])
                 cur_score = 0
             score = max(score, cur_score)
+            if threshold is not None:
+                first = max(len(score_queue) - self.max_patience, 0)
+                recent_score = cur_score + sum(same_cnt for same_cnt, _ in score_queue[first:])
+                patience_score = max(patience_score, recent_score)
+                # segments crossing current position get at most all the remaining bases
+                upper_bound = max(patience_score, recent_score + tot - 1 - i)
+                if upper_bound < threshold:
+                    return float(upper_bound), None
+        # the last run is queued after the bound, which counts it once in cur_score
+        if cur_score > 0:
+            score_queue.append([cur_score, tot])
         score_merge_idx = [-1, -1]
         for idx in range(len(score_queue)):
             left = score_queue[idx][1] - score_queue[idx][0]
@@ -62,3 +75,23 @@ class ConsistencySimilarity(BaseSimilarity):
                         score = total_score
                         score_merge_idx = [idx, idx + width]
         return score, (score_queue, score_merge_idx)
+
+    def get_similarity_array(self, gene: np.ndarray, database: np.ndarray, start: int, end: int) -> np.ndarray:
+        """
+        The score of get_similarity is the maximal number of same bases in a segment with at most max_patience
+        different bases, so for each end position i of segment, the segment starts right after the
+        (max_patience+1)-th last different base, it is computed for all offsets at once.
+        """
+        size = end - start
+        # positions of last max_patience+1 different bases, the most recent first
+        last_change = [np.full(size, -1, dtype=np.int64) for _ in range(self.max_patience + 1)]
+        change_cnt = np.zeros(size, dtype=np.int64)
+        score = np.zeros(size, dtype=np.int64)
+        for i, code in enumerate(gene.tolist()):
+            change = ~self.same_array(code, database[start + i:end + i])
+            for k in range(self.max_patience, 0, -1):
+                last_change[k] = np.where(change, last_change[k - 1], last_change[k])
+            last_change[0] = np.where(change, i, last_change[0])
+            change_cnt += change
+            np.maximum(score, i - last_change[-1] - np.minimum(change_cnt, self.max_patience), out=score)
+        return score.astype(np.float64)
@@ -1,6 +1,8 @@
 from typing import Tuple, Any
 
-from analysis.similarities.base_similarity import BaseSimilarity
+import numpy as np
+
+from analysis.similarities.base_similarity import BaseSimilarity, CODE_C, CODE_T
 
 
 class DirectMatchSimilarity(BaseSimilarity):
@@ -19,10 +21,33 @@ class DirectMatchSimilarity(BaseSimilarity):
                 sequence.append('.')
         return sequence_gene, sequence_target, sequence
 
-    def get_similarity(self, gene: str, database: str, offset: int) -> Tuple[float, Any]:
+    def get_similarity(self, gene: str, database: str, offset: int, threshold: float = None) -> Tuple[float, Any]:
         score = 0.0
         tot = len(gene)
         for i in range(tot):
             score += self.should_change(gene[i], database[i + offset])
+            if threshold is not None and tot - score < threshold:
+                return tot - score, None
         score = tot - score
         return score, None
+
+    def get_similarity_array(self, gene: np.ndarray, database: np.ndarray, start: int, end: int) -> np.ndarray:
+        score = np.zeros(end - start, dtype=np.float64)
+        for i, code in enumerate(gene.tolist()):
+            score += self.same_array(code, database[start + i:end + i])
+        return score
+
+    def get_similarity_matrix(self, genes: np.ndarray, database: np.ndarray, start: int, end: int) -> np.ndarray:
+        """
+        :param genes: encoded genes of the same length, one per row
+        :return: similarity of every gene (row) and every offset in [start, end) (column), each window of database
+        is read once for all genes
+        """
+        score = np.zeros((len(genes), end - start), dtype=np.float64)
+        is_c = genes == CODE_C
+        for i in range(genes.shape[1]):
+            window = database[start + i:end + i]
+            same = genes[:, i:i + 1] == window
+            same |= is_c[:, i:i + 1] & (window == CODE_T)
+            score += same
+        return score
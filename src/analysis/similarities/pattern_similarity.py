@@ -1,8 +1,11 @@
 import re
-from typing import Tuple
+from typing import Tuple, Optional, List
+
+import numpy as np
 
 from analysis.models.match_pattern import MatchPattern
 from analysis.similarities.base_similarity import BaseSimilarity
+from utils.gene_util import encode_dna
 
 
 class PatternSimilarity(BaseSimilarity):
@@ -10,18 +13,67 @@ class PatternSimilarity(BaseSimilarity):
     def __init__(self, match_pattern: MatchPattern):
         self.match_pattern = match_pattern
 
-    def get_similarity(self, gene: str, database: str, offset: int):
+    def get_similarity(self, gene: str, database: str, offset: int, threshold: float = None):
         if self.match_pattern is None:
-            return 0
+            return 0, None
         gene_len = len(gene)
         target_gene = database[offset:offset + gene_len]
-        if not re.match(self.match_pattern.must_pattern, target_gene):
-            return 0
+        if not self.is_matched(self.match_pattern.must_regex, self.match_pattern.must_anchors, target_gene):
+            return 0, None
         score = self.match_pattern.must_score
-        for optional_pattern in self.match_pattern.option_patterns:
-            if re.match(optional_pattern[0], target_gene):
-                score += optional_pattern[1]
-        return score
+        for (optional_regex, optional_score), anchors in zip(self.match_pattern.option_regexes,
+                                                             self.match_pattern.option_anchors):
+            if self.is_matched(optional_regex, anchors, target_gene):
+                score += optional_score
+        return score, None
+
+    def is_matched(self, regex: re.Pattern, anchors: Optional[List[Tuple[int, str]]], target_gene: str) -> bool:
+        if anchors is None or len(target_gene) != self.match_pattern.rna_length:
+            return regex.match(target_gene) is not None
+        return all(not self.should_change(base, target_gene[position + idx])
+                   for position, bases in anchors for idx, base in enumerate(bases))
+
+    def get_similarity_array(self, gene: np.ndarray, database: np.ndarray, start: int, end: int) -> np.ndarray:
+        scores, _ = self.get_similarity_and_mask_array(gene, database, start, end)
+        return scores
+
+    def get_similarity_and_mask_array(self, gene: np.ndarray, database: np.ndarray, start: int, end: int) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: similarity of every offset in [start, end), and the mask of offsets matching the must conditions,
+        the similarity of other offsets is 0
+        """
+        size = end - start
+        if self.match_pattern is None:
+            return np.zeros(size, dtype=np.float64), np.zeros(size, dtype=bool)
+        must = self.get_mask_array(self.match_pattern.must_regex, self.match_pattern.must_anchors, len(gene),
+                                   database, start, end)
+        scores = must * float(self.match_pattern.must_score)
+        for (optional_regex, optional_score), anchors in zip(self.match_pattern.option_regexes,
+                                                             self.match_pattern.option_anchors):
+            scores += (must & self.get_mask_array(optional_regex, anchors, len(gene), database, start, end)) * \
+                      float(optional_score)
+        return scores, must
+
+    def get_mask_array(self, regex: re.Pattern, anchors: Optional[List[Tuple[int, str]]], gene_length: int,
+                       database: np.ndarray, start: int, end: int) -> np.ndarray:
+        """
+        :return: mask of offsets in [start, end) whose window matches the pattern, anchors are compared base by base
+        for all offsets at once, and the regex is only run when the pattern has no fixed positions
+        """
+        if anchors is None or gene_length != self.match_pattern.rna_length:
+            return np.array([regex.match(database[offset:offset + gene_length].tobytes().decode('ascii')) is not None
+                             for offset in range(start, end)], dtype=bool)
+        mask = np.ones(end - start, dtype=bool)
+        for position, bases in anchors:
+            for idx, code in enumerate(encode_dna(bases).tolist()):
+                mask &= self.same_array(code, database[start + position + idx:end + position + idx])
+        return mask
+
+    def get_max_similarity(self, gene: str) -> float:
+        if self.match_pattern is None:
+            return 0
+        return self.match_pattern.must_score + sum(max(score, 0) for _, score in self.match_pattern.option_patterns)
 
     def rendering_sequence(self, gene: str, database: str, offset: int) -> Tuple[list, list, list]:
         sequence_gene = []
@@ -1,8 +1,13 @@
 from typing import Tuple, Any
 
+import numpy as np
+
 from analysis.similarities.base_similarity import BaseSimilarity
 
 INF = 999999
+WORD_SIZE = 64
+# max number of dp cells computed at once when checking continuous mismatch in batch
+MAX_BATCH_CELLS = 1 << 22
 
 
 class TextEditSimilarity(BaseSimilarity):
@@ -10,7 +15,7 @@ class TextEditSimilarity(BaseSimilarity):
     def __init__(self, continuous_mismatch_limit: int = None):
         self.continuous_mismatch_limit = continuous_mismatch_limit
 
-    def get_similarity(self, gene: str, database: str, offset: int) -> Tuple[float, Any]:
+    def get_similarity(self, gene: str, database: str, offset: int, threshold: float = None) -> Tuple[float, Any]:
         tot = len(gene)
         dp = [[INF for _ in range(tot + 1)] for _ in range(tot + 1)]
         dp[0][0] = 0
@@ -22,6 +27,9 @@ class TextEditSimilarity(BaseSimilarity):
                 dp[i][j] = min(dp[i - 1][j] + 1, dp[i][j - 1] + 1,
                                dp[i - 1][j - 1] + self.should_change(gene_a, gene_b))
                 min_step = min(dp[i][j] + abs(i - j), min_step)
+            # dp[tot][tot] is at least min_step, since it takes abs(i - j) steps to move from dp[i][j]
+            if threshold is not None and tot - min_step < threshold:
+                return float(tot - min_step), None
         score = float(tot - dp[tot][tot])
         if self.continuous_mismatch_limit is not None:
             i, j = tot, tot
@@ -47,6 +55,62 @@ class TextEditSimilarity(BaseSimilarity):
                     return 0, dp
         return score, dp
 
+    def get_similarity_array(self, gene: np.ndarray, database: np.ndarray, start: int, end: int) -> np.ndarray:
+        """
+        The border of dp is INF except dp[0][0], so the first base of gene is always aligned with the first base
+        of target, and the rest is the edit distance of both suffixes, which is computed by bit-parallel algorithm
+        of Myers/Hyyro for all offsets at once, each offset is a lane of numpy array.
+        """
+        tot = len(gene)
+        distance = (~self.same_array(int(gene[0]), database[start:end])).astype(np.int64)
+        distance += edit_distance_array(gene[1:], database, start + 1, end + 1)
+        score = (tot - distance).astype(np.float64)
+        if self.continuous_mismatch_limit is not None:
+            # each step on the traceback path which is not a match costs 1, so a path with
+            # continuous_mismatch_limit continuous mismatch has distance >= continuous_mismatch_limit
+            offsets = np.nonzero(distance >= self.continuous_mismatch_limit)[0] + start
+            batch_size = max(1, MAX_BATCH_CELLS // ((tot + 1) * (tot + 1)))
+            for idx in range(0, len(offsets), batch_size):
+                batch_offsets = offsets[idx:idx + batch_size]
+                exceeded = self.check_continuous_mismatch_array(gene, database, batch_offsets)
+                score[batch_offsets[exceeded] - start] = 0
+        return score
+
+    def check_continuous_mismatch_array(self, gene: np.ndarray, database: np.ndarray,
+                                        offsets: np.ndarray) -> np.ndarray:
+        """
+        Same dp and traceback as get_similarity, but for a batch of offsets.
+        :return: whether continuous mismatch reach the limit for each offset
+        """
+        tot = len(gene)
+        lanes = np.arange(len(offsets))
+        target = database[offsets[:, None] + np.arange(tot)]
+        same = np.stack([self.same_array(int(code), target) for code in gene.tolist()])
+        steps = np.arange(1, tot + 1)
+        dp = np.full((tot + 1, len(offsets), tot + 1), INF, dtype=np.int32)
+        dp[0, :, 0] = 0
+        for i in range(1, tot + 1):
+            step = np.minimum(dp[i - 1, :, 1:] + 1, dp[i - 1, :, :-1] + ~same[i - 1])
+            dp[i, :, 1:] = np.minimum.accumulate(step - steps, axis=1) + steps
+        i = np.full(len(offsets), tot)
+        j = np.full(len(offsets), tot)
+        mismatch = np.zeros(len(offsets), dtype=np.int32)
+        exceeded = np.zeros(len(offsets), dtype=bool)
+        for _ in range(2 * tot):
+            active = ((i > 0) | (j > 0)) & ~exceeded
+            if not active.any():
+                break
+            current = dp[i, lanes, j]
+            cost = ~same[np.maximum(i - 1, 0), lanes, np.maximum(j - 1, 0)]
+            diagonal = active & (i > 0) & (j > 0) & (current == dp[i - 1, lanes, j - 1] + cost)
+            up = active & ~diagonal & (current == dp[i - 1, lanes, j] + 1)
+            left = active & ~diagonal & ~up & (current == dp[i, lanes, j - 1] + 1)
+            mismatch = np.where(diagonal & ~cost, 0, mismatch + 1)
+            exceeded |= active & (mismatch >= self.continuous_mismatch_limit)
+            i = i - (diagonal | up)
+            j = j - (diagonal | left)
+        return exceeded
+
     def rendering_sequence(self, gene: str, database: str, offset: int) -> Tuple[list, list, list]:
         sequence_gene = []
         sequence_target = []
@@ -78,3 +142,48 @@ class TextEditSimilarity(BaseSimilarity):
         sequence_target.reverse()
         sequence.reverse()
         return sequence_gene, sequence_target, sequence
+
+
+def edit_distance_array(pattern: np.ndarray, database: np.ndarray, start: int, end: int) -> np.ndarray:
+    """
+    Global edit distance between pattern and database[offset:offset + len(pattern)] for every offset
+    in [start, end), base c in pattern matches base t in database.
+    """
+    size = len(pattern)
+    distance = np.full(end - start, size, dtype=np.int64)
+    if size == 0:
+        return distance
+    block_num = (size + WORD_SIZE - 1) // WORD_SIZE
+    peq = np.zeros((block_num, 256), dtype=np.uint64)
+    codes = np.arange(256, dtype=np.uint8)
+    for i, code in enumerate(pattern.tolist()):
+        peq[i // WORD_SIZE][BaseSimilarity.same_array(code, codes)] |= np.uint64(1 << (i % WORD_SIZE))
+    high_bits = [np.uint64(1 << (WORD_SIZE - 1))] * (block_num - 1) + [np.uint64(1 << ((size - 1) % WORD_SIZE))]
+    ones = np.uint64(1)
+    pv = [np.full(end - start, ~np.uint64(0), dtype=np.uint64) for _ in range(block_num)]
+    mv = [np.zeros(end - start, dtype=np.uint64) for _ in range(block_num)]
+    for j in range(size):
+        target = database[start + j:end + j]
+        # the top row of dp is 0, 1, 2, ..., so each column starts with horizontal delta +1
+        h_in = None
+        for b in range(block_num):
+            eq = peq[b][target]
+            xv = eq | mv[b]
+            if h_in is not None:
+                eq = eq | (h_in < 0).astype(np.uint64)
+            xh = (((eq & pv[b]) + pv[b]) ^ pv[b]) | eq
+            ph = mv[b] | ~(xh | pv[b])
+            mh = pv[b] & xh
+            h_out = (ph & high_bits[b] != 0).astype(np.int8) - (mh & high_bits[b] != 0).astype(np.int8)
+            ph = ph << ones
+            mh = mh << ones
+            if h_in is None:
+                ph |= ones
+            else:
+                ph |= (h_in > 0).astype(np.uint64)
+                mh |= (h_in < 0).astype(np.uint64)
+            pv[b] = mh | ~(xv | ph)
+            mv[b] = ph & xv
+            h_in = h_out
+        distance += h_in
+    return distance
@@ -0,0 +1,322 @@
+"""
+Micro benchmark of the similarity engine on synthetic genomes: windows per second, peak RSS and latency of every
+similarity type, scanned in this process (find_candidate_for_gene) and by worker processes (match_records). Before the
+timing, every fast path is checked against an unpruned scalar reference on a small genome, for every similarity type
+alone and for mixed weights, the top_k results must be the same.
+Results are saved as json, and compare_benchmarks reports the cases which got slower between two of them.
+"""
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict
+
+import numpy as np
+
+from analysis.gene_similarity_match import GeneSimilarityMatch
+from analysis.models.similarity_type import SimilarityType
+from utils.factories.logger_factory import LoggerFactory
+
+Version = 1
+DefaultMixedWeights = [
+    {SimilarityType.Direct: 1, SimilarityType.Consistency: 2},
+    {SimilarityType.Consistency: 3, SimilarityType.Direct: 1, SimilarityType.TextEdit: 2},
+    {SimilarityType.Blat: 1, SimilarityType.Direct: 1},
+    {SimilarityType.Pattern: 2, SimilarityType.Consistency: 1, SimilarityType.Blat: 1}
+]
+DefaultConditions = {
+    'must': [{'offset': 0, 'length': 4}, {'offset': -4, 'length': 4}],
+    'optional': [{'offset': 4, 'length': 1}, {'offset': -5, 'length': 1}]
+}
+
+
+def generate_genome(size: int, seed: int) -> str:
+    rand = np.random.default_rng(seed)
+    return np.frombuffer(b'acgt', dtype=np.uint8)[rand.integers(0, 4, size)].tobytes().decode('ascii')
+
+
+def generate_queries(dna_code: str, length: int, number: int, mutation_rate: float, seed: int) -> List[str]:
+    """
+    :return: number of substrings of dna_code, half of them reverse complemented, with mutation_rate of bases mutated
+    """
+    rand = np.random.default_rng(seed)
+    bases = np.frombuffer(b'acgt', dtype=np.uint8)
+    queries = []
+    for idx in range(number):
+        start = int(rand.integers(0, len(dna_code) - length + 1))
+        gene = np.frombuffer(dna_code[start:start + length].encode('ascii'), dtype=np.uint8).copy()
+        if idx % 2 == 1:
+            gene = np.frombuffer(gene[::-1].tobytes().translate(bytes.maketrans(b'acgt', b'tgca')), dtype=np.uint8)
+        mutated = rand.random(length) < mutation_rate
+        gene = np.where(mutated, bases[rand.integers(0, 4, length)], gene)
+        queries.append(gene.astype(np.uint8).tobytes().decode('ascii'))
+    return queries
+
+
+def write_genbank(file_path: str, dna_code: str):
+    """
+    minimal GenBank file which NCBIDatabase reads, it only gets to ORIGIN after a gene feature
+    """
+    with open(file_path, 'w', encoding='utf8') as fw:
+        fw.write('LOCUS       BENCH%25d bp    DNA\n' % len(dna_code))
+        fw.write('SOURCE      synthetic\n')
+        fw.write('FEATURES             Location/Qualifiers\n')
+        fw.write('     gene            1..%d\n' % min(len(dna_code), 100))
+        fw.write('                     /gene="benchA"\n')
+        fw.write('ORIGIN\n')
+        for idx in range(0, len(dna_code), 60):
+            line = dna_code[idx:idx + 60]
+            fw.write('%9d %s\n' % (idx + 1, ' '.join(line[i:i + 10] for i in range(0, len(line), 10))))
+        fw.write('//\n')
+
+
+def write_genes(file_path: str, queries: List[str]):
+    with open(file_path, 'w', encoding='utf8') as fw:
+        fw.write('name\tgene\n')
+        for idx, gene in enumerate(queries):
+            fw.write('query%d\t%s\n' % (idx, gene))
+
+
+def get_peak_rss():
+    """
+    :return: peak RSS of this process and of the biggest finished child process, in MB
+    """
+    # ru_maxrss is in bytes on macOS, in KiB elsewhere
+    unit = 1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0
+    return [resource.getrusage(who).ru_maxrss / unit for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN]]
+
+
+class ReferenceSimilarityMatch(GeneSimilarityMatch):
+    """
+    GeneSimilarityMatch which scores every offset by the scalar scorers without any threshold, nothing is pruned,
+    it must be made with vectorized_scan=False
+    """
+
+    def count_similarity_for_block(self, query, is_reverse, start, end, keep=None, threshold=None, scores=None):
+        return super().count_similarity_for_block(query, is_reverse, start, end)
+
+
+@dataclass
+class SimilarityBenchmark:
+    output_path: str
+    genome_sizes: List[int] = field(default_factory=lambda: [1000000])
+    query_lengths: List[int] = field(default_factory=lambda: [24, 48])
+    query_number: int = 4
+    similarity_types: List[SimilarityType] = field(default_factory=lambda: list(SimilarityType))
+    modes: List[str] = field(default_factory=lambda: ['serial', 'parallel'])
+    process_num: int = None
+    top_k: int = 20
+    patience: int = 2
+    mutation_rate: float = 0.1
+    conditions: Dict = field(default_factory=lambda: DefaultConditions)
+    # size of the genome on which every fast path is checked against the scalar reference, which is slow
+    reference_size: int = 4000
+    reference_query_number: int = 2
+    # weights checked besides every one of similarity_types alone
+    mixed_weights: List[Dict[SimilarityType, int]] = field(default_factory=lambda: DefaultMixedWeights)
+    # patiences checked, besides patience
+    reference_patiences: List[int] = field(default_factory=lambda: [1])
+    # every case runs in a new process, so that its peak RSS is its own
+    isolate: bool = True
+    work_directory: str = None
+    seed: int = 0
+
+    def run(self):
+        with tempfile.TemporaryDirectory(dir=self.work_directory) as directory:
+            equivalence = self.check_equivalence(directory)
+            results = []
+            for genome_size in self.genome_sizes:
+                data_path = os.path.join(directory, 'bench_%d.txt' % genome_size)
+                dna_code = generate_genome(genome_size, self.seed)
+                write_genbank(data_path, dna_code)
+                for query_length in self.query_lengths:
+                    gene_path = os.path.join(directory, 'bench_%d_%d_genes.txt' % (genome_size, query_length))
+                    write_genes(gene_path, generate_queries(dna_code, query_length, self.query_number,
+                                                            self.mutation_rate, self.seed + query_length))
+                    for similarity_type in self.similarity_types:
+                        for mode in self.modes:
+                            case = {'genome_size': genome_size, 'query_length': query_length,
+                                    'similarity_type': similarity_type.name, 'mode': mode}
+                            LoggerFactory.info('Benchmark %s' % json.dumps(case))
+                            case.update(self.run_case(gene_path, data_path, similarity_type, mode))
+                            results.append(case)
+                del dna_code
+        report = {
+            'version': Version,
+            'environment': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count()
+            },
+            'config': {
+                'genome_sizes': self.genome_sizes,
+                'query_lengths': self.query_lengths,
+                'query_number': self.query_number,
+                'process_num': self.process_num,
+                'top_k': self.top_k,
+                'patience': self.patience,
+                'mutation_rate': self.mutation_rate,
+                'reference_size': self.reference_size,
+                'mixed_weights': [{k.name: v for k, v in weighted.items()} for weighted in self.mixed_weights],
+                'reference_patiences': self.reference_patiences,
+                'seed': self.seed
+            },
+            'results': results,
+            'equivalence': equivalence
+        }
+        with open(self.output_path, 'w', encoding='utf8') as fw:
+            json.dump(report, fw, indent=2)
+        mismatched = [check for check in equivalence if not check['matched']]
+        if mismatched:
+            raise AssertionError('fast paths differ from the scalar reference: %s' % json.dumps(mismatched))
+        return report
+
+    def create_matcher(self, gene_path, data_path, weighted, matcher_type=GeneSimilarityMatch, patience=None,
+                       **kwargs):
+        return matcher_type(gene_path, data_path, os.path.dirname(gene_path),
+                            top_k=self.top_k,
+                            patience=self.patience if patience is None else patience,
+                            weighted=weighted,
+                            conditions=self.conditions,
+                            **kwargs)
+
+    def check_equivalence(self, directory):
+        """
+        top_k of every similarity type alone and of every mixed weights, at every patience, from every fast path is
+        compared with ReferenceSimilarityMatch
+        """
+        data_path = os.path.join(directory, 'reference.txt')
+        dna_code = generate_genome(self.reference_size, self.seed + 1)
+        write_genbank(data_path, dna_code)
+        checks = []
+        for query_length in self.query_lengths:
+            gene_path = os.path.join(directory, 'reference_%d_genes.txt' % query_length)
+            queries = generate_queries(dna_code, query_length, self.reference_query_number, self.mutation_rate,
+                                       self.seed + query_length)
+            write_genes(gene_path, queries)
+            records = [('query%d' % idx, gene) for idx, gene in enumerate(queries)]
+            configs = [({similarity_type: 1}, patience) for similarity_type in self.similarity_types
+                       for patience in sorted({self.patience, *self.reference_patiences})]
+            configs.extend((weighted, patience) for weighted in self.mixed_weights
+                           for patience in sorted({self.patience, *self.reference_patiences}))
+            for weighted, patience in configs:
+                reference = self.create_matcher(gene_path, data_path, weighted, ReferenceSimilarityMatch, patience,
+                                                vectorized_scan=False)
+                expect = [reference.find_candidate_for_gene({'name': name, 'gene': gene}) for name, gene in records]
+                fast_paths = {
+                    'scalar': self.create_matcher(gene_path, data_path, weighted, patience=patience,
+                                                  vectorized_scan=False),
+                    'vectorized': self.create_matcher(gene_path, data_path, weighted, patience=patience),
+                    'qgram': self.create_matcher(gene_path, data_path, weighted, patience=patience, qgram_size=4),
+                    'parallel': self.create_matcher(gene_path, data_path, weighted, patience=patience,
+                                                    process_num=self.process_num)
+                }
+                for path, matcher in fast_paths.items():
+                    if path == 'parallel':
+                        contents = [None] * len(records)
+                        for query_id, rows in matcher.match_records(records):
+                            contents[query_id] = matcher.render_rows(rows)
+                    else:
+                        contents = [matcher.find_candidate_for_gene({'name': name, 'gene': gene})
+                                    for name, gene in records]
+                    checks.append({'query_length': query_length,
+                                   'weighted': {k.name: v for k, v in weighted.items()},
+                                   'patience': patience, 'path': path, 'matched': contents == expect})
+        return checks
+
+    def run_case(self, gene_path, data_path, similarity_type, mode):
+        if not self.isolate:
+            return self.measure(gene_path, data_path, similarity_type, mode)
+        context = multiprocessing.get_context('spawn')
+        queue = context.Queue()
+        process = context.Process(target=measure_in_process, args=(self, queue, gene_path, data_path,
+                                                                     similarity_type, mode))
+        process.start()
+        result = queue.get()
+        process.join()
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def measure(self, gene_path, data_path, similarity_type, mode):
+        """
+        :return: speed, latency of each query and peak RSS of one case
+        """
+        begin = time.perf_counter()
+        matcher = self.create_matcher(gene_path, data_path, {similarity_type: 1},
+                                      process_num=self.process_num if mode == 'parallel' else 1)
+        load_seconds = time.perf_counter() - begin
+        with open(gene_path, 'r', encoding='utf8') as fr:
+            records = [tuple(line.rstrip('\n').split('\t')) for line in fr.readlines()[1:]]
+        latencies = []
+        begin = time.perf_counter()
+        if mode == 'parallel':
+            for _ in matcher.match_records(records):
+                latencies.append(time.perf_counter() - begin)
+        else:
+            for name, gene in records:
+                start = time.perf_counter()
+                matcher.find_candidate_for_gene({'name': name, 'gene': gene})
+                latencies.append(time.perf_counter() - start)
+        seconds = time.perf_counter() - begin
+        windows = sum(2 * max(matcher.genome_length - len(gene) + 1, 0) for _, gene in records)
+        peak_rss, peak_children_rss = get_peak_rss()
+        return {
+            'queries': len(records),
+            'windows': windows,
+            'load_seconds': load_seconds,
+            'seconds': seconds,
+            'windows_per_second': windows / max(seconds, 1e-9),
+            # latency of a query in parallel mode is the time from the start until its result comes back
+            'latency': {
+                'mean': float(np.mean(latencies)),
+                'p50': float(np.percentile(latencies, 50)),
+                'p90': float(np.percentile(latencies, 90)),
+                'max': float(np.max(latencies))
+            },
+            # MB of 2 ** 20 bytes
+            'peak_rss_mb': peak_rss,
+            'peak_children_rss_mb': peak_children_rss
+        }
+
+
+def measure_in_process(benchmark: SimilarityBenchmark, queue, gene_path, data_path, similarity_type, mode):
+    try:
+        queue.put(benchmark.measure(gene_path, data_path, similarity_type, mode))
+    except Exception as e:
+        queue.put(e)
+
+
+def compare_benchmarks(baseline_path: str, current_path: str, tolerance: float = 0.2) -> List[dict]:
+    """
+    :return: cases in both reports whose windows per second dropped, or whose peak RSS grew, by more than tolerance
+    """
+    reports = []
+    for file_path in [baseline_path, current_path]:
+        with open(file_path, 'r', encoding='utf8') as fr:
+            reports.append(json.load(fr))
+
+    def get_key(result):
+        return result['genome_size'], result['query_length'], result['similarity_type'], result['mode']
+
+    baseline = {get_key(result): result for result in reports[0]['results']}
+    regressions = []
+    for result in reports[1]['results']:
+        old = baseline.get(get_key(result))
+        if old is None:
+            continue
+        speed = result['windows_per_second'] / max(old['windows_per_second'], 1e-9)
+        memory = result['peak_rss_mb'] / max(old['peak_rss_mb'], 1e-9)
+        if speed < 1 - tolerance or memory > 1 + tolerance:
+            regressions.append({
+                'case': dict(zip(['genome_size', 'query_length', 'similarity_type', 'mode'], get_key(result))),
+                'windows_per_second_ratio': speed,
+                'peak_rss_ratio': memory
+            })
+    return regressions
@@ -0,0 +1,31 @@
+import os
+
+from analysis.models.similarity_type import SimilarityType
+from benchmark.similarity_benchmark import SimilarityBenchmark, compare_benchmarks
+from experiment_config import ExperimentConfig
+
+# synthetic genomes from 1 Mb to 50 Mb
+genome_sizes = [1000000, 10000000, 50000000]
+query_lengths = [24, 48, 96]
+query_number = 4
+similarity_types = list(SimilarityType)
+# serial: find_candidate_for_gene in this process, parallel: match_records with process_num worker processes
+modes = ['serial', 'parallel']
+process_num = None
+benchmark_name = 'similarity_benchmark.json'
+# earlier result to compare with, regressions are cases 20% slower or bigger
+baseline_name = ''
+
+if __name__ == '__main__':
+    output_path = os.path.join(ExperimentConfig.output_directory, benchmark_name)
+    SimilarityBenchmark(output_path,
+                        genome_sizes=genome_sizes,
+                        query_lengths=query_lengths,
+                        query_number=query_number,
+                        similarity_types=similarity_types,
+                        modes=modes,
+                        process_num=process_num).run()
+    if baseline_name:
+        for regression in compare_benchmarks(os.path.join(ExperimentConfig.output_directory, baseline_name),
+                                             output_path):
+            print(regression)
@@ -0,0 +1,66 @@
+"""
+Synthetic genome, genes and GenBank file shared by the similarity match tests
+"""
+import os
+import random
+
+from analysis.gene_similarity_match import GeneSimilarityMatch
+
+
+def random_dna(size, seed):
+    rand = random.Random(seed)
+    return ''.join(rand.choice('acgt') for _ in range(size))
+
+
+def write_genbank(file_path, dna_code):
+    with open(file_path, 'w', encoding='utf8') as fw:
+        fw.write('LOCUS       TEST%26d bp    DNA\n' % len(dna_code))
+        fw.write('SOURCE      synthetic\n')
+        fw.write('FEATURES             Location/Qualifiers\n')
+        fw.write('     gene            1..20\n')
+        fw.write('                     /gene="synA"\n')
+        fw.write('ORIGIN\n')
+        for idx in range(0, len(dna_code), 60):
+            line = dna_code[idx:idx + 60]
+            fw.write('%9d %s\n' % (idx + 1, ' '.join(line[i:i + 10] for i in range(0, len(line), 10))))
+        fw.write('//\n')
+
+
+class MatchFixture:
+    """
+    A random genome of 3000 bases written as a GenBank file in directory, with an empty gene file. genes are random
+    ones and a part of the genome with a base replaced, mutated_genes are parts of the genome with a few bases changed.
+    """
+
+    def __init__(self, directory: str, data_name: str = 'synthetic.txt'):
+        self.database = random_dna(3000, 1)
+        self.genes = [random_dna(length, length) for length in [8, 17, 30]]
+        self.genes.append(self.database[1200:1240].replace('t', 'c'))
+        rand = random.Random(7)
+        self.mutated_genes = []
+        for gene in [self.database[100:130], self.database[700:740], self.database[2000:2060]]:
+            gene = list(gene)
+            for _ in range(len(gene) // 15):
+                gene[rand.randrange(len(gene))] = rand.choice('acgt')
+            self.mutated_genes.append(''.join(gene))
+
+        self.directory = directory
+        self.data_path = os.path.join(directory, data_name)
+        self.gene_path = os.path.join(directory, 'genes.txt')
+        write_genbank(self.data_path, self.database)
+        open(self.gene_path, 'w').close()
+
+    def write_genes(self, genes):
+        """
+        genes as the gene file, named gene0, gene1, ...
+        """
+        with open(self.gene_path, 'w', encoding='utf8') as fw:
+            fw.write('name\tgene\n')
+            for idx, gene in enumerate(genes):
+                fw.write('gene%d\t%s\n' % (idx, gene))
+
+    def create_matcher(self, **kwargs) -> GeneSimilarityMatch:
+        """
+        :param kwargs: the parameters of GeneSimilarityMatch after its paths
+        """
+        return GeneSimilarityMatch(self.gene_path, self.data_path, self.directory, **kwargs)
@@ -0,0 +1,30 @@
+import random
+import unittest
+
+import numpy as np
+
+from analysis.candidate_store import CandidateStore
+from analysis.models.similarity_type import SimilarityType
+
+
+class TestCandidateStore(unittest.TestCase):
+    def test_candidate_store(self):
+        rand = random.Random(3)
+        for candidate_distance, top_k in [(1, 5), (3, 4), (5, 1000)]:
+            scores = np.array([rand.randrange(-1, 6) for _ in range(500)], dtype=np.float64)
+            start, end = 20, 470
+            radius = candidate_distance - 1
+            expect = [offset for offset in range(start, end) if scores[offset] > 0 and
+                      scores[offset] >= scores[max(offset - radius, 0):offset + radius + 1].max()]
+            expect = sorted(sorted(expect, key=lambda offset: -scores[offset])[:top_k])
+            store = CandidateStore([SimilarityType.Direct], top_k, candidate_distance, start, end)
+            block_start = 0
+            while block_start < len(scores):
+                block_end = min(block_start + rand.randrange(1, 40), len(scores))
+                block = scores[block_start:block_end]
+                store.add_block(block_start, block, {SimilarityType.Direct: block * 2}, block_end == len(scores))
+                block_start = block_end
+            candidates = store.get_candidates(3, False, len(scores))
+            self.assertEqual(expect, [c.left for c in candidates])
+            self.assertEqual([scores[offset] * 2 for offset in expect],
+                             [c.similarity_dict[SimilarityType.Direct] for c in candidates])
@@ -0,0 +1,21 @@
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.factories.logger_factory import ProgressMeter
+
+
+class TestLoggerFactory(unittest.TestCase):
+    def test_progress_meter(self):
+        built = []
+
+        def build_msg(solved, total):
+            built.append(solved)
+            return '%d/%d' % (solved, total)
+
+        progress = ProgressMeter(8000, build_msg, stride=100, time_distance=3600)
+        with ThreadPoolExecutor(8) as executor:
+            for _ in range(8):
+                executor.submit(lambda: [progress.add() for _ in range(1000)])
+        self.assertEqual(8000, progress.solved)
+        # only the first line is printed within time_distance, other messages are never built
+        self.assertEqual([0], built)
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from analysis.match_checkpoint import MatchCheckpoint
+from analysis.models.similarity_type import SimilarityType
+from match_fixture import MatchFixture
+
+
+class TestMatchCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fixture = MatchFixture(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_run_with_checkpoint(self):
+        mutated_genes = self.fixture.mutated_genes
+        checkpoint_directory = os.path.join(self.fixture.directory, 'checkpoint')
+        self.fixture.write_genes(mutated_genes)
+        matchers = [self.fixture.create_matcher(top_k=3,
+                                                weighted={SimilarityType.Direct: 1},
+                                                process_num=2,
+                                                checkpoint_directory=checkpoint_directory if checkpoint else None)
+                    for checkpoint in [False, True]]
+        matchers[0].run()
+        with open(matchers[0].result_path, 'r', encoding='utf8') as fr:
+            expect = fr.read()
+        os.remove(matchers[0].result_path)
+        matched = []
+        match_records = matchers[1].match_records
+        matchers[1].match_records = lambda records, query_ids=None: \
+            matched.append(list(query_ids)) or match_records(records, query_ids)
+        matchers[1].run()
+        # as if the run was killed before gene1 was finished
+        os.remove(os.path.join(checkpoint_directory, '%s.txt' % MatchCheckpoint.get_query_key(
+            'gene1', mutated_genes[1])))
+        os.remove(matchers[1].result_path)
+        matchers[1].run()
+        with open(matchers[1].result_path, 'r', encoding='utf8') as fr:
+            self.assertEqual(expect, fr.read())
+        self.assertEqual([[0, 1, 2], [1]], matched)
+        # parameters changed, nothing is reused
+        matchers[1].top_k = 2
+        matchers[1].run()
+        self.assertEqual([0, 1, 2], matched[-1])
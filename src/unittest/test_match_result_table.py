@@ -0,0 +1,45 @@
+import os
+import tempfile
+import unittest
+
+from analysis.gene_location_analysis import GeneLocationAnalysis
+from analysis.match_result_table import load_match_table
+from analysis.models.similarity_type import SimilarityType
+from match_fixture import MatchFixture
+
+
+class TestMatchResultTable(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        # gene location analysis finds the report headers by the NC prefix of the data name
+        self.fixture = MatchFixture(self.directory.name, 'NC_000000.1.txt')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_result_table(self):
+        self.fixture.write_genes(self.fixture.mutated_genes)
+        weighted = {SimilarityType.Consistency: 1, SimilarityType.Direct: 2}
+        for checkpoint in [None, os.path.join(self.fixture.directory, 'checkpoint')]:
+            matcher = self.fixture.create_matcher(top_k=3,
+                                                  weighted=weighted,
+                                                  process_num=2,
+                                                  checkpoint_directory=checkpoint,
+                                                  result_table=True)
+            matcher.run()
+            with open(matcher.result_path, 'r', encoding='utf8') as fr:
+                expect = fr.read()
+            table = load_match_table(matcher.table_path)
+            self.assertEqual(len(self.fixture.mutated_genes) * 3, len(table))
+            rows = [{name: row[name].item() for name in table.dtype.names} for row in table]
+            self.assertEqual(expect, matcher.render_rows(rows))
+            # gene location analysis reads the same data from both
+            location_analysis = GeneLocationAnalysis.__new__(GeneLocationAnalysis)
+            report_list = location_analysis.load_similarity_report(matcher.result_path)
+            table_list = GeneLocationAnalysis.load_similarity_table(matcher.table_path)
+            self.assertEqual(report_list, [{k: v for k, v in data.items() if k != 'row'} for data in table_list])
+            # sub matches are cut from the columns of the row
+            for report_data, table_data in zip(report_list, table_list):
+                self.assertEqual(list(location_analysis.extract_sub_data(report_data)),
+                                 [{k: v for k, v in data.items() if k != 'row'}
+                                  for data in location_analysis.extract_sub_data(table_data)])
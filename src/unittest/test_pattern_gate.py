@@ -0,0 +1,43 @@
+import re
+import tempfile
+import unittest
+
+from analysis.models.match_pattern import MatchPattern
+from analysis.models.similarity_type import SimilarityType
+from match_fixture import MatchFixture
+
+
+class TestPatternGate(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fixture = MatchFixture(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_pattern_gate(self):
+        conditions = {
+            'must': [{'offset': 0, 'length': 2}, {'offset': -2, 'length': 2}],
+            'optional': [{'offset': 2, 'length': 1}]
+        }
+        matchers = [self.fixture.create_matcher(top_k=5,
+                                                patience=2,
+                                                weighted={SimilarityType.Consistency: 1},
+                                                conditions=conditions,
+                                                vectorized_scan=vectorized_scan,
+                                                qgram_size=qgram_size,
+                                                pattern_gate=True)
+                    for vectorized_scan, qgram_size in [(True, None), (True, 4), (False, None)]]
+        for gene in self.fixture.mutated_genes:
+            match_pattern = MatchPattern(gene, conditions)
+            for is_reverse in [False, True]:
+                database = matchers[0].get_dna_code(is_reverse)
+                expect = matchers[0].match_gene('test', gene, is_reverse, 0, len(self.fixture.database))
+                self.assertTrue(expect)
+                for candidate in expect:
+                    self.assertTrue(re.match(match_pattern.must_pattern,
+                                             database[candidate.left:candidate.left + len(gene)]))
+                for matcher in matchers[1:]:
+                    actual = matcher.match_gene('test', gene, is_reverse, 0, len(self.fixture.database))
+                    self.assertEqual([(c.left, c.weighted_similarity) for c in expect],
+                                     [(c.left, c.weighted_similarity) for c in actual])
@@ -0,0 +1,42 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from utils.gene_util import encode_dna
+from utils.qgram_index import QGramIndex, QGramClassTable
+
+
+class TestQGramIndex(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(7)
+        self.database = ''.join(rand.choice('acgtn' if i % 500 == 0 else 'acgt') for i in range(3000))
+        self.gene = self.database[100:130].replace('c', 't')
+
+    def test_count_diagonal(self):
+        q, band = 4, 2
+        database = encode_dna(self.database)
+        index = QGramIndex.build(database, q)
+        gene = encode_dna(self.gene)
+        count = index.count_diagonal(gene, 50, 2500, band)
+        database_classes = QGramClassTable[database]
+        gene_classes = QGramClassTable[gene]
+        for offset in range(50, 2500, 97):
+            expect = 0
+            for i in range(len(gene) - q + 1):
+                for p in range(offset + i - band, offset + i + band + 1):
+                    if 0 <= p <= len(database) - q and \
+                            np.array_equal(gene_classes[i:i + q], database_classes[p:p + q]):
+                        expect += 1
+            self.assertEqual(expect, count[offset - 50])
+
+    def test_save_and_load(self):
+        database = encode_dna(self.database)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'index.npz')
+            index = QGramIndex.load_or_build(database, 5, file_path)
+            loaded = QGramIndex.load_or_build(database, 5, file_path)
+            self.assertEqual(index.checksum, loaded.checksum)
+            self.assertTrue(np.array_equal(index.order, loaded.order))
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from analysis.gene_similarity_match import GeneSimilarityMatch
+from analysis.models.similarity_type import SimilarityType
+from match_fixture import MatchFixture
+
+
+class TestScoreCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fixture = MatchFixture(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_run_with_score_cache(self):
+        score_cache_directory = os.path.join(self.fixture.directory, 'score_cache')
+        self.fixture.write_genes(self.fixture.mutated_genes)
+
+        def run(weighted, cache, process_num):
+            matcher = self.fixture.create_matcher(top_k=3,
+                                                  weighted=weighted,
+                                                  qgram_size=4,
+                                                  process_num=process_num,
+                                                  score_cache_directory=score_cache_directory if cache else None)
+            matcher.run()
+            with open(matcher.result_path, 'r', encoding='utf8') as fr:
+                return fr.read()
+
+        first = {SimilarityType.Direct: 1, SimilarityType.Consistency: 1}
+        second = {SimilarityType.Direct: 1, SimilarityType.Consistency: 3}
+        self.assertEqual(run(first, False, 2), run(first, True, 2))
+        self.assertEqual(len(self.fixture.mutated_genes) * 2 * len(first), len(os.listdir(score_cache_directory)))
+        expect = run(second, False, None)
+        # every score is cached, nothing is scanned
+        match_genes = GeneSimilarityMatch.match_genes
+        GeneSimilarityMatch.match_genes = None
+        try:
+            self.assertEqual(expect, run(second, True, None))
+        finally:
+            GeneSimilarityMatch.match_genes = match_genes
@@ -0,0 +1,251 @@
+import random
+import re
+import tempfile
+import unittest
+
+from analysis.compiled_query import CompiledQuery
+from analysis.models.match_pattern import MatchPattern
+from analysis.models.similarity_type import SimilarityType
+from analysis.similarities.blat_similarity import BlatSimilarity
+from analysis.similarities.consistency_similarity import ConsistencySimilarity
+from analysis.similarities.direct_match_similarity import DirectMatchSimilarity
+from analysis.similarities.pattern_similarity import PatternSimilarity
+from analysis.similarities.text_edit_similarity import TextEditSimilarity
+from match_fixture import MatchFixture
+from utils.gene_util import encode_dna
+
+
+class TestSimilarityArray(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fixture = MatchFixture(self.directory.name)
+        self.database, self.genes, self.mutated_genes = \
+            self.fixture.database, self.fixture.genes, self.fixture.mutated_genes
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_direct_similarity_array(self):
+        similarity = DirectMatchSimilarity()
+        database = encode_dna(self.database)
+        for gene in self.genes:
+            end = len(self.database) - len(gene) + 1
+            scores = similarity.get_similarity_array(encode_dna(gene), database, 0, end)
+            for offset in range(end):
+                self.assertEqual(similarity.get_similarity(gene, self.database, offset)[0], scores[offset])
+
+    def test_consistency_similarity_array(self):
+        database = encode_dna(self.database)
+        for max_patience in [0, 1, 2, 5]:
+            similarity = ConsistencySimilarity(max_patience=max_patience)
+            for gene in self.genes + ['c', 'tt']:
+                end = len(self.database) - len(gene) + 1
+                scores = similarity.get_similarity_array(encode_dna(gene), database, 0, end)
+                for offset in range(end):
+                    self.assertEqual(similarity.get_similarity(gene, self.database, offset)[0], scores[offset])
+
+    def test_text_edit_similarity_array(self):
+        database = self.database[:400] + 'n' + self.database[400:600]
+        genes = [database[100:170], 'c', 'ct'] + self.genes[:2]
+        for continuous_mismatch_limit in [None, 1, 4]:
+            similarity = TextEditSimilarity(continuous_mismatch_limit=continuous_mismatch_limit)
+            for gene in genes:
+                end = len(database) - len(gene) + 1
+                scores = similarity.get_similarity_array(encode_dna(gene), encode_dna(database), 0, end)
+                for offset in range(end):
+                    self.assertEqual(similarity.get_similarity(gene, database, offset)[0], scores[offset])
+
+    def test_blat_similarity_array(self):
+        # seeds acgt and tgca with bases inserted in and between them
+        database = 'ggacagtcccctgacaggg' + self.database[:500]
+        self.assertEqual((1, 16), BlatSimilarity().get_similarity('acgttgca', database, 2))
+        self.assertEqual(0, BlatSimilarity(mid_limit=3).get_similarity('acgttgca', database, 2)[0])
+        self.assertEqual(0, BlatSimilarity(end_limit=0).get_similarity('acgttgca', database, 2)[0])
+        genes = ['acgttgca', 'cctgacag'] + [gene[:12] for gene in self.genes]
+        for mid_limit, end_limit in [(10, 2), (3, 0), (15, 4)]:
+            similarity = BlatSimilarity(mid_limit=mid_limit, end_limit=end_limit)
+            for gene in genes:
+                end = len(database) - len(gene) + 1
+                for start in [0, 37]:
+                    ends = similarity.get_match_end_array(encode_dna(gene), encode_dna(database), start, end)
+                    for offset in range(start, end):
+                        score, match_end = similarity.get_similarity(gene, database, offset)
+                        self.assertEqual(match_end if score else -1, ends[offset - start])
+
+    def test_pattern_similarity_array(self):
+        database = encode_dna(self.database)
+        for conditions in [
+            {'must': [{'offset': 0, 'length': 4}, {'offset': -4, 'length': 4}],
+             'optional': [{'offset': 4, 'length': 1}, {'offset': -5, 'length': 1}]},
+            {'must': [{'offset': 0, 'length': 2}], 'optional': [{'offset': 3, 'length': 2}]},
+            # the must condition floats, so the regex is run
+            {'must': [{'offset': 2, 'length': 2}], 'optional': [{'offset': -2, 'length': 2}]}
+        ]:
+            for gene in self.genes[:2] + self.mutated_genes[:1]:
+                match_pattern = MatchPattern(gene, conditions)
+                self.assertEqual(conditions['must'][0]['offset'] == 2, match_pattern.must_anchors is None)
+                similarity = PatternSimilarity(match_pattern)
+                end = len(self.database) - len(gene) + 1
+                scores, must = similarity.get_similarity_and_mask_array(encode_dna(gene), database, 0, end)
+                for offset in range(end):
+                    target = self.database[offset:offset + len(gene)]
+                    expect = 0
+                    if re.match(match_pattern.must_pattern, target):
+                        expect = match_pattern.must_score + sum(
+                            score for optional_pattern, score in match_pattern.option_patterns
+                            if re.match(optional_pattern, target))
+                    self.assertEqual(expect, similarity.get_similarity(gene, self.database, offset)[0])
+                    self.assertEqual(expect, scores[offset])
+                    self.assertEqual(expect > 0, must[offset])
+
+    def test_similarity_threshold(self):
+        database = self.database[:800]
+        similarities = [DirectMatchSimilarity(), ConsistencySimilarity(max_patience=2), TextEditSimilarity(3)]
+        for similarity in similarities:
+            for gene in self.mutated_genes[:2]:
+                for offset in range(0, len(database) - len(gene) + 1, 7):
+                    expect, _ = similarity.get_similarity(gene, database, offset)
+                    for threshold in [expect - 1, expect, expect + 0.5, len(gene) * 0.8]:
+                        actual, _ = similarity.get_similarity(gene, database, offset, threshold)
+                        if actual >= threshold:
+                            self.assertEqual(expect, actual)
+                        else:
+                            self.assertLess(expect, threshold)
+                            self.assertGreaterEqual(actual, expect)
+
+    def test_similarity_threshold_property(self):
+        rand = random.Random(17)
+        for max_patience in [0, 1, 2]:
+            similarities = [DirectMatchSimilarity(), ConsistencySimilarity(max_patience), TextEditSimilarity(3)]
+            for _ in range(300):
+                size = rand.randint(1, 14)
+                gene = ''.join(rand.choice('ag') for _ in range(size))
+                database = ''.join(rand.choice('ag') for _ in range(size))
+                for similarity in similarities:
+                    expect, _ = similarity.get_similarity(gene, database, 0)
+                    for threshold in [expect - 0.5, expect, expect + 0.5, rand.uniform(0, size)]:
+                        actual, _ = similarity.get_similarity(gene, database, 0, threshold)
+                        if expect >= threshold:
+                            self.assertEqual(expect, actual, (gene, database, threshold))
+                        else:
+                            self.assertGreaterEqual(actual, expect, (gene, database, threshold))
+        self.assertEqual(6, ConsistencySimilarity(1).get_similarity('aaaaaaaaaa', 'gggaaaagaa', 0, 5.5)[0])
+        # mixed weights, the bound of each type must not drop a real hit
+        for weighted in [{SimilarityType.Direct: 1, SimilarityType.Consistency: 2},
+                         {SimilarityType.Consistency: 3, SimilarityType.Direct: 1, SimilarityType.TextEdit: 2}]:
+            for _ in range(200):
+                size = rand.randint(4, 12)
+                gene = ''.join(rand.choice('acgt') for _ in range(size))
+                database = ''.join(rand.choice('acgt') for _ in range(size))
+                query = CompiledQuery(gene, weighted, max_patience=1)
+                expect, _ = query.score(database, 0)
+                for threshold in [expect, expect - 0.01, rand.uniform(0, size)]:
+                    if expect >= threshold:
+                        self.assertEqual(expect, query.score(database, 0, threshold)[0], (gene, database))
+        query = CompiledQuery('atccgtc', {SimilarityType.Direct: 1, SimilarityType.Consistency: 2}, max_patience=1)
+        self.assertEqual(4.0, query.score('tctcgcc', 0, 3.67)[0])
+
+    def test_compiled_query(self):
+        conditions = {
+            'must': [{'offset': 0, 'length': 4}, {'offset': -4, 'length': 4}],
+            'optional': [{'offset': 4, 'length': 1}, {'offset': -5, 'length': 1}]
+        }
+        weighted = {SimilarityType.Pattern: 1, SimilarityType.Direct: 2, SimilarityType.Consistency: 1}
+        database = self.database[:600]
+        for gene in self.mutated_genes[:2]:
+            query = CompiledQuery(gene, weighted, max_patience=2, conditions=conditions)
+            direct, consistency = DirectMatchSimilarity(), ConsistencySimilarity(max_patience=2)
+            for offset in range(len(database) - len(gene) + 1):
+                target = database[offset:offset + len(gene)]
+                pattern = 0
+                if re.match(query.match_pattern.must_pattern, target):
+                    pattern = query.match_pattern.must_score + sum(
+                        score for optional_pattern, score in query.match_pattern.option_patterns
+                        if re.match(optional_pattern, target))
+                expect = {SimilarityType.Pattern: pattern,
+                          SimilarityType.Direct: direct.get_similarity(gene, database, offset)[0],
+                          SimilarityType.Consistency: consistency.get_similarity(gene, database, offset)[0]}
+                weighted_similarity, similarity = query.score(database, offset)
+                self.assertEqual(expect, similarity)
+                self.assertEqual((pattern + expect[SimilarityType.Direct] * 2 +
+                                  expect[SimilarityType.Consistency]) / 4.0, weighted_similarity)
+
+    def test_match_gene_vectorized(self):
+        for weighted in [{SimilarityType.Direct: 1},
+                         {SimilarityType.Direct: 2, SimilarityType.Consistency: 1}]:
+            matchers = [self.fixture.create_matcher(top_k=5,
+                                                    patience=2,
+                                                    weighted=weighted,
+                                                    vectorized_scan=vectorized_scan)
+                        for vectorized_scan in [False, True]]
+            for gene in self.genes:
+                for is_reverse in [False, True]:
+                    expect, actual = [matcher.match_gene('test', gene, is_reverse, 0, len(self.database))
+                                      for matcher in matchers]
+                    self.assertEqual([(c.left, c.weighted_similarity, c.similarity_dict) for c in expect],
+                                     [(c.left, c.weighted_similarity, c.similarity_dict) for c in actual])
+
+    def test_lossless_pruning(self):
+        for weighted in [{SimilarityType.Consistency: 1},
+                         {SimilarityType.TextEdit: 1, SimilarityType.Direct: 2, SimilarityType.Consistency: 1}]:
+            matchers = [self.fixture.create_matcher(top_k=3,
+                                                    patience=2,
+                                                    weighted=weighted,
+                                                    qgram_size=qgram_size)
+                        for qgram_size in [None, 4]]
+            # scoring each offset with branch and bound
+            matchers.append(self.fixture.create_matcher(top_k=3,
+                                                        patience=2,
+                                                        weighted=weighted,
+                                                        vectorized_scan=False))
+            for gene in self.mutated_genes:
+                expect = matchers[0].find_candidate_for_gene({'name': 'test', 'gene': gene})
+                for matcher in matchers[1:]:
+                    self.assertEqual(expect, matcher.find_candidate_for_gene({'name': 'test', 'gene': gene}))
+
+    def test_chunk_boundary(self):
+        matcher = self.fixture.create_matcher(patience=2,
+                                              weighted={SimilarityType.Consistency: 1})
+        for gene in self.mutated_genes:
+            for is_reverse in [False, True]:
+                expect = matcher.match_gene('test', gene, is_reverse, 0, len(self.database))
+                actual = []
+                for start in range(0, len(self.database), 97):
+                    actual.extend(matcher.match_gene('test', gene, is_reverse, start, start + 97))
+                actual = sorted(actual, key=lambda arg: -arg.weighted_similarity)[:matcher.top_k]
+                self.assertEqual([(c.left, c.weighted_similarity) for c in expect],
+                                 sorted([(c.left, c.weighted_similarity) for c in actual]))
+
+    def test_match_genes(self):
+        queries = [('test%d' % idx, gene[:30]) for idx, gene in enumerate(self.mutated_genes + self.genes[2:])]
+        for weighted, qgram_size in [({SimilarityType.Direct: 1}, None),
+                                     ({SimilarityType.Direct: 2, SimilarityType.Consistency: 1}, 4)]:
+            matcher = self.fixture.create_matcher(top_k=3,
+                                                  patience=2,
+                                                  weighted=weighted,
+                                                  qgram_size=qgram_size)
+            for is_reverse in [False, True]:
+                expect = [matcher.match_gene(name, gene, is_reverse, 0, len(self.database))
+                          for name, gene in queries]
+                actual = matcher.match_genes(queries, is_reverse, 0, len(self.database))
+                self.assertEqual([[(c.left, c.weighted_similarity, c.similarity_dict) for c in candidates]
+                                  for candidates in expect],
+                                 [[(c.left, c.weighted_similarity, c.similarity_dict) for c in candidates]
+                                  for candidates in actual])
+
+    def test_run_with_scan_executor(self):
+        genes = self.genes + [gene[:17] for gene in self.mutated_genes]
+        self.fixture.write_genes([gene.upper() for gene in genes])
+        for qgram_size in [None, 4]:
+            matcher = self.fixture.create_matcher(top_k=3,
+                                                  patience=2,
+                                                  weighted={SimilarityType.Direct: 1, SimilarityType.Consistency: 1},
+                                                  qgram_size=qgram_size,
+                                                  process_num=2,
+                                                  query_batch_size=2)
+            matcher.run()
+            with open(matcher.result_path, 'r', encoding='utf8') as fr:
+                actual = fr.read()
+            expect = ''.join(matcher.find_candidate_for_gene({'name': 'gene%d' % idx, 'gene': gene})
+                             for idx, gene in enumerate(genes))
+            self.assertEqual(expect, actual)
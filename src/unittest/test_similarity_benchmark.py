@@ -0,0 +1,46 @@
+import json
+import os
+import tempfile
+import unittest
+
+from analysis.models.similarity_type import SimilarityType
+from benchmark.similarity_benchmark import SimilarityBenchmark, compare_benchmarks
+
+
+class TestSimilarityBenchmark(unittest.TestCase):
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, 'benchmark.json')
+            benchmark = SimilarityBenchmark(output_path,
+                                            genome_sizes=[5000],
+                                            query_lengths=[20],
+                                            query_number=2,
+                                            similarity_types=[SimilarityType.Direct, SimilarityType.Blat],
+                                            process_num=2,
+                                            reference_size=1500,
+                                            isolate=False,
+                                            work_directory=directory)
+            report = benchmark.run()
+            with open(output_path, 'r', encoding='utf8') as fr:
+                self.assertEqual(report, json.load(fr))
+            # 2 similarity types and 4 mixed weights, at patience 1 and 2, by 4 paths
+            self.assertEqual((2 + 4) * 2 * 4, len(report['equivalence']))
+            self.assertEqual({'Blat', 'Pattern'}, {name for check in report['equivalence'] if len(check['weighted']) > 1
+                                                   for name in check['weighted']} & {'Blat', 'Pattern'})
+            self.assertEqual({1, 2, 3}, {len(check['weighted']) for check in report['equivalence']})
+            self.assertTrue(all(check['matched'] for check in report['equivalence']))
+            self.assertEqual([(similarity_type, mode) for similarity_type in ['Direct', 'Blat']
+                              for mode in ['serial', 'parallel']],
+                             [(result['similarity_type'], result['mode']) for result in report['results']])
+            for result in report['results']:
+                self.assertEqual(2 * 2 * (5000 - 20 + 1), result['windows'])
+                self.assertEqual(2, result['queries'])
+                self.assertGreater(result['windows_per_second'], 0)
+            self.assertEqual([], compare_benchmarks(output_path, output_path))
+            report['results'][0]['windows_per_second'] *= 2
+            baseline_path = os.path.join(directory, 'baseline.json')
+            with open(baseline_path, 'w', encoding='utf8') as fw:
+                json.dump(report, fw)
+            regressions = compare_benchmarks(baseline_path, output_path)
+            self.assertEqual(1, len(regressions))
+            self.assertAlmostEqual(0.5, regressions[0]['windows_per_second_ratio'])
@@ -1,17 +1,22 @@
 import unittest
 
-from analysis.gene_similarity_match import count_similarity, fast_skip, count_acgt, compute_blat_similarity
+from analysis.compiled_query import CompiledQuery
+from analysis.gene_similarity_match import fast_skip, count_acgt
+from analysis.models.similarity_type import SimilarityType
+from analysis.similarities.blat_similarity import BlatSimilarity
+from analysis.similarities.direct_match_similarity import DirectMatchSimilarity
+from analysis.similarities.text_edit_similarity import TextEditSimilarity
 
 
 class TestSimilarityMatch(unittest.TestCase):
     def test_count_similarity(self):
-        text_distance_similarity = count_similarity('text_distance', 100, 'ACGTACG', 'ACGACGT', 0, is_reverse=False)
-        self.assertEqual(71, text_distance_similarity)
-        offset_test = count_similarity('text_distance', 100, 'ACGTACG', 'GCTACGACGT', 3, is_reverse=False)
-        self.assertEqual(text_distance_similarity, offset_test)
+        text_edit_similarity, _ = TextEditSimilarity().get_similarity('acgtacg', 'acgacgt', 0)
+        self.assertEqual(5, text_edit_similarity)
+        offset_test, _ = TextEditSimilarity().get_similarity('acgtacg', 'gctacgacgt', 3)
+        self.assertEqual(text_edit_similarity, offset_test)
 
-        match_similarity = count_similarity('char_match', 100, 'ACGTACG', 'ACGACGT', 0, is_reverse=False)
-        self.assertEqual(42, match_similarity)
+        match_similarity, _ = DirectMatchSimilarity().get_similarity('acgtacg', 'acgacgt', 0)
+        self.assertEqual(3, match_similarity)
 
     def test_fast_skip(self):
         source_gene = 'AAAATTTAA'
@@ -28,14 +33,22 @@ class TestSimilarityMatch(unittest.TestCase):
     def test_blat_similarity(self):
         gene = "tgatatca"
         test_cases = [
-            ["atgatatca", 0, False, None],
-            ["tgatatca", 0, False, None],
-            ["tgataatca", 0, True, 9],
-            ["tagataatca", 0, True, 10],
-            ["tagtactaatca", 0, False, None],
-            ["taaaagataatca", 0, True, 13]
+            ["tgatcccatca", 0, 1, 11],
+            ["tgaatcccatca", 0, 1, 12],
+            ["gtgatcccatca", 1, 1, 12],
+            ["tgatccatca", 0, 0, None],
+            ["tgatccccccccccccatca", 0, 0, None],
+            ["atgatcccatca", 0, 0, None]
         ]
         for database, offset, expect_flag, expect_pos in test_cases:
-            flag, pos = compute_blat_similarity(gene, database, offset)
+            flag, pos = BlatSimilarity().get_similarity(gene, database, offset)
             self.assertEqual(expect_flag, flag)
             self.assertEqual(expect_pos, pos)
+
+    def test_render_without_blat_seed(self):
+        gene, database = 'tgatatca', 'ccgatatcagg'
+        query = CompiledQuery(gene, {SimilarityType.Blat: 1, SimilarityType.Direct: 1})
+        # kept for its Direct score, Blat finds no seed at offset 1
+        self.assertEqual((3.5, {SimilarityType.Direct: 7, SimilarityType.Blat: 0}), query.score(database, 1))
+        self.assertEqual([list(gene), list(database[1:9]), list('.*******'),
+                          list(gene), list(database[1:9]), ['.'] * 8], query.render(database, 1))
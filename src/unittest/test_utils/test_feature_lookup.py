@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+
+from utils.feature_lookup import FeatureLookup, FeatureMatch, LookupKey
+from utils.ncbi_database import NCBIDatabase
+
+
+class TestFeatureLookup(unittest.TestCase):
+    def setUp(self):
+        self.lookup = FeatureLookup(
+            genes=['thrL', 'thrA', None, 'b0003', 'thrA'],
+            locus_tags=['b0001', 'b0002', 'b0003', None, 'b0004'],
+            gene_synonyms=['ECK0001', 'ECK0002; Hs; thrA1', None, None, 'thrA2;'],
+            gene_ids=[944742, 945803, None, None, 947498],
+            xrefs=[{'ASAP': 'ABE-0000006'}, {}, {'EcoGene': 'EG10998'}, {}, {}])
+
+    def test_resolve(self):
+        names = ['thrA', 'b0003', 'Hs', '944742', 'GeneID:945803', 'EcoGene:EG10998', 'ABE-0000006', 'THRL', 'hs',
+                 'thrA2', 'missing', '']
+        expect = [FeatureMatch((1, 4), LookupKey.Gene),
+                  # gene first
+                  FeatureMatch((3,), LookupKey.Gene),
+                  FeatureMatch((1,), LookupKey.GeneSynonym),
+                  FeatureMatch((0,), LookupKey.GeneId),
+                  FeatureMatch((1,), LookupKey.GeneId),
+                  FeatureMatch((2,), LookupKey.Xref),
+                  FeatureMatch((0,), LookupKey.Xref),
+                  FeatureMatch((0,), LookupKey.Gene, True),
+                  FeatureMatch((1,), LookupKey.GeneSynonym, True),
+                  FeatureMatch((4,), LookupKey.GeneSynonym),
+                  FeatureMatch(),
+                  FeatureMatch()]
+        self.assertEqual(expect, self.lookup.resolve(names))
+        self.assertEqual(FeatureMatch((2,), LookupKey.LocusTag), self.lookup.resolve_one('b0003', LookupKey.LocusTag))
+        self.assertEqual(FeatureMatch((2,), LookupKey.LocusTag, True),
+                         self.lookup.resolve_one('B0003', LookupKey.LocusTag))
+        self.assertEqual(FeatureMatch(), self.lookup.resolve_one('thrA', LookupKey.LocusTag))
+        # the matches are shared by every call and can not be changed
+        match = self.lookup.resolve_one('thrA')
+        with self.assertRaises(AttributeError):
+            match.indices = ()
+        self.assertEqual(FeatureMatch((1, 4), LookupKey.Gene), self.lookup.resolve_one('thrA'))
+
+    def test_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            data_path = os.path.join(directory, 'synthetic.txt')
+            with open(data_path, 'w', encoding='utf8') as fw:
+                fw.write('LOCUS       TEST                       120 bp    DNA\n')
+                fw.write('FEATURES             Location/Qualifiers\n')
+                fw.write('     gene            10..90\n')
+                fw.write('                     /gene="synA"\n')
+                fw.write('                     /locus_tag="b2397"\n')
+                fw.write('                     /gene_synonym="ECK2392; synB"\n')
+                fw.write('                     /db_xref="GeneID:944742"\n')
+                fw.write('                     /db_xref="ASAP:ABE-0007898"\n')
+                fw.write('ORIGIN\n')
+                fw.write('        1 %s\n' % ' '.join(['acgtacgtac'] * 6))
+                fw.write('       61 %s\n' % ' '.join(['acgtacgtac'] * 6))
+                fw.write('//\n')
+            for use_cache in [False, True, True]:
+                database = NCBIDatabase(data_path, use_cache=use_cache)
+                expect = FeatureLookup.from_segments(database.gene_segments)
+                lookup = database.get_feature_lookup()
+                self.assertIs(lookup, database.get_feature_lookup())
+                names = ['synA', 'b2397', 'synB', 'GeneID:944742', 'ASAP:ABE-0007898', 'SYNA', 'synC']
+                self.assertEqual(expect.resolve(names), lookup.resolve(names))
+                self.assertEqual([(0,)] * 6 + [()], [match.indices for match in lookup.resolve(names)])
@@ -0,0 +1,76 @@
+import os
+import random
+import tempfile
+import unittest
+
+from utils.genome_cache import GenomeCache
+from utils.ncbi_database import NCBIDatabase
+
+
+def write_genbank(file_path, dna_code, gene_name):
+    with open(file_path, 'w', encoding='utf8') as fw:
+        fw.write('LOCUS       TEST%26d bp    DNA\n' % len(dna_code))
+        fw.write('SOURCE      synthetic\n')
+        fw.write('FEATURES             Location/Qualifiers\n')
+        fw.write('     gene            complement(10..90)\n')
+        fw.write('                     /gene="%s"\n' % gene_name)
+        fw.write('                     /db_xref="GeneID:944742"\n')
+        fw.write('                     /db_xref="ASAP:ABE-0000006"\n')
+        fw.write('     gene            100..190\n')
+        fw.write('                     /product="a product which\n')
+        fw.write('                     wraps"\n')
+        fw.write('ORIGIN\n')
+        for idx in range(0, len(dna_code), 60):
+            line = dna_code[idx:idx + 60]
+            fw.write('%9d %s\n' % (idx + 1, ' '.join(line[i:i + 10] for i in range(0, len(line), 10))))
+        fw.write('//\n')
+
+
+class TestGenomeCache(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(13)
+        self.dna_code = ''.join(rand.choice('acgtn') for _ in range(500))
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_path = os.path.join(self.directory.name, 'synthetic.txt')
+        write_genbank(self.data_path, self.dna_code, 'synA')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def load_cached(self, **kwargs):
+        """
+        NCBIDatabase which must be loaded from the cache
+        """
+        parse_stream = NCBIDatabase.parse_stream
+        NCBIDatabase.parse_stream = None
+        try:
+            return NCBIDatabase(self.data_path, **kwargs)
+        finally:
+            NCBIDatabase.parse_stream = parse_stream
+
+    def test_load(self):
+        expect = NCBIDatabase(self.data_path, use_cache=False)
+        NCBIDatabase(self.data_path)
+        self.assertTrue(os.path.exists(os.path.join(self.data_path + '.cache', GenomeCache.HeaderName)))
+        database = self.load_cached()
+        self.assertEqual(self.dna_code, database.dna_code.to_str())
+        self.assertEqual(expect.source, database.source)
+        self.assertEqual([segment.to_dict() for segment in expect.gene_segments],
+                         [segment.to_dict() for segment in database.gene_segments])
+        self.assertEqual({'synA': [0], None: [1]}, database.gene_name_segment_map)
+        self.assertEqual({'ASAP': 'ABE-0000006'}, database.gene_segments[0].xref)
+        self.assertEqual(944742, database.gene_segments[0].gene_id)
+        # touched, the same content
+        os.utime(self.data_path, ns=(0, 0))
+        self.load_cached()
+
+    def test_invalidate(self):
+        NCBIDatabase(self.data_path)
+        # the same size, another gene name
+        write_genbank(self.data_path, self.dna_code, 'synB')
+        database = NCBIDatabase(self.data_path)
+        self.assertEqual({'synB': [0], None: [1]}, database.gene_name_segment_map)
+        self.assertEqual({'synB': [0], None: [1]}, self.load_cached().gene_name_segment_map)
+        # another load profile, from the same cache
+        self.assertEqual([], self.load_cached(ignore_gene=True).gene_segments)
+        self.assertEqual({'synB': [0], None: [1]}, self.load_cached().gene_name_segment_map)
@@ -0,0 +1,47 @@
+import os
+import random
+import tempfile
+import unittest
+
+from utils.gene_util import get_opposite_dna
+from utils.genome_sequence import GenomeSequence
+
+
+class TestGenomeSequence(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(3)
+        self.dna_code = ''.join(rand.choice('acgtacgtacgtnry') for _ in range(1001))
+
+    def test_decode(self):
+        genome = GenomeSequence.from_str(self.dna_code)
+        self.assertEqual(len(self.dna_code), len(genome))
+        self.assertEqual(self.dna_code, genome.to_str())
+        self.assertEqual(self.dna_code.encode('ascii'), genome.to_bytes())
+        self.assertEqual(self.dna_code[-1], genome[-1])
+        self.assertEqual(self.dna_code[10:-10], genome[10:-10])
+        self.assertEqual('tgcanryky', get_opposite_dna('acgtnyrmr'))
+
+    def test_reverse_complement(self):
+        genome = GenomeSequence.from_str(self.dna_code)
+        rev_dna_code = get_opposite_dna(self.dna_code[::-1])
+        self.assertEqual(rev_dna_code, genome.reverse_complement().to_str())
+        rand = random.Random(5)
+        for _ in range(100):
+            left = rand.randint(0, len(self.dna_code))
+            right = rand.randint(left, len(self.dna_code))
+            view = genome.view(left, right)
+            self.assertEqual(self.dna_code[left:right], view.to_str())
+            self.assertEqual(get_opposite_dna(self.dna_code[left:right][::-1]), view.reverse_complement().to_str())
+            self.assertEqual(rev_dna_code[left:right], genome.reverse_complement()[left:right])
+            self.assertEqual(self.dna_code[left:right][3:7], view.reverse_complement().reverse_complement()[3:7])
+        self.assertEqual(self.dna_code[:5], genome.view(-5, 5).to_str())
+
+    def test_save_and_load(self):
+        genome = GenomeSequence.from_str(self.dna_code)
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'genome.npy')
+            genome.save(file_path)
+            loaded = GenomeSequence.load(file_path)
+            self.assertEqual(self.dna_code, loaded.to_str())
+            self.assertEqual(genome.reverse_complement().to_str(), loaded.reverse_complement().to_str())
+            del loaded
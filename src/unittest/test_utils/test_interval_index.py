@@ -0,0 +1,55 @@
+import random
+import unittest
+
+from utils.interval_index import IntervalIndex
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(7)
+        self.intervals = []
+        for _ in range(300):
+            start = rand.randint(1, 5000)
+            self.intervals.append((start, start + rand.choice([0, 10, 50, 200, 3000])))
+        self.index = IntervalIndex([start for start, _ in self.intervals], [end for _, end in self.intervals])
+        self.queries = [(left, left + rand.randint(0, 300)) for left in [rand.randint(-100, 8500) for _ in range(200)]]
+
+    def select(self, condition):
+        return [idx for idx, (start, end) in enumerate(self.intervals) if condition(start, end)]
+
+    def nearest(self, condition, key, k):
+        return sorted(self.select(condition), key=lambda idx: (key(*self.intervals[idx]), idx))[:k]
+
+    def test_ranges(self):
+        lefts, rights = [left for left, _ in self.queries], [right for _, right in self.queries]
+        for batch, single, condition in [
+            (self.index.overlap_batch, self.index.overlap, lambda s, e, l, r: s <= r and e >= l),
+            (self.index.containing_batch, self.index.containing, lambda s, e, l, r: s <= l and e >= r),
+            (self.index.contained_batch, self.index.contained, lambda s, e, l, r: s >= l and e <= r)
+        ]:
+            results = batch(lefts, rights)
+            for (left, right), result in zip(self.queries, results):
+                expect = self.select(lambda s, e: condition(s, e, left, right))
+                self.assertEqual(expect, result.tolist())
+                self.assertEqual(expect, single(left, right).tolist())
+
+    def test_nearest(self):
+        positions = [left for left, _ in self.queries] + [start for start, _ in self.intervals[:50]]
+        for inclusive in [False, True]:
+            ups = self.index.upstream_batch(positions, 3, inclusive).tolist()
+            downs = self.index.downstream_batch(positions, 3, inclusive).tolist()
+            for position, up, down in zip(positions, ups, downs):
+                expect = self.nearest(lambda s, e: e < position or inclusive and e == position, lambda s, e: -e, 3)
+                self.assertEqual(expect, [idx for idx in up if idx >= 0])
+                self.assertEqual(expect, self.index.upstream(position, 3, inclusive).tolist())
+                expect = self.nearest(lambda s, e: s > position or inclusive and s == position, lambda s, e: s, 3)
+                self.assertEqual(expect, [idx for idx in down if idx >= 0])
+                self.assertEqual(expect, self.index.downstream(position, 3, inclusive).tolist())
+
+    def test_empty(self):
+        index = IntervalIndex([], [])
+        self.assertEqual([[]], [result.tolist() for result in index.overlap_batch([1], [5])])
+        self.assertEqual([[-1, -1]], index.upstream_batch([3], 2).tolist())
+        self.assertEqual([], index.downstream(3).tolist())
+        self.assertEqual((0, 1), self.index.upstream_batch([]).shape)
+        self.assertEqual([], self.index.overlap_batch([], []))
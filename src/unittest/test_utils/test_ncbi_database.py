@@ -0,0 +1,176 @@
+import os
+import random
+import tempfile
+import unittest
+
+from utils.gene_util import get_opposite_dna
+from utils.ncbi_database import LoadProfile, NCBIDatabase, RawQualifiers
+
+
+class TestNCBIDatabase(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(11)
+        self.dna_code = ''.join(rand.choice('acgt') for _ in range(700))
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_path = os.path.join(self.directory.name, 'synthetic.txt')
+        with open(self.data_path, 'w', encoding='utf8') as fw:
+            fw.write('LOCUS       TEST%26d bp    DNA\n' % len(self.dna_code))
+            fw.write('FEATURES             Location/Qualifiers\n')
+            fw.write('     gene            complement(10..90)\n')
+            fw.write('                     /gene="synA"\n')
+            fw.write('ORIGIN\n')
+            for idx in range(0, len(self.dna_code), 60):
+                line = self.dna_code[idx:idx + 60]
+                fw.write('%9d %s\n' % (idx + 1, ' '.join(line[i:i + 10] for i in range(0, len(line), 10))))
+            fw.write('//\n')
+        with open(self.data_path, 'r', encoding='utf8') as fr:
+            self.lines = fr.read().split('\n')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_sequences(self):
+        database = NCBIDatabase(self.data_path)
+        self.assertEqual(self.dna_code, database.dna_code[:])
+        ranges = [(10, 90, False), (10, 90, True), (1, 700, True), (650, 700, False), (5, 4, False)]
+        expect = [self.dna_code[9:90], get_opposite_dna(self.dna_code[9:90][::-1]),
+                  get_opposite_dna(self.dna_code[::-1]), self.dna_code[649:], '']
+        self.assertEqual(expect, database.get_sequences(ranges))
+        written = []
+        self.assertIsNone(database.get_sequences(ranges, lambda idx, sequence: written.append((idx, sequence)),
+                                                 batch_bases=100))
+        self.assertEqual(list(enumerate(expect)), written)
+        self.assertEqual([], database.get_sequences([]))
+
+    def test_get_sequences_by_bases(self):
+        database = NCBIDatabase(self.data_path)
+        ranges = [(left, left + 299, left % 2, 40, 10) for left in range(1, 400, 7)] + [(1, 700, 1, 0, 0)]
+        expect = database.get_sequences(ranges)
+        batches = []
+        get_sequences = database.genome.get_sequences
+        database.genome.get_sequences = lambda starts, ends, is_reverse: \
+            batches.append(int((ends - starts).sum())) or get_sequences(starts, ends, is_reverse)
+        written = []
+        database.get_sequences(ranges, lambda idx, result: written.append((idx, result)), batch_bases=1000)
+        self.assertEqual(list(enumerate(expect)), written)
+        # 2 ranges of 350 bases with the flanks in a batch, the range longer than batch_bases alone
+        self.assertEqual(len(ranges) // 2 + 1, len(batches))
+        self.assertTrue(all(bases <= 1000 for bases in batches[:-1]))
+        self.assertEqual(700, batches[-1])
+
+    def test_get_sequences_with_flanks(self):
+        database = NCBIDatabase(self.data_path)
+        forward, reverse = database.get_sequences([(10, 90, False, 20, 5), (10, 90, True, 20, 5)])
+        self.assertEqual((self.dna_code[9:90], self.dna_code[:9], self.dna_code[90:95]), forward)
+        # upstream of the reverse strand is after right
+        self.assertEqual(tuple(get_opposite_dna(sequence[::-1]) for sequence in [
+            self.dna_code[9:90], self.dna_code[90:110], self.dna_code[4:9]]), reverse)
+        clipped, = database.get_sequences([(680, 700, True, 50, 50)])
+        self.assertEqual(('', get_opposite_dna(self.dna_code[629:679][::-1])), clipped[1:])
+
+    def write_features(self, newline='\n'):
+        features = [
+            '     gene            10..90',
+            '                     /gene="synB"',
+            '                     /gene_synonym="ECK0001; synC"',
+            '                     /db_xref="GeneID:944742"',
+            '     CDS             10..90',
+            '                     /gene="synB"',
+            '                     /product="a product which',
+            '                     wraps"',
+            '                     /pseudo',
+            '                     /db_xref="UniProtKB/Swiss-Prot:P0AD86"',
+            '                     /translation="MKRISTTITTTITITTGNGAG',
+            '                     ALKHG"',
+            '     gene            join(100..200,300..400)',
+            '                     /gene="synD"',
+            '     repeat_region   complement(<500..>600)',
+            '                     /rpt_family="RIP"',
+            '     gene            610..650',
+            '                     /db_xref="EcoGene:EG1:x"'
+        ]
+        lines = list(self.lines)
+        lines[4:4] = features
+        with open(self.data_path, 'w', encoding='utf8', newline='') as fw:
+            fw.write(newline.join(lines))
+
+    def test_stream_parse(self):
+        for newline in ['\n', '\r\n']:
+            self.write_features(newline)
+            databases = [NCBIDatabase(self.data_path, stream_parse=stream_parse, use_cache=False)
+                         for stream_parse in [False, True]]
+            self.assertEqual(*[[segment.to_dict() for segment in database.gene_segments] for database in databases])
+            self.assertEqual(*[database.dna_code.to_str() for database in databases])
+            self.assertEqual(*[database.gene_name_segment_map for database in databases])
+            self.assertEqual(self.dna_code, databases[1].dna_code.to_str())
+            self.assertEqual(['synA', 'synB', None], [segment.gene for segment in databases[1].gene_segments])
+            self.assertEqual('a product which wraps', databases[1].gene_segments[1].product)
+
+    def test_load_profile(self):
+        self.write_features()
+        expect = NCBIDatabase(self.data_path, stream_parse=False, use_cache=False)
+        coordinates = [(segment.cds, segment.left, segment.right) for segment in expect.gene_segments]
+        # without the cache, then written and loaded from it
+        for use_cache in [False, True, True]:
+            for stream_parse in [False, True]:
+                full = NCBIDatabase(self.data_path, stream_parse=stream_parse, use_cache=use_cache)
+                self.assertEqual([segment.to_dict() for segment in expect.gene_segments],
+                                 [segment.to_dict() for segment in full.gene_segments])
+                self.assertEqual(expect.gene_name_segment_map, full.gene_name_segment_map)
+                self.assertEqual(self.dna_code, full.dna_code.to_str())
+
+                sequence = NCBIDatabase(self.data_path, stream_parse=stream_parse, use_cache=use_cache,
+                                        load_profile=LoadProfile.Sequence)
+                self.assertEqual(([], {}), (sequence.gene_segments, sequence.gene_name_segment_map))
+                self.assertEqual(self.dna_code, sequence.dna_code.to_str())
+                self.assertEqual(expect.source, sequence.source)
+
+                located = NCBIDatabase(self.data_path, stream_parse=stream_parse, use_cache=use_cache,
+                                       load_profile=LoadProfile.Coordinates)
+                self.assertIsNone(located.genome)
+                self.assertEqual({}, located.gene_name_segment_map)
+                self.assertEqual(coordinates, [(segment.cds, segment.left, segment.right)
+                                               for segment in located.gene_segments])
+                self.assertEqual([None] * len(coordinates), [segment.product for segment in located.gene_segments])
+
+                annotated = NCBIDatabase(self.data_path, stream_parse=stream_parse, use_cache=use_cache,
+                                         load_profile=LoadProfile.GeneProduct)
+                self.assertEqual(self.dna_code, annotated.dna_code.to_str())
+                self.assertEqual({}, annotated.gene_name_segment_map)
+                self.assertEqual([str(segment) for segment in expect.gene_segments],
+                                 [str(segment) for segment in annotated.gene_segments])
+                self.assertEqual([(segment.gene, None, None) for segment in expect.gene_segments],
+                                 [(segment.gene, segment.locus_tag, segment.translation)
+                                  for segment in annotated.gene_segments])
+
+    def test_lazy_qualifiers(self):
+        self.write_features()
+        decoded = []
+        get = RawQualifiers.get
+        try:
+            RawQualifiers.get = lambda qualifiers, name: decoded.append(name) or get(qualifiers, name)
+            database = NCBIDatabase(self.data_path, use_cache=False)
+            # only the gene of the name index is decoded by the parse
+            self.assertEqual({'gene'}, set(decoded))
+            self.assertEqual('MKRISTTITTTITITTGNGAG ALKHG', database.gene_segments[1].translation)
+        finally:
+            RawQualifiers.get = get
+
+    def test_feature_segments(self):
+        self.write_features()
+        expect = NCBIDatabase(self.data_path, use_cache=False)
+        for database in [NCBIDatabase(self.data_path), NCBIDatabase(self.data_path)]:
+            segments = database.gene_segments
+            self.assertEqual(len(expect.gene_segments), len(segments))
+            self.assertEqual([-1, 1, -1], [segment.strand for segment in segments])
+            self.assertEqual([[10, 90], [10, 90], [500, 600]], [segment.cds for segment in segments])
+            self.assertEqual({'UniProtKB/Swiss-Prot': 'P0AD86'}, segments[1].xref)
+            self.assertEqual(944742, segments[1].gene_id)
+            self.assertEqual('ECK0001; synC', segments[1].gene_synonym)
+            self.assertEqual('MKRISTTITTTITITTGNGAG ALKHG', segments[1].translation)
+            self.assertEqual([str(segment) for segment in expect.gene_segments], [str(segment) for segment in segments])
+            self.assertEqual(segments[-1], segments[2])
+            self.assertEqual(1, len({segments[1], segments[1]}))
+            self.assertEqual(segments[1:3], list(segments)[1:3])
+            with self.assertRaises(AttributeError):
+                segments[0].__dict__
@@ -1,5 +1,7 @@
 import datetime
+import threading
 import time
+from typing import Callable, Union
 
 
 class LoggerFactory:
@@ -9,7 +11,10 @@ class LoggerFactory:
         self.start_time = 0
         self.last_time = None
 
-    def info_with_expire_time(self, msg, solve, total):
+    def info_with_expire_time(self, msg: Union[str, Callable[[], str]], solve, total):
+        """
+        :param msg: str, or function building it, which is called only when the line is printed
+        """
         if solve == 0 or self.start_time == 0:
             self.last_time = None
             self.start_time = time.time()
@@ -19,6 +24,8 @@ class LoggerFactory:
                 remain = (time.time() - self.start_time) / solve * (total - solve)
                 if remain < 0:
                     remain = 0
+            if callable(msg):
+                msg = msg()
             if remain is None:
                 print(self.get_time() + ": " + msg)
             else:
@@ -41,3 +48,33 @@ class LoggerFactory:
     @staticmethod
     def get_time():
         return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ProgressMeter:
+    """
+    One progress counter shared by many threads, or fed with the aggregated counts of worker processes. add is
+    cheap: the clock is read only once per stride of count, and the message is built only when a line is printed,
+    with a single ETA of the total.
+    """
+
+    def __init__(self, total, build_msg: Callable[[int, int], str], stride=1, time_distance=5):
+        """
+        :param build_msg: build the message from solved and total
+        """
+        self.total = total
+        self.build_msg = build_msg
+        self.stride = max(stride, 1)
+        self.logger = LoggerFactory(time_distance)
+        self.lock = threading.Lock()
+        self.solved = 0
+        self.next_sample = 0
+        self.logger.info_with_expire_time(lambda: build_msg(0, total), 0, total)
+
+    def add(self, count=1):
+        with self.lock:
+            self.solved += count
+            if self.solved < self.next_sample:
+                return
+            self.next_sample = self.solved + self.stride
+            solved = self.solved
+            self.logger.info_with_expire_time(lambda: self.build_msg(solved, self.total), solved, self.total)
@@ -0,0 +1,111 @@
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+
+class LookupKey(Enum):
+    # in the order a name is resolved by
+    Gene = 'gene'
+    LocusTag = 'locus_tag'
+    GeneSynonym = 'gene_synonym'
+    GeneId = 'gene_id'
+    Xref = 'xref'
+
+
+@dataclass(frozen=True)
+class FeatureMatch:
+    # gene segment indices, ascending, empty if the name is not found
+    indices: Tuple[int, ...] = ()
+    # key the name is found by, None if not found
+    key: Optional[LookupKey] = None
+    # found only by the lower case name
+    folded: bool = False
+
+
+class FeatureLookup:
+    """
+    Hash indexes from the names of the gene segments to their indices, one of every LookupKey: gene, locus_tag,
+    every token of gene_synonym (separated by ;), gene_id as 944742 and GeneID:944742, and every db_xref as its
+    value and as key:value. All of them are built in one pass over the segments, and merged into one exact index and
+    one of lower case names, where a name is kept by the first key of LookupKey it is found by. The indices are
+    tuples, so the matches resolved are shared by every call without copying them.
+    """
+
+    def __init__(self, genes: Sequence[Optional[str]], locus_tags: Sequence[Optional[str]],
+                 gene_synonyms: Sequence[Optional[str]], gene_ids: Sequence[Optional[int]],
+                 xrefs: Sequence[Mapping[str, str]]):
+        """
+        every argument is the attribute of each gene segment
+        """
+        self.indexes = {key: {} for key in LookupKey}
+        for idx, (gene, locus_tag, gene_synonym, gene_id, xref) in enumerate(
+                zip(genes, locus_tags, gene_synonyms, gene_ids, xrefs)):
+            self.add(LookupKey.Gene, [gene], idx)
+            self.add(LookupKey.LocusTag, [locus_tag], idx)
+            if gene_synonym is not None:
+                self.add(LookupKey.GeneSynonym, gene_synonym.split(';'), idx)
+            if gene_id is not None:
+                self.add(LookupKey.GeneId, [str(gene_id), 'GeneID:%d' % gene_id], idx)
+            for key, value in xref.items():
+                self.add(LookupKey.Xref, [value, '%s:%s' % (key, value)], idx)
+        self.indexes = {key: {name: tuple(indices) for name, indices in index.items()}
+                        for key, index in self.indexes.items()}
+        self.folded_indexes = {key: self.fold(index) for key, index in self.indexes.items()}
+        self.exact = self.merge(self.indexes, False)
+        self.folded = self.merge(self.folded_indexes, True)
+
+    @classmethod
+    def from_segments(cls, segments: Sequence):
+        return cls([segment.gene for segment in segments], [segment.locus_tag for segment in segments],
+                   [segment.gene_synonym for segment in segments], [segment.gene_id for segment in segments],
+                   [segment.xref for segment in segments])
+
+    def add(self, key: LookupKey, names: Iterable[Optional[str]], idx: int):
+        index = self.indexes[key]
+        for name in names:
+            if name is None:
+                continue
+            name = name.strip()
+            if name == '':
+                continue
+            indices = index.setdefault(name, [])
+            if not indices or indices[-1] != idx:
+                indices.append(idx)
+
+    @staticmethod
+    def fold(index: Dict[str, Tuple[int, ...]]) -> Dict[str, Tuple[int, ...]]:
+        folded = {}
+        for name, indices in index.items():
+            folded.setdefault(name.lower(), set()).update(indices)
+        return {name: tuple(sorted(indices)) for name, indices in folded.items()}
+
+    @staticmethod
+    def merge(indexes: Dict[LookupKey, Dict[str, Tuple[int, ...]]], folded: bool) -> Dict[str, FeatureMatch]:
+        merged = {}
+        for key in LookupKey:
+            for name, indices in indexes[key].items():
+                if name not in merged:
+                    merged[name] = FeatureMatch(indices, key, folded)
+        return merged
+
+    def resolve(self, names: Iterable[str], key: Optional[LookupKey] = None) -> List[FeatureMatch]:
+        """
+        :param key: only look names up by it, by every key if None
+        :return: match of each name, by its exact value first, then by its lower case
+        """
+        if key is None:
+            exact, folded = self.exact, self.folded
+            return [exact.get(name) or folded.get(name.lower()) or FeatureMatch() for name in names]
+        exact, folded = self.indexes[key], self.folded_indexes[key]
+        result = []
+        for name in names:
+            if name in exact:
+                result.append(FeatureMatch(exact[name], key))
+            elif name.lower() in folded:
+                result.append(FeatureMatch(folded[name.lower()], key, True))
+            else:
+                result.append(FeatureMatch())
+        return result
+
+    def resolve_one(self, name: str, key: Optional[LookupKey] = None) -> FeatureMatch:
+        return self.resolve([name], key)[0]
@@ -0,0 +1,238 @@
+import operator
+from collections.abc import Sequence as SequenceBase
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+
+def encode_strings(values: Sequence[Union[str, bytes, None]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    :param values: str, or their utf8 bytes
+    :return: utf8 bytes of all values joined, offset of each value in them (one more than values), mask of None
+    """
+    encoded = [b'' if value is None else value if isinstance(value, bytes) else value.encode('utf8')
+               for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return (np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets,
+            np.array([value is None for value in values], dtype=bool))
+
+
+def decode_strings(data: np.ndarray, offsets: np.ndarray, missing: np.ndarray) -> List[Optional[str]]:
+    data = data.tobytes()
+    return [None if is_missing else data[left:right].decode('utf8')
+            for left, right, is_missing in zip(offsets[:-1].tolist(), offsets[1:].tolist(), missing.tolist())]
+
+
+def split_by_offsets(values: list, offsets: np.ndarray) -> List[list]:
+    return [values[left:right] for left, right in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+class FeatureTable:
+    """
+    Gene segments of a GenBank file as columns, which are kept in memory in place of the segment objects and saved in
+    one .npz without pickle: start and end of cds as int32 and the strand as int8 (1, -1 for complement, 0 unknown),
+    gene_id as int64 with a mask of None, the interned str attributes as int32 codes (-1 for None) into a table of
+    their distinct values, every other str attribute in one qualifier blob of utf8 bytes with the offsets of each
+    (segment, attribute), db_xref as ragged pairs of interned keys and values, and the name index as names with ragged
+    segment indices. A table loaded with only some columns gives None for the others, see FeatureSegments.
+    """
+    Version = 2
+    StringParts = ['data', 'offsets', 'missing']
+    CoordinateColumns = ['start', 'end', 'strand']
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+        self.string_fields = decode_strings(*[columns['string_fields_' + part] for part in self.StringParts])
+        self.interned_fields = decode_strings(*[columns['interned_fields_' + part] for part in self.StringParts])
+        self.blob_fields = {field: idx for idx, field in enumerate(
+            field for field in self.string_fields if field not in self.interned_fields)}
+        # distinct values of every interned column, decoded at the first access
+        self.interned_values = {}
+
+    def __len__(self):
+        return len(self.columns['start'])
+
+    @classmethod
+    def from_segments(cls, segments: Sequence, string_fields: List[str], name_index: Dict[Optional[str], List[int]],
+                      interned_fields: Sequence[str] = (), get_value: Callable = getattr):
+        """
+        :param segments: objects with cds, strand, gene_id, xref and every one of string_fields
+        :param name_index: segment indices of every gene name
+        :param interned_fields: the ones of string_fields with few distinct values
+        :param get_value: (segment, field) -> str field of the segment, as str or as its utf8 bytes, the same kind for
+        every segment
+        """
+        columns = {'version': np.int64(cls.Version)}
+
+        def add_strings(name, values):
+            for part, value in zip(cls.StringParts, encode_strings(values)):
+                columns['%s_%s' % (name, part)] = value
+
+        def add_interned(name, values):
+            codes = {}
+            columns[name + '_codes'] = np.array([-1 if value is None else codes.setdefault(value, len(codes))
+                                                 for value in values], dtype=np.int32)
+            add_strings(name + '_values', list(codes))
+
+        def add_ragged(name, groups):
+            columns[name + '_offsets'] = np.concatenate([[0], np.cumsum([len(group) for group in groups])]).astype(
+                np.int64)
+            return [value for group in groups for value in group]
+
+        add_strings('string_fields', string_fields)
+        add_strings('interned_fields', list(interned_fields))
+        columns['start'] = np.array([segment.cds[0] for segment in segments], dtype=np.int32)
+        columns['end'] = np.array([segment.cds[1] for segment in segments], dtype=np.int32)
+        columns['strand'] = np.array([segment.strand or 0 for segment in segments], dtype=np.int8)
+        gene_ids = [segment.gene_id for segment in segments]
+        columns['gene_id_missing'] = np.array([gene_id is None for gene_id in gene_ids], dtype=bool)
+        columns['gene_id'] = np.array([0 if gene_id is None else gene_id for gene_id in gene_ids], dtype=np.int64)
+        for field in interned_fields:
+            add_interned(field, [get_value(segment, field) for segment in segments])
+        add_strings('qualifiers', [get_value(segment, field) for segment in segments for field in string_fields
+                                   if field not in interned_fields])
+        xrefs = add_ragged('xref', [list(segment.xref.items()) for segment in segments])
+        add_interned('xref_keys', [key for key, _ in xrefs])
+        add_strings('xref_values', [value for _, value in xrefs])
+        add_strings('names', list(name_index))
+        columns['name_segments_values'] = np.array(add_ragged('name_segments', list(name_index.values())),
+                                                   dtype=np.int64)
+        return cls(columns)
+
+    @classmethod
+    def get_interned_columns(cls, fields: List[str]) -> List[str]:
+        """
+        :return: columns of the interned str fields
+        """
+        return [column for field in fields
+                for column in [field + '_codes'] + ['%s_values_%s' % (field, part) for part in cls.StringParts]]
+
+    def select(self, names: List[str]):
+        """
+        :return: table of only the columns in names
+        """
+        return FeatureTable({name: column for name, column in self.columns.items()
+                             if name in names or name.startswith(('string_fields_', 'interned_fields_'))})
+
+    def get_strings(self, name) -> List[Optional[str]]:
+        return decode_strings(*[self.columns['%s_%s' % (name, part)] for part in self.StringParts])
+
+    def get_interned(self, name, idx) -> Optional[str]:
+        codes = self.columns.get(name + '_codes')
+        if codes is None or codes[idx] < 0:
+            return None
+        values = self.interned_values.get(name)
+        if values is None:
+            values = self.interned_values[name] = self.get_strings(name + '_values')
+        return values[codes[idx]]
+
+    def get_blob_string(self, column, idx) -> Optional[str]:
+        data = self.columns.get(column + '_data')
+        if data is None or self.columns[column + '_missing'][idx]:
+            return None
+        offsets = self.columns[column + '_offsets']
+        return data[offsets[idx]:offsets[idx + 1]].tobytes().decode('utf8')
+
+    def get_string(self, field, idx) -> Optional[str]:
+        """
+        :return: str attribute field of segment idx
+        """
+        if field in self.interned_fields:
+            return self.get_interned(field, idx)
+        return self.get_blob_string('qualifiers', idx * len(self.blob_fields) + self.blob_fields[field])
+
+    def get_cds(self, idx) -> List[int]:
+        return [int(self.columns['start'][idx]), int(self.columns['end'][idx])]
+
+    def get_strand(self, idx) -> Optional[int]:
+        return int(self.columns['strand'][idx]) or None
+
+    def get_gene_id(self, idx) -> Optional[int]:
+        if 'gene_id' not in self.columns or self.columns['gene_id_missing'][idx]:
+            return None
+        return int(self.columns['gene_id'][idx])
+
+    def get_xref(self, idx) -> Dict[str, str]:
+        if 'xref_offsets' not in self.columns:
+            return {}
+        offsets = self.columns['xref_offsets']
+        return {self.get_interned('xref_keys', pos): self.get_blob_string('xref_values', pos)
+                for pos in range(offsets[idx], offsets[idx + 1])}
+
+    def get_column(self, field) -> List[Optional[str]]:
+        """
+        :return: str attribute field of every segment, all None if it is not loaded
+        """
+        if field in self.interned_fields:
+            codes = self.columns.get(field + '_codes')
+            if codes is None:
+                return [None] * len(self)
+            values = self.get_strings(field + '_values') + [None]
+            return [values[code] for code in codes.tolist()]
+        if 'qualifiers_data' not in self.columns:
+            return [None] * len(self)
+        # the value of segment idx is at idx * step + pos of the blob
+        offsets, step, pos = self.columns['qualifiers_offsets'], len(self.blob_fields), self.blob_fields[field]
+        data = self.columns['qualifiers_data'].tobytes()
+        return [None if is_missing else data[left:right].decode('utf8') for left, right, is_missing in zip(
+            offsets[pos:-1:step].tolist(), offsets[pos + 1::step].tolist(),
+            self.columns['qualifiers_missing'][pos::step].tolist())]
+
+    def get_gene_ids(self) -> List[Optional[int]]:
+        if 'gene_id' not in self.columns:
+            return [None] * len(self)
+        return [None if missing else gene_id for gene_id, missing in
+                zip(self.columns['gene_id'].tolist(), self.columns['gene_id_missing'].tolist())]
+
+    def get_xrefs(self) -> List[Dict[str, str]]:
+        if 'xref_offsets' not in self.columns:
+            return [{} for _ in range(len(self))]
+        keys = self.get_strings('xref_keys_values')
+        pairs = [(keys[code], value) for code, value in zip(self.columns['xref_keys_codes'].tolist(),
+                                                            self.get_strings('xref_values'))]
+        return [dict(group) for group in split_by_offsets(pairs, self.columns['xref_offsets'])]
+
+    def get_name_index(self) -> Dict[Optional[str], List[int]]:
+        return dict(zip(self.get_strings('names'), split_by_offsets(self.columns['name_segments_values'].tolist(),
+                                                                   self.columns['name_segments_offsets'])))
+
+    def save(self, file_path: str):
+        with open(file_path, 'wb') as fw:
+            np.savez(fw, **self.columns)
+
+    @classmethod
+    def load(cls, file_path: str, names: Optional[List[str]] = None):
+        """
+        :param names: columns to read, all of them if None, the lists of fields are always read
+        """
+        with np.load(file_path, allow_pickle=False) as data:
+            if int(data['version']) != cls.Version:
+                raise ValueError('feature table version %d is not supported' % int(data['version']))
+            if names is not None:
+                names = set(names) | {'%s_%s' % (name, part) for name in ['string_fields', 'interned_fields']
+                                      for part in cls.StringParts}
+            return cls({name: data[name] for name in data.files if names is None or name in names})
+
+
+class FeatureSegments(SequenceBase):
+    """
+    gene segments of a FeatureTable as a read only sequence, each item is a view_type(table, idx) made at its access
+    """
+
+    def __init__(self, table: FeatureTable, view_type):
+        self.table = table
+        self.view_type = view_type
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.view_type(self.table, pos) for pos in range(*idx.indices(len(self)))]
+        idx = operator.index(idx)
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        return self.view_type(self.table, idx)
@@ -1,7 +1,10 @@
-from typing import List
+from typing import List, Optional
+
+from utils.interval_index import IntervalIndex
 
 
 class GeneSegment:
+    __slots__ = ()
     gene: str  # name
     left: int
     right: int
@@ -9,6 +12,7 @@ class GeneSegment:
 
 class GeneDatabase:
     gene_segments: List[GeneSegment]
+    interval_index: Optional[IntervalIndex] = None
 
     def find_first_greater_equal(self, pos):
         start, end = 0, len(self.gene_segments) - 1
@@ -23,5 +27,14 @@ class GeneDatabase:
         else:
             return end + 1
 
+    def get_interval_index(self) -> IntervalIndex:
+        """
+        index of [left, right] of every gene segment, built at the first call
+        """
+        if self.interval_index is None:
+            self.interval_index = IntervalIndex([segment.left for segment in self.gene_segments],
+                                                [segment.right for segment in self.gene_segments])
+        return self.interval_index
+
     def get_sequence(self, segment_id=None, left=None, right=None):
         raise NotImplementedError()
@@ -1,8 +1,12 @@
+import numpy as np
+
+# complement of bases and IUPAC codes in both cases, other characters are kept as is
+ComplementTable = bytes.maketrans(b'acgturykmbvdhACGTURYKMBVDH', b'tgcaayrmkvbhdTGCAAYRMKVBHD')
+
+
 def get_opposite_dna(dna):
-    op_dna = ''
-    for x in dna:
-        if x == 'a': op_dna += 't'
-        if x == 't': op_dna += 'a'
-        if x == 'c': op_dna += 'g'
-        if x == 'g': op_dna += 'c'
-    return op_dna
+    return dna.translate(ComplementTable)
+
+
+def encode_dna(dna: str) -> np.ndarray:
+    return np.frombuffer(dna.encode('ascii'), dtype=np.uint8)
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import List, Optional
+
+from utils.factories.logger_factory import LoggerFactory
+from utils.feature_table import FeatureTable
+from utils.genome_sequence import GenomeSequence
+
+
+def get_file_hash(file_path: str) -> str:
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as fr:
+        for block in iter(lambda: fr.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class GenomeCache:
+    """
+    Parsed GenBank file kept in a sidecar directory next to it (<file>.cache): the packed genome, which is memory
+    mapped when loaded, the feature table with the name index, and header.json. The header is written last and names
+    the version, the parse options, and the size, mtime and sha1 of the file. The cache is valid when the size is the
+    same, and either the mtime or the sha1, so the file is only hashed again after it is touched. A file modified
+    within RacyNanoseconds before it was hashed may be modified again with the same mtime, so its sha1 is always
+    checked.
+    """
+    Version = 1
+    RacyNanoseconds = 2 * 10 ** 9
+    GenomeName = 'genome.npy'
+    FeatureName = 'features.npz'
+    HeaderName = 'header.json'
+
+    def __init__(self, file_path: str, options: dict):
+        """
+        :param options: parse options the result depends on
+        """
+        self.file_path = file_path
+        self.options = options
+        self.directory = file_path + '.cache'
+
+    def get_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self, with_genome=True, feature_columns: Optional[List[str]] = None) -> Optional[tuple]:
+        """
+        :param with_genome: if not, the genome is not read and None
+        :param feature_columns: columns of the feature table to read, all of them if None, no feature table if empty
+        :return: (genome, source, feature table), None if the cache is missing or not valid
+        """
+        header_path = self.get_path(self.HeaderName)
+        if not os.path.exists(header_path):
+            return None
+        try:
+            with open(header_path, 'r', encoding='utf8') as fr:
+                header = json.load(fr)
+            stat = os.stat(self.file_path)
+            if header.get('version') != self.Version or header.get('options') != self.options or \
+                    header.get('size') != stat.st_size:
+                return None
+            trusted = header.get('mtime_ns') == stat.st_mtime_ns and \
+                stat.st_mtime_ns < header.get('hashed_ns', 0) - self.RacyNanoseconds
+            if not trusted:
+                hashed_ns = time.time_ns()
+                if header.get('sha1') != get_file_hash(self.file_path):
+                    return None
+                # the same content, which is not hashed again until it is touched
+                header.update(mtime_ns=stat.st_mtime_ns, hashed_ns=hashed_ns)
+                try:
+                    self.write_header(header)
+                except OSError:
+                    pass
+            genome = GenomeSequence.load(self.get_path(self.GenomeName)) if with_genome else None
+            feature_table = FeatureTable.load(self.get_path(self.FeatureName), feature_columns) \
+                if feature_columns is None or feature_columns else None
+            return genome, header['source'], feature_table
+        except (OSError, ValueError, KeyError) as e:
+            LoggerFactory.info('Ignore broken cache of %s: %s' % (self.file_path, e))
+            return None
+
+    def save(self, genome: GenomeSequence, source: Optional[str], feature_table: FeatureTable):
+        """
+        every file is written aside and renamed, so a genome memory mapped by another run is never overwritten
+        """
+        try:
+            stat = os.stat(self.file_path)
+            header = {
+                'version': self.Version,
+                'options': self.options,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'hashed_ns': time.time_ns(),
+                'sha1': get_file_hash(self.file_path),
+                'source': source
+            }
+            header_path = self.get_path(self.HeaderName)
+            if os.path.exists(header_path):
+                os.remove(header_path)
+            os.makedirs(self.directory, exist_ok=True)
+            genome_path = self.get_path(self.GenomeName)
+            genome.save(genome_path + '.tmp')
+            os.replace(genome_path + '.tmp.meta.npz', genome_path + '.meta.npz')
+            os.replace(genome_path + '.tmp', genome_path)
+            feature_path = self.get_path(self.FeatureName)
+            feature_table.save(feature_path + '.tmp')
+            os.replace(feature_path + '.tmp', feature_path)
+            self.write_header(header)
+        except OSError as e:
+            LoggerFactory.info('Failed to cache %s: %s' % (self.file_path, e))
+
+    def write_header(self, header: dict):
+        header_path = self.get_path(self.HeaderName)
+        with open(header_path + '.tmp', 'w', encoding='utf8') as fw:
+            json.dump(header, fw)
+        os.replace(header_path + '.tmp', header_path)
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,146 @@
+from typing import List, Optional, Union
+
+import numpy as np
+
+from utils.gene_util import ComplementTable
+
+# 2-bit code of each base, any other character is kept in the exception list
+PackedBases = b'acgt'
+BaseCode = np.full(256, 255, dtype=np.uint8)
+BaseCode[np.frombuffer(PackedBases, dtype=np.uint8)] = np.arange(len(PackedBases), dtype=np.uint8)
+Complement = np.frombuffer(bytes(range(256)).translate(ComplementTable), dtype=np.uint8)
+Shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+
+
+class GenomeSequence:
+    """
+    Genome packed in 2 bits per base, characters other than a/c/g/t (N, IUPAC codes, upper case) are kept in a sorted
+    exception list, so coordinates never shift. A GenomeSequence is a view of [start, end) of the forward strand, or
+    of its reverse complement, slicing and reverse_complement share the packed arrays without copying, and decoding
+    a view to str, bytes or encoded array is one vectorized call.
+    """
+
+    def __init__(self, packed: np.ndarray, length: int, exception_positions: np.ndarray,
+                 exception_codes: np.ndarray, start: int = 0, end: int = None, is_reverse: bool = False):
+        self.packed = packed
+        self.length = length
+        self.exception_positions = exception_positions
+        self.exception_codes = exception_codes
+        self.start = start
+        self.end = length if end is None else end
+        self.is_reverse = is_reverse
+
+    @classmethod
+    def from_str(cls, dna: str):
+        return cls.from_array(np.frombuffer(dna.encode('ascii'), dtype=np.uint8))
+
+    @classmethod
+    def from_array(cls, dna: np.ndarray):
+        """
+        :param dna: encoded genome, see utils.gene_util.encode_dna
+        """
+        codes = BaseCode[dna]
+        exception_positions = np.flatnonzero(codes == 255)
+        exception_codes = dna[exception_positions].copy()
+        codes[exception_positions] = 0
+        codes = np.concatenate([codes, np.zeros(-len(codes) % 4, dtype=np.uint8)]).reshape(-1, 4)
+        packed = np.bitwise_or.reduce(codes << Shifts, axis=1).astype(np.uint8) if len(codes) > 0 else \
+            np.zeros(0, dtype=np.uint8)
+        return cls(packed, len(dna), exception_positions, exception_codes)
+
+    def save(self, file_path: str):
+        """
+        write the whole forward strand to file_path (.npy of packed bases, which can be memory mapped) and
+        file_path.meta.npz (length and exception list)
+        """
+        with open(file_path, 'wb') as fw:
+            np.save(fw, self.packed)
+        with open(file_path + '.meta.npz', 'wb') as fw:
+            np.savez(fw, length=np.int64(self.length), exception_positions=self.exception_positions,
+                     exception_codes=self.exception_codes)
+
+    @classmethod
+    def load(cls, file_path: str, mmap_mode: Optional[str] = 'r'):
+        packed = np.load(file_path, mmap_mode=mmap_mode)
+        with np.load(file_path + '.meta.npz') as meta:
+            return cls(packed, int(meta['length']), meta['exception_positions'], meta['exception_codes'])
+
+    def __len__(self):
+        return self.end - self.start
+
+    def __getitem__(self, item: Union[int, slice]) -> str:
+        if isinstance(item, slice):
+            start, end, step = item.indices(len(self))
+            if step != 1:
+                raise ValueError('GenomeSequence only supports slices with step 1, use reverse_complement instead')
+            return self.to_str(start, max(start, end))
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError('GenomeSequence index out of range')
+        return self.to_str(item, item + 1)
+
+    def __str__(self):
+        return self.to_str()
+
+    def view(self, start: int = 0, end: int = None) -> 'GenomeSequence':
+        """
+        :return: [start, end) of this view, clipped to it, without copying
+        """
+        size = len(self)
+        end = size if end is None else min(max(end, 0), size)
+        start = min(max(start, 0), end)
+        if self.is_reverse:
+            start, end = self.end - end, self.end - start
+        else:
+            start, end = self.start + start, self.start + end
+        return GenomeSequence(self.packed, self.length, self.exception_positions, self.exception_codes, start, end,
+                              self.is_reverse)
+
+    def reverse_complement(self) -> 'GenomeSequence':
+        return GenomeSequence(self.packed, self.length, self.exception_positions, self.exception_codes, self.start,
+                              self.end, not self.is_reverse)
+
+    def to_array(self, start: int = 0, end: int = None) -> np.ndarray:
+        """
+        :return: [start, end) of this view encoded as utils.gene_util.encode_dna
+        """
+        if start != 0 or end is not None:
+            return self.view(start, end).to_array()
+        first, last = self.start // 4, (self.end + 3) // 4
+        codes = (np.asarray(self.packed[first:last])[:, None] >> Shifts) & 3
+        result = np.frombuffer(PackedBases, dtype=np.uint8)[codes.ravel()[self.start - first * 4:self.end - first * 4]]
+        left, right = np.searchsorted(self.exception_positions, [self.start, self.end])
+        result[self.exception_positions[left:right] - self.start] = self.exception_codes[left:right]
+        if self.is_reverse:
+            result = Complement[result[::-1]]
+        return result
+
+    def get_sequences(self, starts: np.ndarray, ends: np.ndarray, is_reverse: np.ndarray) -> List[str]:
+        """
+        [starts[i], ends[i]) of this view, reverse complemented where is_reverse[i], every range is clipped to the view.
+        The covered span is decoded once and all ranges are gathered and complemented in one vectorized pass.
+        """
+        starts = np.clip(np.asarray(starts, dtype=np.int64), 0, len(self))
+        ends = np.clip(np.asarray(ends, dtype=np.int64), starts, len(self))
+        is_reverse = np.asarray(is_reverse, dtype=bool)
+        if len(starts) == 0:
+            return []
+        lengths = ends - starts
+        bounds = np.concatenate([[0], np.cumsum(lengths)])
+        low = int(starts.min())
+        dna = self.to_array(low, int(ends.max()))
+        # index of every output base in its range, then in dna
+        inner = np.arange(bounds[-1]) - np.repeat(bounds[:-1], lengths)
+        reverse = np.repeat(is_reverse, lengths)
+        gathered = dna[np.where(reverse, np.repeat(ends - 1 - low, lengths) - inner,
+                                np.repeat(starts - low, lengths) + inner)]
+        gathered[reverse] = Complement[gathered[reverse]]
+        sequences = gathered.tobytes().decode('ascii')
+        return [sequences[left:right] for left, right in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+    def to_bytes(self, start: int = 0, end: int = None) -> bytes:
+        return self.to_array(start, end).tobytes()
+
+    def to_str(self, start: int = 0, end: int = None) -> str:
+        return self.to_bytes(start, end).decode('ascii')
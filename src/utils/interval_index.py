@@ -0,0 +1,119 @@
+from typing import List, Sequence
+
+import numpy as np
+
+
+class IntervalIndex:
+    """
+    Closed intervals [start, end] indexed once for overlap, containment and nearest queries. The intervals are sorted
+    by start along with the running maximum of their ends, so the ones which may overlap a range lie between two binary
+    searches, and sorted by end for the nearest ones before a position. upstream and downstream are by coordinate,
+    not by strand. Every query returns indices of the intervals as given, the batch ones search and mask all the
+    queries at once.
+    """
+
+    def __init__(self, starts: Sequence[int], ends: Sequence[int]):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.start_order = np.argsort(self.starts, kind='stable')
+        self.sorted_starts = self.starts[self.start_order]
+        # max end of every prefix in start order, which never decreases
+        self.max_ends = np.maximum.accumulate(self.ends[self.start_order]) if len(self) > 0 else self.ends
+        # equal ends with the first given last, which is the nearest one read backwards
+        self.end_order = np.lexsort((-np.arange(len(self)), self.ends))
+        self.sorted_ends = self.ends[self.end_order]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def select(self, lows, highs, keep) -> List[np.ndarray]:
+        """
+        The candidates of all the queries are masked at once, as one array of the ranges of start order joined.
+        :param lows: first position in start order of the candidates of each query
+        :param highs: end position in start order of the candidates of each query
+        :param keep: (candidate indices, query number of each) -> mask of the ones kept
+        :return: sorted indices kept of each query
+        """
+        if len(lows) == 0:
+            return []
+        counts = np.maximum(highs - lows, 0)
+        queries = np.repeat(np.arange(len(lows)), counts)
+        # position in start order of every candidate, counted from the low of its query
+        starts = np.cumsum(counts) - counts
+        positions = np.arange(len(queries)) - starts[queries] + lows[queries]
+        candidates = self.start_order[positions]
+        mask = keep(candidates, queries)
+        candidates, queries = candidates[mask], queries[mask]
+        candidates = candidates[np.lexsort((candidates, queries))]
+        return np.split(candidates, np.cumsum(np.bincount(queries, minlength=len(lows)))[:-1])
+
+    def overlap_batch(self, lefts: Sequence[int], rights: Sequence[int]) -> List[np.ndarray]:
+        """
+        :return: intervals with start <= right and end >= left of each range
+        """
+        lefts, rights = np.asarray(lefts, dtype=np.int64), np.asarray(rights, dtype=np.int64)
+        return self.select(np.searchsorted(self.max_ends, lefts, 'left'),
+                           np.searchsorted(self.sorted_starts, rights, 'right'),
+                           lambda candidates, queries: self.ends[candidates] >= lefts[queries])
+
+    def containing_batch(self, lefts: Sequence[int], rights: Sequence[int]) -> List[np.ndarray]:
+        """
+        :return: intervals with start <= left and end >= right of each range
+        """
+        lefts, rights = np.asarray(lefts, dtype=np.int64), np.asarray(rights, dtype=np.int64)
+        return self.select(np.searchsorted(self.max_ends, rights, 'left'),
+                           np.searchsorted(self.sorted_starts, lefts, 'right'),
+                           lambda candidates, queries: self.ends[candidates] >= rights[queries])
+
+    def contained_batch(self, lefts: Sequence[int], rights: Sequence[int]) -> List[np.ndarray]:
+        """
+        :return: intervals with start >= left and end <= right of each range
+        """
+        lefts, rights = np.asarray(lefts, dtype=np.int64), np.asarray(rights, dtype=np.int64)
+        return self.select(np.searchsorted(self.sorted_starts, lefts, 'left'),
+                           np.searchsorted(self.sorted_starts, rights, 'right'),
+                           lambda candidates, queries: self.ends[candidates] <= rights[queries])
+
+    def upstream_batch(self, positions: Sequence[int], k=1, inclusive=False) -> np.ndarray:
+        """
+        :param inclusive: if an interval ending at the position is before it
+        :return: (len(positions), k) intervals with end < position (<= if inclusive), the nearest first and the first
+        given of equal ends first, -1 where there are less than k
+        """
+        ends = np.searchsorted(self.sorted_ends, np.asarray(positions, dtype=np.int64),
+                               'right' if inclusive else 'left')
+        return self.take(self.end_order, ends[:, None] - 1 - np.arange(k))
+
+    def downstream_batch(self, positions: Sequence[int], k=1, inclusive=False) -> np.ndarray:
+        """
+        :param inclusive: if an interval starting at the position is after it
+        :return: (len(positions), k) intervals with start > position (>= if inclusive), the nearest first and the
+        first given of equal starts first, -1 where there are less than k
+        """
+        starts = np.searchsorted(self.sorted_starts, np.asarray(positions, dtype=np.int64),
+                                 'left' if inclusive else 'right')
+        return self.take(self.start_order, starts[:, None] + np.arange(k))
+
+    @staticmethod
+    def take(order: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        valid = (positions >= 0) & (positions < len(order))
+        if len(order) == 0:
+            return np.full(positions.shape, -1, dtype=np.int64)
+        return np.where(valid, order[np.clip(positions, 0, len(order) - 1)], -1)
+
+    def overlap(self, left: int, right: int) -> np.ndarray:
+        return self.overlap_batch([left], [right])[0]
+
+    def containing(self, left: int, right: int) -> np.ndarray:
+        return self.containing_batch([left], [right])[0]
+
+    def contained(self, left: int, right: int) -> np.ndarray:
+        return self.contained_batch([left], [right])[0]
+
+    def upstream(self, position: int, k=1, inclusive=False) -> np.ndarray:
+        row = self.upstream_batch([position], k, inclusive)[0]
+        return row[row >= 0]
+
+    def downstream(self, position: int, k=1, inclusive=False) -> np.ndarray:
+        row = self.downstream_batch([position], k, inclusive)[0]
+        return row[row >= 0]
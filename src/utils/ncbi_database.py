@@ -1,10 +1,20 @@
+import mmap
+import os
 import re
 import traceback
 from enum import Enum
+from typing import Callable, List, Optional
+
+import numpy as np
 
 from experiment_config import *
 from utils.factories.logger_factory import LoggerFactory
+from utils.feature_lookup import FeatureLookup, LookupKey
+from utils.feature_table import FeatureSegments, FeatureTable
 from utils.gene_database import GeneSegment, GeneDatabase
+from utils.genome_cache import GenomeCache
+from utils.genome_sequence import GenomeSequence
+from utils.interval_index import IntervalIndex
 
 
 class GeneDataPartType(Enum):
@@ -21,12 +31,37 @@ class GeneDataLineType(Enum):
     Other = 4
 
 
+class LoadProfile(Enum):
+    # sequence and every feature, the str qualifiers of a feature are decoded at the first access of each of them
+    Full = 0
+    # sequence only, no feature
+    Sequence = 1
+    # cds of every feature only, no sequence, no qualifier and no name index
+    Coordinates = 2
+    # sequence and the cds, gene and product of every feature, no other qualifier and no name index
+    GeneProduct = 3
+
+
 class NCBIGeneSegment(GeneSegment):
-    def __init__(self):
+    AttributeNames = ['product', 'gene', 'protein_id', 'codon_start', 'transl_table', 'gene_synonym', 'locus_tag',
+                      'translation']
+    # the ones of AttributeNames interned in FeatureTable
+    InternedNames = ['gene', 'product', 'locus_tag']
+
+    def __init__(self, qualifiers=None):
+        """
+        :param qualifiers: source of the attributes in AttributeNames, which are only decoded by qualifiers.get(name)
+        at the first access of each of them, see RawQualifiers, all of them are None if not given
+        """
         self.xref = {}
         self.cds = None
+        # 1, or -1 for complement
+        self.strand = None
         self.gene_id = None
 
+        if qualifiers is not None:
+            self.qualifiers = qualifiers
+            return
         self.product = None
         self.gene = None
         self.protein_id = None
@@ -36,18 +71,48 @@ class NCBIGeneSegment(GeneSegment):
         self.locus_tag = None
         self.translation = None
 
+    def __getattr__(self, name):
+        qualifiers = self.__dict__.get('qualifiers')
+        if qualifiers is None or name not in self.AttributeNames:
+            raise AttributeError(name)
+        value = self.__dict__[name] = qualifiers.get(name)
+        return value
+
+    def get_raw(self, name) -> Optional[bytes]:
+        """
+        :return: attribute name as utf8 bytes, taken from the qualifiers without decoding them if it is not accessed
+        """
+        qualifiers = self.__dict__.get('qualifiers')
+        if qualifiers is not None and name not in self.__dict__:
+            return qualifiers.get_bytes(name)
+        value = getattr(self, name)
+        return None if value is None else value.encode('utf8')
+
+    def to_dict(self):
+        """
+        :return: every attribute, the lazy ones decoded
+        """
+        result = {name: value for name, value in self.__dict__.items() if name != 'qualifiers'}
+        result.update((name, getattr(self, name)) for name in self.AttributeNames)
+        return result
+
     def extract_attribute(self, line):
-        for attr in ['product', 'gene', 'protein_id', 'codon_start', 'transl_table', 'gene_synonym', 'locus_tag',
-                     'translation']:
+        for attr in self.AttributeNames:
             if line.startswith('/' + attr + '='):
-                self.__dict__[attr] = line[len(attr) + 2:].strip('"')
+                self.extract_value(attr, line)
         if line.startswith("/db_xref="):
-            key, value = line.lstrip("/db_xref=").strip("\"").split(':')
-            if key.lower() == 'geneid':
-                value = value.split("\"")[0]
-                self.gene_id = int(re.sub(r'[^0-9]', '', value.lower()))
-            else:
-                self.xref[key] = value
+            self.extract_xref(line)
+
+    def extract_value(self, attr, line):
+        self.__dict__[attr] = line[len(attr) + 2:].strip('"')
+
+    def extract_xref(self, line):
+        key, value = line.lstrip("/db_xref=").strip("\"").split(':')
+        if key.lower() == 'geneid':
+            value = value.split("\"")[0]
+            self.gene_id = int(re.sub(r'[^0-9]', '', value.lower()))
+        else:
+            self.xref[key] = value
 
     def __str__(self):
         return '%s-%s\t%s' % (
@@ -56,13 +121,115 @@ class NCBIGeneSegment(GeneSegment):
             ExperimentConfig.VALUE_UNKNOWN if self.product is None else self.product)
 
 
+class RawQualifiers:
+    """
+    str qualifiers of a feature as the bytes in the file, each joined with its continuation lines
+    """
+    __slots__ = ['lines']
+
+    def __init__(self, lines: List[bytes]):
+        self.lines = lines
+
+    def get(self, name):
+        value = self.get_bytes(name)
+        return None if value is None else value.decode('utf8')
+
+    def get_bytes(self, name):
+        prefix = ('/%s=' % name).encode('ascii')
+        value = None
+        for line in self.lines:
+            if line.startswith(prefix):
+                value = line[len(prefix):].strip(b'"')
+        return value
+
+
+class NCBIGeneSegmentView(GeneSegment):
+    """
+    NCBIGeneSegment idx of a FeatureTable, every attribute is read from the columns at its access, None if they are
+    not loaded
+    """
+    __slots__ = ['table', 'idx']
+
+    def __init__(self, table: FeatureTable, idx: int):
+        self.table = table
+        self.idx = idx
+
+    @property
+    def cds(self):
+        return self.table.get_cds(self.idx)
+
+    @property
+    def left(self):
+        return int(self.table.columns['start'][self.idx])
+
+    @property
+    def right(self):
+        return int(self.table.columns['end'][self.idx])
+
+    @property
+    def strand(self):
+        return self.table.get_strand(self.idx)
+
+    @property
+    def gene_id(self):
+        return self.table.get_gene_id(self.idx)
+
+    @property
+    def xref(self):
+        return self.table.get_xref(self.idx)
+
+    def __getattr__(self, name):
+        if name not in NCBIGeneSegment.AttributeNames:
+            raise AttributeError(name)
+        return self.table.get_string(name, self.idx)
+
+    def __eq__(self, other):
+        return isinstance(other, NCBIGeneSegmentView) and self.table is other.table and self.idx == other.idx
+
+    def __hash__(self):
+        return hash((id(self.table), self.idx))
+
+    def to_dict(self):
+        result = {name: getattr(self, name) for name in ['xref', 'cds', 'strand', 'gene_id', 'left', 'right']}
+        result.update((name, getattr(self, name)) for name in NCBIGeneSegment.AttributeNames)
+        return result
+
+    __str__ = NCBIGeneSegment.__str__
+
+
+# qualifiers kept by the stream parser, by their name in bytes
+QualifierHandlers = {attr.encode('ascii'): (lambda segment, line, attr=attr: segment.extract_value(attr, line))
+                     for attr in NCBIGeneSegment.AttributeNames}
+QualifierHandlers[b'db_xref'] = NCBIGeneSegment.extract_xref
+# the first line of the rest of a record, after ORIGIN
+DNAEndPattern = re.compile(rb'^[^\S\n]*//', re.M)
+# position number, or the first token of whatever line, in the ORIGIN block
+LineHeadPattern = re.compile(rb'^[^\S\n]*\S*', re.M)
+Whitespace = b' \t\n\r\x0b\x0c'
+SlashByte = ord('/')
+
+
 class NCBIDatabase(GeneDatabase):
 
-    def __init__(self, file_path, ignore_gene=False, enable_debug_info=False):
+    def __init__(self, file_path, ignore_gene=False, enable_debug_info=False, stream_parse=True, use_cache=True,
+                 load_profile: LoadProfile = LoadProfile.Full):
+        """
+        :param ignore_gene: the same as load_profile Sequence
+        :param stream_parse: parse the memory mapped bytes of the file by parse_stream, which gives the same result as
+        parsing it line by line as text by parse_lines
+        :param use_cache: load the parsed file from its sidecar cache, which is written by the first parse, see
+        utils.genome_cache.GenomeCache. The cache always holds the whole file, and only the parts of load_profile
+        are loaded from it
+        :param load_profile: what is loaded, see LoadProfile
+        """
         self.ignore_gene = ignore_gene
+        self.stream_parse = stream_parse
+        self.use_cache = use_cache
+        self.load_profile = LoadProfile.Sequence if ignore_gene else load_profile
         self.gene_segments = []
-        self.dna_code = []
+        self.genome = None
         self.gene_name_segment_map = {}
+        self.feature_lookup = None
         self.source = None
 
         self.enable_debug_info = enable_debug_info
@@ -71,8 +238,128 @@ class NCBIDatabase(GeneDatabase):
         self.initialized = self.initialize()
 
     def initialize(self):
+        cache = GenomeCache(self.file_path, self.get_parse_options()) if self.use_cache else None
+        if cache and self.load_from_cache(cache):
+            return True
+        # the cache always holds the whole file
+        profile = LoadProfile.Full if cache else self.load_profile
+        dna_code = self.parse_stream(profile) if self.stream_parse else self.parse_lines(profile)
+        if dna_code is None:
+            return False
+        if profile != LoadProfile.Coordinates:
+            self.genome = GenomeSequence.from_array(np.frombuffer(dna_code, dtype=np.uint8))
+        check_order = None
+        warning_num = 0
+        for idx, gene_segment in enumerate(self.gene_segments):
+            if check_order is not None and check_order > min(gene_segment.cds):
+                warning_num += 1
+            check_order = max(gene_segment.cds)
+            if profile == LoadProfile.Full:
+                name = gene_segment.gene
+                if name not in self.gene_name_segment_map:
+                    self.gene_name_segment_map[name] = []
+                self.gene_name_segment_map[name].append(idx)
+        self.logger.info("Total Gene Segment Number = %d, Total Gene Name Count = %d" % (
+            len(self.gene_segments), len(self.gene_name_segment_map)))
+        # the qualifiers go into the table as the bytes in the file, only the views decode them
+        feature_table = FeatureTable.from_segments(self.gene_segments, NCBIGeneSegment.AttributeNames,
+                                                   self.gene_name_segment_map, NCBIGeneSegment.InternedNames,
+                                                   NCBIGeneSegment.get_raw)
+        if cache:
+            cache.save(self.genome, self.source, feature_table)
+        self.apply_load_profile(feature_table)
+        return True
+
+    def get_feature_columns(self) -> Optional[List[str]]:
+        """
+        :return: columns of the feature table load_profile loads, all of them if None
+        """
+        if self.load_profile == LoadProfile.Full:
+            return None
+        elif self.load_profile == LoadProfile.Coordinates:
+            return FeatureTable.CoordinateColumns
+        elif self.load_profile == LoadProfile.GeneProduct:
+            return FeatureTable.CoordinateColumns + FeatureTable.get_interned_columns(['gene', 'product'])
+        return []
+
+    def load_from_cache(self, cache: GenomeCache) -> bool:
+        """
+        only the parts of load_profile are read, see get_feature_columns
+        """
+        profile = self.load_profile
+        cached = cache.load(with_genome=profile != LoadProfile.Coordinates, feature_columns=self.get_feature_columns())
+        if cached is None:
+            return False
+        self.genome, self.source, feature_table = cached
+        if profile != LoadProfile.Sequence:
+            self.gene_segments = FeatureSegments(feature_table, NCBIGeneSegmentView)
+        if profile == LoadProfile.Full:
+            self.gene_name_segment_map = feature_table.get_name_index()
+        self.logger.info("Load cached Gene Segment Number = %d, Total Gene Name Count = %d" % (
+            len(self.gene_segments), len(self.gene_name_segment_map)))
+        return True
+
+    def apply_load_profile(self, feature_table: FeatureTable):
+        """
+        keep the gene segments parsed as the views of feature_table, and drop what the whole file is parsed with but
+        load_profile does not load
+        """
+        if self.load_profile == LoadProfile.Sequence:
+            self.gene_segments = []
+            self.gene_name_segment_map = {}
+        elif self.load_profile in [LoadProfile.Coordinates, LoadProfile.GeneProduct]:
+            if self.load_profile == LoadProfile.Coordinates:
+                self.genome = None
+            self.gene_segments = FeatureSegments(feature_table.select(self.get_feature_columns()),
+                                                 NCBIGeneSegmentView)
+            self.gene_name_segment_map = {}
+        else:
+            self.gene_segments = FeatureSegments(feature_table, NCBIGeneSegmentView)
+
+    def get_interval_index(self) -> IntervalIndex:
+        if self.interval_index is None and isinstance(self.gene_segments, FeatureSegments):
+            columns = self.gene_segments.table.columns
+            self.interval_index = IntervalIndex(columns['start'], columns['end'])
+        return super().get_interval_index()
+
+    def get_feature_lookup(self) -> FeatureLookup:
+        """
+        index of gene, locus_tag, gene_synonym, gene_id and db_xref of every gene segment, built at the first call
+        """
+        if self.feature_lookup is None:
+            if isinstance(self.gene_segments, FeatureSegments):
+                table = self.gene_segments.table
+                self.feature_lookup = FeatureLookup(table.get_column('gene'), table.get_column('locus_tag'),
+                                                    table.get_column('gene_synonym'), table.get_gene_ids(),
+                                                    table.get_xrefs())
+            else:
+                self.feature_lookup = FeatureLookup.from_segments(self.gene_segments)
+        return self.feature_lookup
+
+    @staticmethod
+    def get_coordinates(gene_segment: NCBIGeneSegment) -> NCBIGeneSegment:
+        segment = NCBIGeneSegment()
+        segment.cds, segment.strand = gene_segment.cds, gene_segment.strand
+        if 'left' in gene_segment.__dict__:
+            segment.left, segment.right = gene_segment.left, gene_segment.right
+        return segment
+
+    def get_parse_options(self):
+        """
+        :return: settings the parsed result depends on, which are a part of the cache key
+        """
+        return {
+            'gene_start': ExperimentConfig.VALUE_GENE_START,
+            'repeat_region_start': ExperimentConfig.VALUE_REPEAT_REGION_START
+        }
+
+    def parse_lines(self, profile: LoadProfile = LoadProfile.Full) -> Optional[bytes]:
+        """
+        :return: sequence of the first record, None if it has no ORIGIN
+        """
         part_status = GeneDataPartType.HeaderPart
         data = []
+        dna_code = []
         line_type = None
         for line_index, line in enumerate(open(self.file_path, 'r', encoding='utf8')):
             line_type = self.check_line_type(line, part_status)
@@ -80,10 +367,10 @@ class NCBIDatabase(GeneDatabase):
                 self.source = ' '.join(re.split(r'\s+', line)[1:])
             elif line_type == GeneDataLineType.GeneSegmentStart:
                 part_status = GeneDataPartType.GeneSegmentPart
-                self.parse_gene_segment(data)
+                self.parse_gene_segment(data, profile)
             elif line_type == GeneDataLineType.DNAStart:
                 part_status = GeneDataPartType.DNAPart
-                self.parse_gene_segment(data)
+                self.parse_gene_segment(data, profile)
             elif line_type == GeneDataLineType.DNAEnd:
                 break
 
@@ -92,31 +379,132 @@ class NCBIDatabase(GeneDatabase):
             elif part_status == GeneDataPartType.DNAPart and line_type == GeneDataLineType.Other:
                 items = re.split(r'\s+', line.strip())
                 for val in items[1:]:
-                    self.dna_code.append(val)
+                    dna_code.append(val)
                 self.logger.time_distance = 10
             if self.enable_debug_info:
                 self.logger.info_per_time("LineNo = %d, Added Gene Num = %d, Last Sample = %s" % (
                     line_index, len(self.gene_segments),
-                    self.gene_segments[-1].__dict__ if len(self.gene_segments) > 0 else ""))
+                    self.gene_segments[-1].to_dict() if len(self.gene_segments) > 0 else ""))
         if part_status != GeneDataPartType.DNAPart and line_type != GeneDataLineType.DNAEnd:
-            return False
-        self.dna_code = ''.join(self.dna_code)
-        check_order = None
-        warning_num = 0
-        for idx, gene_segment in enumerate(self.gene_segments):
-            name = gene_segment.gene
-            if check_order is not None and check_order > min(gene_segment.cds):
-                warning_num += 1
-            check_order = max(gene_segment.cds)
-            if name not in self.gene_name_segment_map:
-                self.gene_name_segment_map[name] = []
-            self.gene_name_segment_map[name].append(idx)
-        self.logger.info("Total Gene Segment Number = %d, Total Gene Name Count = %d" % (
-            len(self.gene_segments), len(self.gene_name_segment_map)))
-        return True
+            return None
+        return ''.join(dna_code).encode('ascii')
+
+    def parse_stream(self, profile: LoadProfile = LoadProfile.Full) -> Optional[bytes]:
+        """
+        The state machine of parse_lines over the memory mapped bytes of the file. Lines before ORIGIN are only
+        classified by their leading bytes, and the ORIGIN block is turned into the sequence in bulk.
+        :return: sequence of the first record, None if it has no ORIGIN, empty for profile Coordinates
+        """
+        with open(self.file_path, 'rb') as fr:
+            if os.fstat(fr.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(fr.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data.find(b'\r') >= 0:
+                    # universal newlines, as the file read as text
+                    return self.parse_bytes(data[:].replace(b'\r\n', b'\n').replace(b'\r', b'\n'), profile)
+                return self.parse_bytes(data, profile)
+
+    def parse_bytes(self, data, profile: LoadProfile) -> Optional[bytes]:
+        source_start = ExperimentConfig.VALUE_SOURCE_START.encode('utf8')
+        gene_starts = (ExperimentConfig.VALUE_GENE_START.encode('utf8'),
+                       ExperimentConfig.VALUE_REPEAT_REGION_START.encode('utf8'))
+        size = len(data)
+        pos = 0
+        feature = None
+        while pos < size:
+            end = data.find(b'\n', pos)
+            end = size if end < 0 else end + 1
+            line = data[pos:end]
+            pos = end
+            strip_line = line.strip()
+            if strip_line.startswith(gene_starts):
+                self.parse_feature(feature, profile)
+                feature = [line]
+            elif feature is None:
+                if strip_line.startswith(source_start):
+                    self.source = ' '.join(re.split(r'\s+', line.decode('utf8'))[1:])
+            elif line[:1] != b' ':
+                self.parse_feature(feature, profile)
+                return b'' if profile == LoadProfile.Coordinates else self.parse_origin(data, pos)
+            elif profile != LoadProfile.Sequence:
+                feature.append(line)
+        return None
+
+    @staticmethod
+    def parse_origin(data, pos) -> bytes:
+        """
+        :return: from pos to the end of the record, the first token of every line (its position) and whitespace
+        deleted, the same as joining the tokens after the first one of every line
+        """
+        end = DNAEndPattern.search(data, pos)
+        block = data[pos:end.start() if end else len(data)]
+        return LineHeadPattern.sub(b'', block).translate(None, Whitespace)
+
+    def parse_feature(self, lines: List[bytes], profile: LoadProfile):
+        """
+        parse_gene_segment of the lines of one feature as bytes, every qualifier with its continuation lines is
+        joined and extracted once, by the handler of its name in QualifierHandlers. db_xref is always extracted, as
+        a feature with a broken one is dropped, the str qualifiers are kept as RawQualifiers for profile Full and
+        GeneProduct.
+        """
+        if not lines or profile == LoadProfile.Sequence:
+            return
+        raw_qualifiers = [] if profile in [LoadProfile.Full, LoadProfile.GeneProduct] else None
+        gene_segment = NCBIGeneSegment(RawQualifiers(raw_qualifiers) if raw_qualifiers is not None else None)
+        line = lines[0].strip()
+        complement = None
+        try:
+            tag, complement = re.split(r'\s+', line.decode('utf8'))
+            inter = list(map(lambda arg: int(arg.strip('<>')),
+                             complement.lstrip('complement(').rstrip(')').split('..')))
+            gene_segment.cds = inter
+            gene_segment.strand = -1 if complement.startswith('complement(') else 1
+            assert len(inter) == 2 and inter[0] < inter[1]
+            qualifier = None
+            for line in lines[1:]:
+                line = line.strip()
+                if line[0] == SlashByte:
+                    self.extract_qualifier(gene_segment, qualifier, raw_qualifiers)
+                    qualifier = [line]
+                elif qualifier is not None:
+                    qualifier.append(line)
+            self.extract_qualifier(gene_segment, qualifier, raw_qualifiers)
+        except:
+            self.logger.info(line.decode('utf8', errors='replace') if isinstance(line, bytes) else line)
+            if not complement or (
+                    not complement.startswith('join') and not complement.startswith('complement(join')):
+                traceback.print_exc()
+            return
+        if profile == LoadProfile.Coordinates:
+            gene_segment = self.get_coordinates(gene_segment)
+        self.gene_segments.append(gene_segment)
+        gene_segment.left, gene_segment.right = gene_segment.cds[0], gene_segment.cds[1]
+        if self.enable_debug_info:
+            self.logger.info_per_time("Added Gene Num = %d, Last Sample = %s" % (
+                len(self.gene_segments), gene_segment.to_dict()))
+
+    @staticmethod
+    def extract_qualifier(gene_segment: NCBIGeneSegment, qualifier: Optional[List[bytes]],
+                          raw_qualifiers: Optional[List[bytes]]):
+        """
+        :param raw_qualifiers: where str qualifiers are kept, they are dropped if None
+        """
+        if qualifier is None:
+            return
+        equal = qualifier[0].find(b'=')
+        handler = QualifierHandlers.get(qualifier[0][1:equal]) if equal > 0 else None
+        if handler is None:
+            return
+        if qualifier[0].startswith(b'/db_xref='):
+            # parse_gene_segment extracts db_xref at every line, a part of it may fail
+            for end in range(1, len(qualifier)):
+                handler(gene_segment, b' '.join(qualifier[:end]).decode('utf8'))
+            handler(gene_segment, b' '.join(qualifier).decode('utf8'))
+        elif raw_qualifiers is not None:
+            raw_qualifiers.append(b' '.join(qualifier))
 
-    def parse_gene_segment(self, data):
-        if data is None or len(data) == 0 or self.ignore_gene:
+    def parse_gene_segment(self, data, profile: LoadProfile = LoadProfile.Full):
+        if data is None or len(data) == 0 or profile == LoadProfile.Sequence:
             return
         gene_segment = NCBIGeneSegment()
         last_line = ''
@@ -131,7 +519,8 @@ class NCBIDatabase(GeneDatabase):
                     inter = list(map(lambda arg: int(arg.strip('<>')),
                                      complement.lstrip('complement(').rstrip(')').split('..')))
                     gene_segment.cds = inter
-                    assert (inter[0] < inter[1])
+                    gene_segment.strand = -1 if complement.startswith('complement(') else 1
+                    assert len(inter) == 2 and inter[0] < inter[1]
                 else:
                     if line[0] == '/':
                         last_line = line
@@ -150,11 +539,60 @@ class NCBIDatabase(GeneDatabase):
             gene_segment.left, gene_segment.right = gene_segment.cds[0], gene_segment.cds[1]
         data.clear()
 
+    @property
+    def dna_code(self) -> GenomeSequence:
+        """
+        forward strand, slicing it gives str as before
+        """
+        return self.genome
+
     def get_sequence(self, segment_id=None, left=None, right=None):
         if segment_id:
             left, right = self.gene_segments[segment_id].left, self.gene_segments[segment_id].right
         return self.dna_code[left - 1:right]
 
+    def get_sequences(self, ranges, writer: Callable = None, batch_bases: int = 1 << 22):
+        """
+        Sequences of many ranges at once, see GenomeSequence.get_sequences. Ranges are taken batch by batch, each of
+        at most batch_bases bases with the flanks, as the arrays of a batch are as long as its bases.
+        :param ranges: array of (left, right, is_reverse) or (left, right, is_reverse, upstream, downstream), left and
+        right are 1-based and inclusive like cds, the sequence of a reverse range is its reverse complement
+        :param writer: if set, writer(index, result) is called for every range in order, batch by batch, and nothing
+        is returned, so the results of a huge range file are never all in memory
+        :param batch_bases: a range longer than it is a batch of its own
+        :return: sequence of each range, or (sequence, upstream, downstream) if flanks are given, upstream and
+        downstream are on the strand of the range and clipped at the ends of the genome
+        """
+        ranges = np.asarray(ranges, dtype=np.int64).reshape(len(ranges), -1) if len(ranges) > 0 else \
+            np.zeros((0, 3), dtype=np.int64)
+        results = None if writer else []
+        lengths = np.maximum(ranges[:, 1] - ranges[:, 0] + 1, 0)
+        if ranges.shape[1] > 3:
+            lengths += np.maximum(ranges[:, 3], 0) + np.maximum(ranges[:, 4], 0)
+        for batch_start, batch_end in get_batches(lengths, batch_bases):
+            batch = ranges[batch_start:batch_end]
+            lefts, rights, is_reverse = batch[:, 0] - 1, batch[:, 1], batch[:, 2] != 0
+            starts, ends = [lefts], [rights]
+            if batch.shape[1] > 3:
+                # upstream is before left on the forward strand, after right on the reverse strand
+                before = np.where(is_reverse, batch[:, 4], batch[:, 3])
+                after = np.where(is_reverse, batch[:, 3], batch[:, 4])
+                starts.extend([lefts - before, rights])
+                ends.extend([lefts, rights + after])
+            sequences = self.genome.get_sequences(np.concatenate(starts), np.concatenate(ends),
+                                                  np.tile(is_reverse, len(starts)))
+            if batch.shape[1] > 3:
+                size = len(batch)
+                forward = [sequences[:size], sequences[size:2 * size], sequences[2 * size:]]
+                sequences = [(seq, after, before) if reverse else (seq, before, after)
+                             for seq, before, after, reverse in zip(*forward, is_reverse.tolist())]
+            if writer:
+                for idx, result in enumerate(sequences):
+                    writer(batch_start + idx, result)
+            else:
+                results.extend(sequences)
+        return results
+
     @staticmethod
     def check_line_type(line: str, part_status):
         strip_line = line.strip()
@@ -176,39 +614,52 @@ class NCBIDatabase(GeneDatabase):
         return GeneDataLineType.Other
 
 
+def get_batches(lengths: np.ndarray, batch_bases: int):
+    """
+    :return: [start, end) of each batch of consecutive items, whose lengths add up to at most batch_bases, or of one
+    item longer than it
+    """
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    start = 0
+    while start < len(lengths):
+        end = max(int(np.searchsorted(bounds, bounds[start] + batch_bases, 'right')) - 1, start + 1)
+        yield start, end
+        start = end
+
+
 if __name__ == '__main__':
 
     file_path = 'D:/Workspace/ncbi-analysis/data/rna_analysis/rna_download_data/NC_000913.3.txt'
     gene = NCBIDatabase(file_path)
-    b_dict = {}
-    for gene_segment in gene.gene_segments:
-        if gene_segment.gene_id:
-            b_dict[gene_segment.locus_tag] = [gene_segment.gene, gene_segment.gene_id]
     heads = None
+    rows = []
+    for line in open('D:/Workspace/ncbi-analysis/R/ID_Eco_Path.txt', 'r', encoding='utf8'):
+        items = line.strip().split('\t')
+        if heads is None:
+            heads = items
+            # keggid locus path
+        elif items[1] in ['b2397',
+                          'b2815',
+                          'b2590',
+                          'b0745',
+                          'b1231',
+                          'b0216',
+                          'b2402',
+                          'b3171',
+                          'b1975',
+                          'b4370',
+                          'b0971',
+                          'b3798',
+                          'b3761',
+                          'b1911',
+                          'b1977',
+                          'b0749']:
+            items[1], items[2] = items[2], items[1]
+            rows.append(items)
+    matches = gene.get_feature_lookup().resolve([items[2] for items in rows], LookupKey.LocusTag)
     with open('D:/Workspace/ncbi-analysis/R/Path_Information_Sample.txt', 'w', encoding='utf8') as fw:
         fw.write('PathId\tPath Name\tLocusTag\tGene\tGeneId\n')
-        for line in open('D:/Workspace/ncbi-analysis/R/ID_Eco_Path.txt', 'r', encoding='utf8'):
-            items = line.strip().split('\t')
-            if heads is None:
-                heads = items
-                # keggid locus path
-            elif items[1] in ['b2397',
-                              'b2815',
-                              'b2590',
-                              'b0745',
-                              'b1231',
-                              'b0216',
-                              'b2402',
-                              'b3171',
-                              'b1975',
-                              'b4370',
-                              'b0971',
-                              'b3798',
-                              'b3761',
-                              'b1911',
-                              'b1977',
-                              'b0749']:
-                items[1], items[2] = items[2], items[1]
-                items.extend(b_dict.get(items[2], ['', '']))
-                items = map(str, items)
-                fw.write('\t'.join(items) + '\n')
+        for items, match in zip(rows, matches):
+            segments = [gene.gene_segments[idx] for idx in match.indices if gene.gene_segments[idx].gene_id]
+            items.extend([segments[-1].gene, segments[-1].gene_id] if segments else ['', ''])
+            fw.write('\t'.join(map(str, items)) + '\n')
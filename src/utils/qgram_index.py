@@ -0,0 +1,83 @@
+import os
+import zlib
+
+import numpy as np
+
+# bases which may be the same in BaseSimilarity.should_change share one class: c matches t, any other code
+# (like n) is put into the last class, so two q-grams are equal in classes whenever they may be the same.
+QGramClassTable = np.full(256, 3, dtype=np.int64)
+QGramClassTable[ord('a')] = 0
+QGramClassTable[ord('g')] = 1
+QGramClassTable[ord('c')] = 2
+QGramClassTable[ord('t')] = 2
+QGramClassNum = 4
+
+
+class QGramIndex:
+    """
+    Positions of every q-gram in an encoded dna, grouped by q-gram code, built once and reused by all queries.
+    """
+
+    def __init__(self, q: int, order: np.ndarray, bucket_start: np.ndarray, checksum: int):
+        self.q = q
+        self.order = order
+        self.bucket_start = bucket_start
+        self.checksum = checksum
+
+    @staticmethod
+    def encode_qgram(dna: np.ndarray, q: int) -> np.ndarray:
+        size = len(dna) - q + 1
+        if size <= 0:
+            return np.zeros(0, dtype=np.int64)
+        classes = QGramClassTable[dna]
+        code = np.zeros(size, dtype=np.int64)
+        for i in range(q):
+            code = code * QGramClassNum + classes[i:i + size]
+        return code
+
+    @staticmethod
+    def get_checksum(dna: np.ndarray):
+        return zlib.crc32(dna.tobytes())
+
+    @staticmethod
+    def build(dna: np.ndarray, q: int):
+        code = QGramIndex.encode_qgram(dna, q)
+        order = np.argsort(code, kind='stable').astype(np.int32)
+        bucket_start = np.zeros(QGramClassNum ** q + 1, dtype=np.int64)
+        bucket_start[1:] = np.cumsum(np.bincount(code, minlength=QGramClassNum ** q))
+        return QGramIndex(q, order, bucket_start, QGramIndex.get_checksum(dna))
+
+    def save(self, file_path):
+        np.savez(file_path, q=self.q, order=self.order, bucket_start=self.bucket_start, checksum=self.checksum)
+
+    @staticmethod
+    def load(file_path):
+        data = np.load(file_path)
+        return QGramIndex(int(data['q']), data['order'], data['bucket_start'], int(data['checksum']))
+
+    @staticmethod
+    def load_or_build(dna: np.ndarray, q: int, file_path: str = None):
+        if file_path and os.path.exists(file_path):
+            index = QGramIndex.load(file_path)
+            if index.q == q and index.checksum == QGramIndex.get_checksum(dna):
+                return index
+        index = QGramIndex.build(dna, q)
+        if file_path:
+            index.save(file_path)
+        return index
+
+    def count_diagonal(self, gene: np.ndarray, start: int, end: int, band: int = 0) -> np.ndarray:
+        """
+        :return: for every offset in [start, end), number of pairs (i, p) with gene[i:i+q] and dna[p:p+q] in the
+        same classes, where offset - band <= p - i <= offset + band
+        """
+        lower, upper = start - band, end + band
+        diagonals = []
+        for i, code in enumerate(self.encode_qgram(gene, self.q).tolist()):
+            positions = self.order[self.bucket_start[code]:self.bucket_start[code + 1]]
+            left, right = np.searchsorted(positions, [lower + i, upper + i])
+            diagonals.append(positions[left:right] - (lower + i))
+        count = np.zeros(upper - lower + 1, dtype=np.int64)
+        if diagonals:
+            count[1:] = np.cumsum(np.bincount(np.concatenate(diagonals), minlength=upper - lower))
+        return count[2 * band + 1:] - count[:end - start]
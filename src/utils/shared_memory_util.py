@@ -0,0 +1,41 @@
+from multiprocessing import shared_memory
+from typing import Dict, Mapping, Tuple
+
+import numpy as np
+
+
+class SharedArrays:
+    """
+    Copy numpy arrays into shared memory once, so that worker processes attach them by descriptor instead of
+    receiving a pickled copy each.
+    """
+
+    def __init__(self, arrays: Mapping[str, np.ndarray]):
+        self.blocks = {}
+        self.descriptor = {}
+        for key, array in arrays.items():
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.blocks[key] = block
+            self.descriptor[key] = (block.name, array.dtype.str, array.shape)
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+
+def attach_arrays(descriptor: Mapping[str, Tuple[str, str, tuple]]) \
+        -> Tuple[Dict[str, shared_memory.SharedMemory], Dict[str, np.ndarray]]:
+    """
+    :return: attached blocks, which must be kept alive while the arrays are used, and read only array views
+    """
+    blocks, arrays = {}, {}
+    for key, (name, dtype, shape) in descriptor.items():
+        block = shared_memory.SharedMemory(name=name)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        array.flags.writeable = False
+        blocks[key] = block
+        arrays[key] = array
+    return blocks, arrays